@@ -1,20 +1,75 @@
 import { NextResponse } from 'next/server'
-import { MongoClient } from 'mongodb'
 import { v4 as uuidv4 } from 'uuid'
 import { createServerClient } from '@supabase/ssr'
+import { createClient } from '@supabase/supabase-js'
 import { cookies } from 'next/headers'
 import OpenAI from 'openai'
-
-const client = new MongoClient(process.env.MONGO_URL)
-const dbName = process.env.DB_NAME || 'syntherion_ai'
+import { closeMongoConnection, getMongoPoolStats, pingMongoDB } from '@/lib/mongodb'
+import { getAuthCacheStats, invalidateAccessToken, verifyAccessToken } from '@/lib/auth-cache'
+import {
+  appendToSession,
+  appendTurns,
+  deleteUserSessions,
+  exportSessionsCursor,
+  getSession,
+  getSessionContext,
+  getSessionWriteStats,
+  listSessions,
+  newTurnMessages,
+  parseSessionCursor,
+  saveSessionSummary,
+  searchSessions,
+  seedSessions,
+  DEFAULT_PAGE_SIZE,
+  DEFAULT_SEARCH_LIMIT,
+  MAX_PAGE_SIZE,
+  MAX_SEARCH_LIMIT,
+} from '@/lib/chat-store'
+import { buildPromptMessages, CONTEXT_HISTORY_LIMIT, estimateTokens } from '@/lib/context'
+import { getResponseCacheStats, lookupCachedResponse, storeCachedResponse } from '@/lib/response-cache'
+import { beginFlight, getSingleFlightStats, hashMessages, IDEMPOTENCY_TTL_MS } from '@/lib/single-flight'
+import { createReadinessProbe, pingSupabaseAuth } from '@/lib/health'
+import { jsonResponse } from '@/lib/json-response'
+import { agentFetch, getUpstreamAgent, getUpstreamAgentStats, keepWarm } from '@/lib/upstream-agent'
+import { DEFAULT_MODEL, getModelRouterStats, routeCompletion } from '@/lib/model-router'
+import { acquireUpstreamSlot, BATCH_RATE_LIMIT, consumeRateLimit, getRateLimitStats, UPSTREAM_CONCURRENCY, UpstreamBusyError, withUpstreamSlot } from '@/lib/rate-limit'
+import { measureStage, registerGauge, renderMetrics, setRequestAttribute, startStage, withRequestMetrics } from '@/lib/metrics'
+import { captureTraffic, getTrafficCaptureStats } from '@/lib/traffic-capture'
+import { getDiagnostics } from '@/lib/diagnostics'
+import { getTracingStats } from '@/lib/tracing'
 
 // Create Supabase Server Client
+const supabaseUrl = process.env.NEXT_PUBLIC_SUPABASE_URL
+const supabaseAnonKey = process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY
+
+// Supabase calls share one keep-alive pool instead of fetch's short-lived connections
+const supabaseFetch = supabaseUrl ? agentFetch('supabase', supabaseUrl) : fetch
+if (supabaseUrl) {
+  keepWarm('supabase', `${supabaseUrl}/auth/v1/health`, { apikey: supabaseAnonKey })
+}
+
+// Process-wide client for calls that don't touch the session cookies (token checks)
+let supabaseShared = null
+function getSharedSupabase() {
+  if (!supabaseShared) {
+    supabaseShared = createClient(supabaseUrl, supabaseAnonKey, {
+      auth: { persistSession: false, autoRefreshToken: false, detectSessionInUrl: false },
+      global: { fetch: supabaseFetch },
+    })
+  }
+  return supabaseShared
+}
+
+// Per-request client bound to the request's cookies, for sign-in/out and reading the session
+let supabaseServerClients = 0
 function createSupabaseServer() {
+  supabaseServerClients++
   const cookieStore = cookies()
   return createServerClient(
-    process.env.NEXT_PUBLIC_SUPABASE_URL,
-    process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY,
+    supabaseUrl,
+    supabaseAnonKey,
     {
+      global: { fetch: supabaseFetch },
       cookies: {
         getAll() {
           return cookieStore.getAll()
@@ -33,17 +88,21 @@ function createSupabaseServer() {
   )
 }
 
-// Create OpenAI client configured for OpenRouter
+// Create OpenAI client configured for OpenRouter, on a pre-warmed keep-alive pool
+const openrouterBaseURL = process.env.OPENROUTER_BASE_URL || 'https://openrouter.ai/api/v1'
 const openai = new OpenAI({
   apiKey: process.env.OPENROUTER_API_KEY,
-  baseURL: 'https://openrouter.ai/api/v1',
+  baseURL: openrouterBaseURL,
+  httpAgent: getUpstreamAgent('openrouter', openrouterBaseURL),
 })
+keepWarm('openrouter', `${openrouterBaseURL}/models`, { Authorization: `Bearer ${process.env.OPENROUTER_API_KEY}` })
 
 // CORS headers
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
   'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-  'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+  'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key, If-None-Match, traceparent',
+  'Access-Control-Expose-Headers': 'ETag, Retry-After, Server-Timing, traceresponse',
 }
 
 function handleCORS(response) {
@@ -53,19 +112,402 @@ function handleCORS(response) {
   return response
 }
 
-// Connect to MongoDB
-async function connectToMongoDB() {
-  try {
-    await client.connect()
-    return client.db(dbName)
-  } catch (error) {
-    console.error('MongoDB connection error:', error)
-    throw error
+// Dependencies checked by GET /api/health/ready; OpenRouter only with ?deep=1
+const readinessProbe = createReadinessProbe({
+  mongo: { check: pingMongoDB },
+  supabase: { check: () => pingSupabaseAuth(supabaseFetch) },
+  openrouter: { check: () => openai.models.list(), optional: true },
+})
+
+// Expose pool and auth cache state alongside the request metrics
+registerGauge('mongo_pool_connections', 'MongoDB pool connections by state', () => {
+  const pool = getMongoPoolStats()
+  return { open: pool.open, checked_out: pool.checkedOut, waiting: pool.waiting }
+}, 'state')
+registerGauge('mongo_pool_connections_created', 'MongoDB connections created since start', () => getMongoPoolStats().created)
+registerGauge('auth_cache_lookups', 'Verified-session cache lookups by result', () => {
+  const cache = getAuthCacheStats()
+  return { hit: cache.hits, miss: cache.misses }
+}, 'result')
+registerGauge('response_cache_lookups', 'Completion cache lookups by result', () => {
+  const cache = getResponseCacheStats()
+  return { exact: cache.exactHits, mongo: cache.mongoHits, semantic: cache.semanticHits, miss: cache.misses }
+}, 'result')
+registerGauge('response_cache_hit_ratio', 'Share of completion cache lookups served from cache', () => getResponseCacheStats().hitRate)
+registerGauge('chat_single_flight', 'Chat turns by single-flight outcome', () => {
+  const flights = getSingleFlightStats()
+  return { leader: flights.leaders, coalesced: flights.coalesced, replayed: flights.replayed, conflict: flights.conflicts }
+}, 'outcome')
+registerGauge('auth_verifications', 'Access token verifications by method', () => {
+  const cache = getAuthCacheStats()
+  return { local: cache.localVerified, rejected: cache.localRejected, remote: cache.remoteVerified }
+}, 'method')
+registerGauge('write_behind_queue_depth', 'Transcript appends queued and not yet written', () => {
+  const writes = getSessionWriteStats()
+  return (writes.depth || 0) + (writes.inFlight || 0)
+})
+registerGauge('write_behind_items', 'Transcript appends by write-behind outcome', () => {
+  const writes = getSessionWriteStats()
+  return { enqueued: writes.enqueued, written: writes.written, spilled: writes.spilled, replayed: writes.replayed }
+}, 'outcome')
+registerGauge('model_healthy', 'Whether each pooled model is accepting traffic (1) or cooling down (0)', () => {
+  const { models } = getModelRouterStats()
+  return Object.fromEntries(Object.entries(models).map(([name, model]) => [name, model.healthy ? 1 : 0]))
+}, 'model')
+registerGauge('model_routing', 'Completion routing decisions by kind', () => {
+  const routing = getModelRouterStats()
+  return { primary: routing.primary, fallback: routing.fallbacks, hedge: routing.hedges, hedge_win: routing.hedgeWins }
+}, 'decision')
+registerGauge('chat_rate_limit', 'Chat requests by per-user rate limit decision', () => {
+  const limits = getRateLimitStats()
+  return { allowed: limits.allowed, limited: limits.limited }
+}, 'decision')
+registerGauge('upstream_slots', 'Upstream model call slots by state', () => {
+  const { upstream } = getRateLimitStats()
+  return { in_use: upstream.inUse, queued: upstream.queued }
+}, 'state')
+registerGauge('upstream_connections_created', 'Upstream sockets opened (one TLS handshake each)', () => {
+  return Object.fromEntries(Object.entries(getUpstreamAgentStats()).map(([name, pool]) => [name, pool.created]))
+}, 'upstream')
+registerGauge('upstream_connections_reused', 'Upstream requests served on an already-open socket', () => {
+  return Object.fromEntries(Object.entries(getUpstreamAgentStats()).map(([name, pool]) => [name, pool.reused]))
+}, 'upstream')
+registerGauge('upstream_sockets_idle', 'Open upstream sockets waiting in the keep-alive pool', () => {
+  return Object.fromEntries(Object.entries(getUpstreamAgentStats()).map(([name, pool]) => [name, pool.idle]))
+}, 'upstream')
+registerGauge('write_behind_retries', 'Failed transcript batch writes that were retried', () => getSessionWriteStats().retries)
+
+const MAX_SEARCH_QUERY_LENGTH = 200
+
+// Limits for POST /api/chat/batch
+// Capped at the batch bucket's burst, which a larger batch could never fit into
+const BATCH_MAX_ITEMS = Math.min(
+  parseInt(process.env.BATCH_MAX_ITEMS, 10) || 100,
+  Math.floor(BATCH_RATE_LIMIT.capacity)
+)
+// A batch runs on at most half of the upstream slots (a quarter by default), so
+// one user's batch leaves most of them to interactive chats
+const BATCH_MAX_CONCURRENCY = Math.max(1, Math.min(
+  parseInt(process.env.BATCH_MAX_CONCURRENCY, 10) || Math.floor(UPSTREAM_CONCURRENCY / 4),
+  Math.floor(UPSTREAM_CONCURRENCY / 2)
+))
+const BATCH_DEFAULT_CONCURRENCY = Math.min(4, BATCH_MAX_CONCURRENCY)
+
+// Fixture endpoints for benchmark_suite.py (seed and reset the caller's history,
+// drop the Mongo pool); they don't exist unless BENCHMARK_MODE=1
+const benchmarkMode = process.env.BENCHMARK_MODE === '1'
+const BENCHMARK_MAX_SEED = 20000
+
+// Response headers for the SSE chat stream
+const sseHeaders = {
+  'Content-Type': 'text/event-stream; charset=utf-8',
+  'Cache-Control': 'no-cache, no-transform',
+  'Connection': 'keep-alive',
+  'X-Accel-Buffering': 'no',
+}
+
+// Chat completion settings shared by the buffered and streaming paths.
+// The model is picked per request from MODEL_POOL; DEFAULT_MODEL keys the response cache.
+const completionOptions = {
+  model: DEFAULT_MODEL,
+  max_tokens: 1000,
+  temperature: 0.7,
+}
+
+// Append the new turn (user messages plus the reply) to the chat session
+async function saveChat(user, sessionId, turnMessages, aiMessage) {
+  return appendToSession(user, sessionId, [...turnMessages, { role: 'assistant', content: aiMessage }])
+}
+
+// Fold messages that fell out of the context window into the rolling summary
+async function summarizeMessages(previousSummary, messages) {
+  const transcript = messages.map((message) => `${message.role}: ${message.content}`).join('\n')
+  const { response } = await withUpstreamSlot(() => measureStage('openrouter_summary', () => routeCompletion(openai, {
+    max_tokens: 300,
+    temperature: 0.2,
+    messages: [
+      {
+        role: 'system',
+        content: 'Summarise the conversation so far in a few sentences, keeping facts, names and decisions the assistant will need later.',
+      },
+      {
+        role: 'user',
+        content: previousSummary
+          ? `Existing summary:\n${previousSummary}\n\nNew messages:\n${transcript}`
+          : transcript,
+      },
+    ],
+  }, { promptTokens: estimateTokens(transcript) })))
+  return response.choices[0].message.content
+}
+
+// Load the stored session and fit it plus the new turn into the token budget
+async function prepareChatContext(user, sessionId, turnMessages) {
+  const session = await getSessionContext(user.id, sessionId, CONTEXT_HISTORY_LIMIT)
+  const prompt = await buildPromptMessages(session, turnMessages, { summarize: summarizeMessages })
+  if (prompt.summaryUpdate) {
+    await saveSessionSummary(user.id, sessionId, prompt.summaryUpdate)
+  }
+  return prompt
+}
+
+// Buffered reply for a prepared prompt: the response cache first, then the
+// fastest healthy model in the pool under one of the shared upstream slots.
+// Returns { message, cached, model }.
+async function completePrompt(prompt) {
+  const cachedResponse = await lookupCachedResponse(prompt.messages, completionOptions)
+  if (cachedResponse) {
+    return { message: cachedResponse.message, cached: cachedResponse.source }
+  }
+
+  const { response, model } = await withUpstreamSlot(() => measureStage('openrouter', () => routeCompletion(openai, {
+    ...completionOptions,
+    messages: prompt.messages,
+  }, { promptTokens: prompt.tokens })))
+
+  const message = response.choices[0].message.content
+  await storeCachedResponse(prompt.messages, completionOptions, message)
+  return { message, cached: false, model }
+}
+
+// Stream the AI response as server-sent events and save the chat once it completes.
+// Events: `meta` (sessionId), `token` (content delta), `done` (final message, ids, cache source), `error`.
+// A cache hit is replayed as a single token event.
+// `flight` is the single-flight handle other requests for the same turn are waiting on.
+// `releaseSlot` frees the upstream slot held for the duration of the stream.
+function streamChatResponse(user, sessionId, prompt, turnMessages, cachedResponse, flight, releaseSlot) {
+  const promptMessages = prompt.messages
+  const encoder = new TextEncoder()
+  let completion = null
+  let cancelled = false
+
+  const body = new ReadableStream({
+    async start(controller) {
+      const send = (event, data) => {
+        if (!cancelled) {
+          controller.enqueue(encoder.encode(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`))
+        }
+      }
+
+      try {
+        send('meta', { sessionId })
+
+        if (cachedResponse) {
+          send('token', { content: cachedResponse.message })
+          const chat = await saveChat(user, sessionId, turnMessages, cachedResponse.message)
+          const result = {
+            message: cachedResponse.message,
+            sessionId: chat.sessionId,
+            chatId: chat.id,
+            cached: cachedResponse.source,
+          }
+          flight.resolve(result)
+          send('done', result)
+          return
+        }
+
+        // The stage covers the whole stream, not just the time to first byte
+        const endUpstream = startStage('openrouter')
+        let aiMessage = ''
+        let model
+        try {
+          const routed = await routeCompletion(openai, {
+            ...completionOptions,
+            messages: promptMessages,
+            stream: true,
+          }, { promptTokens: prompt.tokens })
+          completion = routed.response
+          model = routed.model
+          if (cancelled) completion.controller.abort()
+
+          for await (const chunk of completion) {
+            const delta = chunk.choices[0]?.delta?.content
+            if (delta) {
+              aiMessage += delta
+              send('token', { content: delta })
+            }
+          }
+        } finally {
+          endUpstream()
+        }
+
+        // Only persist turns the client actually received in full
+        if (!cancelled) {
+          await storeCachedResponse(promptMessages, completionOptions, aiMessage)
+          const chat = await saveChat(user, sessionId, turnMessages, aiMessage)
+          const result = { message: aiMessage, sessionId: chat.sessionId, chatId: chat.id, cached: false, model }
+          flight.resolve(result)
+          send('done', result)
+        }
+      } catch (error) {
+        flight.reject(error)
+        if (!cancelled) {
+          console.error('OpenRouter API Error:', error)
+          send('error', { error: 'Failed to get AI response' })
+        }
+      } finally {
+        releaseSlot()
+        if (!cancelled) {
+          controller.close()
+        }
+      }
+    },
+    cancel() {
+      // Client went away - stop paying for tokens nobody will read
+      cancelled = true
+      flight.reject(new Error('Client disconnected'))
+      completion?.controller.abort()
+      releaseSlot()
+    },
+  })
+
+  return new Response(body, { headers: sseHeaders })
+}
+
+// Run a batch of conversations with at most `concurrency` in flight and stream
+// one NDJSON line per item as it finishes, in completion order:
+//   { type: 'result', index, id, sessionId, message, cached, model }
+//   { type: 'error', index, id, error }
+// The finished turns are then saved in one bulk write and a final
+// { type: 'done', succeeded, failed, saved } line closes the stream.
+// Items are independent: two items for one sessionId don't see each other's replies.
+function streamBatchResponse(user, items, concurrency) {
+  const encoder = new TextEncoder()
+  let cancelled = false
+
+  const body = new ReadableStream({
+    async start(controller) {
+      const send = (line) => {
+        if (!cancelled) {
+          controller.enqueue(encoder.encode(`${JSON.stringify(line)}\n`))
+        }
+      }
+      const turns = []
+      let next = 0
+      let failed = 0
+
+      const runItem = async (index) => {
+        const item = items[index]
+        try {
+          const prompt = await prepareChatContext(user, item.sessionId, item.turnMessages)
+          const reply = await completePrompt(prompt)
+          turns.push({
+            sessionId: item.sessionId,
+            messages: [...item.turnMessages, { role: 'assistant', content: reply.message }],
+          })
+          send({ type: 'result', index, id: item.id, sessionId: item.sessionId, ...reply })
+        } catch (error) {
+          failed++
+          console.error('Batch item error:', error)
+          send({
+            type: 'error',
+            index,
+            id: item.id,
+            error: error instanceof UpstreamBusyError ? 'AI service is busy' : 'Failed to get AI response',
+          })
+        }
+      }
+
+      // A fixed set of workers pulling the next item keeps `concurrency` calls in flight
+      const worker = async () => {
+        while (!cancelled && next < items.length) {
+          await runItem(next++)
+        }
+      }
+      await Promise.all(Array.from({ length: Math.min(concurrency, items.length) }, worker))
+
+      // Completed turns are kept even if the client went away
+      let saved = false
+      try {
+        await appendTurns(user, turns)
+        saved = true
+      } catch (error) {
+        console.error('Batch save error:', error)
+      }
+      send({ type: 'done', succeeded: turns.length, failed, saved })
+      if (!cancelled) {
+        controller.close()
+      }
+    },
+    cancel() {
+      // Stop starting new items; those in flight finish and are saved
+      cancelled = true
+    },
+  })
+
+  return new Response(body, {
+    headers: { 'Content-Type': 'application/x-ndjson; charset=utf-8', 'Cache-Control': 'no-cache, no-transform' },
+  })
+}
+
+// Replay a turn completed by another request (coalesced or idempotent retry) as SSE
+function replayChatStream(result) {
+  const encoder = new TextEncoder()
+  const events = [
+    ['meta', { sessionId: result.sessionId }],
+    ['token', { content: result.message }],
+    ['done', { ...result, coalesced: true }],
+  ]
+  const body = events
+    .map(([event, data]) => `event: ${event}\ndata: ${JSON.stringify(data)}\n\n`)
+    .join('')
+  return new Response(encoder.encode(body), { headers: sseHeaders })
+}
+
+// Stream cursor documents as NDJSON, one session per line, optionally gzipped.
+// Documents are pulled only as fast as the client reads, so memory stays flat.
+function ndjsonExportResponse(cursor, { gzip = false } = {}) {
+  const encoder = new TextEncoder()
+  let body = new ReadableStream({
+    async pull(controller) {
+      try {
+        const doc = await cursor.next()
+        if (doc) {
+          controller.enqueue(encoder.encode(`${JSON.stringify(doc)}\n`))
+        } else {
+          await cursor.close()
+          controller.close()
+        }
+      } catch (error) {
+        console.error('Chat export error:', error)
+        await cursor.close().catch(() => {})
+        controller.error(error)
+      }
+    },
+    async cancel() {
+      await cursor.close()
+    },
+  }, { highWaterMark: 16 })
+
+  const date = new Date().toISOString().slice(0, 10)
+  const headers = { 'Cache-Control': 'no-store' }
+  if (gzip) {
+    body = body.pipeThrough(new CompressionStream('gzip'))
+    headers['Content-Type'] = 'application/gzip'
+    headers['Content-Disposition'] = `attachment; filename="syntherion-chats-${date}.ndjson.gz"`
+  } else {
+    headers['Content-Type'] = 'application/x-ndjson; charset=utf-8'
+    headers['Content-Disposition'] = `attachment; filename="syntherion-chats-${date}.ndjson"`
   }
+  return new Response(body, { headers })
+}
+
+// 429/503 with Retry-After for requests turned away by the rate limiter or a full upstream queue
+function tooBusyResponse(error, status, retryAfterMs, headers = {}) {
+  return NextResponse.json({ error }, {
+    status,
+    headers: { 'Retry-After': String(Math.max(1, Math.ceil(retryAfterMs / 1000))), ...headers },
+  })
 }
 
 // Authentication middleware
 async function authenticateUser() {
+  const user = await measureStage('auth', resolveUser)
+  setRequestAttribute('userId', user?.id)
+  return user
+}
+
+async function resolveUser() {
   // Check for test user cookie/header first
   const testUserCookie = cookies().get('test-user')
   if (testUserCookie && testUserCookie.value === 'test-user-123') {
@@ -80,18 +522,42 @@ async function authenticateUser() {
     }
   }
   
-  const supabase = createSupabaseServer()
-  const { data: { user }, error: authError } = await supabase.auth.getUser()
-  
-  if (authError || !user) {
+  // No Supabase auth cookie, no session: skip building a client at all
+  if (!cookies().getAll().some((cookie) => /^sb-.+-auth-token/.test(cookie.name))) {
     return null
   }
-  
-  return user
+
+  // The session cookie is read locally; only cache misses that can't be
+  // verified against the JWT secret/JWKS go to Supabase
+  const { data: { session } } = await createSupabaseServer().auth.getSession()
+  if (!session?.access_token) {
+    return null
+  }
+
+  return verifyAccessToken(session.access_token, async () => {
+    const { data: { user }, error: authError } = await measureStage('supabase_auth', () =>
+      getSharedSupabase().auth.getUser(session.access_token)
+    )
+    return authError ? null : user
+  })
+}
+
+function apiPath(request) {
+  return new URL(request.url).pathname.replace('/api/', '') || ''
 }
 
 export async function GET(request) {
-  const { pathname } = new URL(request.url)
+  const path = apiPath(request)
+  return withRequestMetrics(request, path, (req) => captureTraffic(req, path, handleGET))
+}
+
+export async function POST(request) {
+  const path = apiPath(request)
+  return withRequestMetrics(request, path, (req) => captureTraffic(req, path, handlePOST))
+}
+
+async function handleGET(request) {
+  const { pathname, searchParams } = new URL(request.url)
   const path = pathname.replace('/api/', '') || ''
 
   try {
@@ -100,7 +566,59 @@ export async function GET(request) {
     }
 
     if (path === 'health') {
-      return handleCORS(NextResponse.json({ status: 'healthy', timestamp: new Date().toISOString() }))
+      return handleCORS(NextResponse.json({
+        status: 'healthy',
+        timestamp: new Date().toISOString(),
+        mongoPool: getMongoPoolStats(),
+        authCache: getAuthCacheStats(),
+        sessionWrites: getSessionWriteStats(),
+        models: getModelRouterStats(),
+        rateLimit: getRateLimitStats(),
+        upstreamConnections: getUpstreamAgentStats(),
+        trafficCapture: getTrafficCaptureStats(),
+        tracing: getTracingStats(),
+      }))
+    }
+
+    // Readiness: 503 when a required dependency is down
+    if (path === 'health/ready') {
+      const deep = ['1', 'true'].includes(searchParams.get('deep'))
+      const report = await readinessProbe({ deep })
+      return handleCORS(NextResponse.json(report, { status: report.status === 'unhealthy' ? 503 : 200 }))
+    }
+
+    // Prometheus scrape endpoint
+    if (path === 'metrics') {
+      const token = process.env.METRICS_TOKEN
+      if (token && request.headers.get('authorization') !== `Bearer ${token}`) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+      return handleCORS(new Response(renderMetrics(), {
+        headers: { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8' },
+      }))
+    }
+
+    // Process diagnostics for soak tests (soak_test.py); only with DIAGNOSTICS_TOKEN set.
+    // ?gc=1 runs a full GC first when node was started with --expose-gc.
+    if (path === 'diagnostics') {
+      const token = process.env.DIAGNOSTICS_TOKEN
+      if (!token) {
+        return handleCORS(NextResponse.json({ error: 'Not found' }, { status: 404 }))
+      }
+      if (request.headers.get('authorization') !== `Bearer ${token}`) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+      const upstream = getUpstreamAgentStats()
+      return handleCORS(NextResponse.json({
+        ...getDiagnostics({ collectGarbage: searchParams.get('gc') === '1' }),
+        sockets: {
+          mongo: getMongoPoolStats().open,
+          upstreamActive: Object.values(upstream).reduce((total, pool) => total + pool.active, 0),
+          upstreamIdle: Object.values(upstream).reduce((total, pool) => total + pool.idle, 0),
+        },
+        supabaseServerClients,
+        sessionWriteQueue: getSessionWriteStats().depth ?? 0,
+      }))
     }
 
     // Auth endpoints
@@ -119,13 +637,83 @@ export async function GET(request) {
         return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
       }
 
-      const db = await connectToMongoDB()
-      const chats = await db.collection('chats')
-        .find({ userId: user.id })
-        .sort({ createdAt: -1 })
-        .toArray()
+      const before = searchParams.get('before') ? parseSessionCursor(searchParams.get('before')) : null
+      if (searchParams.get('before') && !before) {
+        return handleCORS(NextResponse.json({ error: 'Invalid before cursor' }, { status: 400 }))
+      }
+      const limit = Math.max(1, Math.min(parseInt(searchParams.get('limit'), 10) || DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+      const summary = ['1', 'true'].includes(searchParams.get('summary'))
+
+      const { chats, nextCursor } = await listSessions(user.id, { before, limit, summary })
 
-      return handleCORS(NextResponse.json({ chats }))
+      return handleCORS(await jsonResponse(request, { chats, nextCursor }))
+    }
+
+    // Export the user's full history as NDJSON (or gzipped NDJSON).
+    // ?from/?to bound updatedAt; ?after=<_id of the last line received> resumes an export.
+    if (path === 'chats/export') {
+      const user = await authenticateUser()
+      if (!user) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+
+      const dates = {}
+      for (const name of ['from', 'to']) {
+        if (searchParams.get(name)) {
+          dates[name] = new Date(searchParams.get(name))
+          if (Number.isNaN(dates[name].getTime())) {
+            return handleCORS(NextResponse.json({ error: `Invalid ${name} date` }, { status: 400 }))
+          }
+        }
+      }
+      const after = searchParams.get('after')
+      if (after && !/^[0-9a-f]{24}$/i.test(after)) {
+        return handleCORS(NextResponse.json({ error: 'Invalid after cursor' }, { status: 400 }))
+      }
+      const format = searchParams.get('format') || 'ndjson'
+      if (!['ndjson', 'gzip'].includes(format)) {
+        return handleCORS(NextResponse.json({ error: 'format must be ndjson or gzip' }, { status: 400 }))
+      }
+
+      const cursor = await exportSessionsCursor(user.id, { ...dates, after })
+      return handleCORS(ndjsonExportResponse(cursor, { gzip: format === 'gzip' }))
+    }
+
+    // Ranked full-text search over the user's sessions: ?q, ?limit, ?cursor (from nextCursor)
+    if (path === 'chats/search') {
+      const user = await authenticateUser()
+      if (!user) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+
+      const query = (searchParams.get('q') || '').trim()
+      if (!query || query.length > MAX_SEARCH_QUERY_LENGTH) {
+        return handleCORS(NextResponse.json(
+          { error: `q is required and at most ${MAX_SEARCH_QUERY_LENGTH} characters` },
+          { status: 400 }
+        ))
+      }
+      const limit = Math.max(1, Math.min(parseInt(searchParams.get('limit'), 10) || DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT))
+      const offset = Math.max(0, parseInt(searchParams.get('cursor'), 10) || 0)
+
+      const { results, nextCursor } = await searchSessions(user.id, query, { offset, limit })
+
+      return handleCORS(await jsonResponse(request, { results, nextCursor }))
+    }
+
+    // Get a single chat session with its messages
+    if (path.startsWith('chats/')) {
+      const user = await authenticateUser()
+      if (!user) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+
+      const session = await getSession(user.id, path.slice('chats/'.length))
+      if (!session) {
+        return handleCORS(NextResponse.json({ error: 'Not found' }, { status: 404 }))
+      }
+
+      return handleCORS(await jsonResponse(request, { chat: session }))
     }
 
     return handleCORS(NextResponse.json({ error: 'Not found' }, { status: 404 }))
@@ -135,7 +723,7 @@ export async function GET(request) {
   }
 }
 
-export async function POST(request) {
+async function handlePOST(request) {
   const { pathname } = new URL(request.url)
   const path = pathname.replace('/api/', '') || ''
 
@@ -217,6 +805,11 @@ export async function POST(request) {
         return handleCORS(response)
       }
       
+      const { data: { session } } = await supabase.auth.getSession()
+      if (session?.access_token) {
+        invalidateAccessToken(session.access_token)
+      }
+
       const { error } = await supabase.auth.signOut()
 
       if (error) {
@@ -226,6 +819,53 @@ export async function POST(request) {
       return handleCORS(NextResponse.json({ message: 'Signed out successfully' }))
     }
 
+    // Batch chat: { items: [{ id?, message | messages, sessionId? }], concurrency? }
+    // for offline jobs; authenticated once, rate-limited one batch token per item
+    if (path === 'chat/batch') {
+      const user = await authenticateUser()
+      if (!user) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+
+      const { items, concurrency } = body
+      if (!Array.isArray(items) || items.length === 0 || items.length > BATCH_MAX_ITEMS) {
+        return handleCORS(NextResponse.json(
+          { error: `items must be an array of 1 to ${BATCH_MAX_ITEMS} conversations` },
+          { status: 400 }
+        ))
+      }
+
+      const batch = []
+      for (const [index, item] of items.entries()) {
+        let turnMessages = null
+        if (typeof item?.message === 'string' && item.message.trim()) {
+          turnMessages = [{ role: 'user', content: item.message }]
+        } else if (Array.isArray(item?.messages)) {
+          turnMessages = newTurnMessages(item.messages)
+        }
+        if (!turnMessages || turnMessages.length === 0) {
+          return handleCORS(NextResponse.json(
+            { error: `items[${index}] needs a message or messages array` },
+            { status: 400 }
+          ))
+        }
+        batch.push({ id: item.id ?? index, sessionId: item.sessionId || uuidv4(), turnMessages })
+      }
+
+      // One token per item from the user's batch bucket; /api/chat has its own,
+      // so a batch never eats into the same user's interactive budget
+      const limit = await consumeRateLimit(`batch:${user.id}`, batch.length, BATCH_RATE_LIMIT)
+      if (!limit.allowed) {
+        return handleCORS(tooBusyResponse('Too many requests, slow down', 429, limit.retryAfterMs, {
+          'X-RateLimit-Limit': String(limit.limit),
+          'X-RateLimit-Remaining': String(limit.remaining),
+        }))
+      }
+
+      const workers = Math.max(1, Math.min(parseInt(concurrency, 10) || BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+      return handleCORS(streamBatchResponse(user, batch, workers))
+    }
+
     // Chat endpoint
     if (path === 'chat') {
       const user = await authenticateUser()
@@ -233,48 +873,124 @@ export async function POST(request) {
         return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
       }
 
-      const { messages, sessionId } = body
+      // Per-user token bucket, checked before any work is done for the request
+      const limit = await consumeRateLimit(`chat:${user.id}`)
+      if (!limit.allowed) {
+        return handleCORS(tooBusyResponse('Too many requests, slow down', 429, limit.retryAfterMs, {
+          'X-RateLimit-Limit': String(limit.limit),
+          'X-RateLimit-Remaining': '0',
+        }))
+      }
+
+      const { message, messages, sessionId, stream } = body
 
-      if (!messages || !Array.isArray(messages)) {
-        return handleCORS(NextResponse.json({ error: 'Messages array is required' }, { status: 400 }))
+      // The client sends just the new message; the server owns the history.
+      // Older clients send the whole transcript, of which only the tail is new.
+      let turnMessages = null
+      if (typeof message === 'string' && message.trim()) {
+        turnMessages = [{ role: 'user', content: message }]
+      } else if (Array.isArray(messages)) {
+        turnMessages = newTurnMessages(messages)
       }
 
-      try {
-        // Get AI response from OpenRouter
-        const response = await openai.chat.completions.create({
-          model: 'mistralai/mistral-7b-instruct',
-          messages: messages,
-          max_tokens: 1000,
-          temperature: 0.7,
+      if (!turnMessages || turnMessages.length === 0) {
+        return handleCORS(NextResponse.json({ error: 'A message or messages array is required' }, { status: 400 }))
+      }
+
+      const chatSessionId = sessionId || uuidv4()
+
+      // Concurrent duplicates of this turn share one upstream call and one write;
+      // with an Idempotency-Key the result is also replayed to later retries.
+      // Without a sessionId only the Idempotency-Key can tell a duplicate from a
+      // second new conversation, so those key on the freshly generated id.
+      const idempotencyKey = request.headers.get('idempotency-key')
+      const turnHash = hashMessages(turnMessages)
+      const flight = idempotencyKey
+        ? beginFlight(`idempotency:${user.id}:${idempotencyKey}`, {
+          retainMs: IDEMPOTENCY_TTL_MS,
+          fingerprint: `${sessionId || ''}:${turnHash}`,
         })
+        : beginFlight(`chat:${user.id}:${chatSessionId}:${turnHash}`)
 
-        const aiMessage = response.choices[0].message.content
+      if (flight.conflict) {
+        return handleCORS(NextResponse.json(
+          { error: 'Idempotency-Key was already used for a different request' },
+          { status: 422 }
+        ))
+      }
 
-        // Save chat to MongoDB
-        const db = await connectToMongoDB()
-        const chat = {
-          id: uuidv4(),
-          userId: user.id,
-          userEmail: user.email,
-          sessionId: sessionId || uuidv4(),
-          messages: [...messages, { role: 'assistant', content: aiMessage }],
-          createdAt: new Date(),
-          updatedAt: new Date()
+      if (!flight.leader) {
+        try {
+          const result = await flight.promise
+          return handleCORS(stream ? replayChatStream(result) : NextResponse.json({ ...result, coalesced: true }))
+        } catch (error) {
+          return handleCORS(NextResponse.json({ error: 'Failed to get AI response' }, { status: 500 }))
+        }
+      }
+
+      try {
+        const prompt = await prepareChatContext(user, chatSessionId, turnMessages)
+
+        if (stream) {
+          const cachedResponse = await lookupCachedResponse(prompt.messages, completionOptions)
+          // Cache misses wait for one of the shared upstream slots
+          const releaseSlot = cachedResponse ? () => {} : await measureStage('upstream_queue', acquireUpstreamSlot)
+          return handleCORS(streamChatResponse(user, chatSessionId, prompt, turnMessages, cachedResponse, flight, releaseSlot))
         }
 
-        await db.collection('chats').insertOne(chat)
+        const reply = await completePrompt(prompt)
 
-        return handleCORS(NextResponse.json({ 
-          message: aiMessage,
+        // Save chat to MongoDB
+        const chat = await saveChat(user, chatSessionId, turnMessages, reply.message)
+        const result = {
+          message: reply.message,
           sessionId: chat.sessionId,
-          chatId: chat.id
-        }))
+          chatId: chat.id,
+          cached: reply.cached,
+          model: reply.model,
+        }
+
+        flight.resolve(result)
+        return handleCORS(NextResponse.json(result))
       } catch (error) {
+        flight.reject(error)
+        if (error instanceof UpstreamBusyError) {
+          return handleCORS(tooBusyResponse('AI service is busy, try again shortly', 503, error.retryAfterMs))
+        }
         console.error('OpenRouter API Error:', error)
         return handleCORS(NextResponse.json({ error: 'Failed to get AI response' }, { status: 500 }))
       }
     }
 
+    // Benchmark fixtures, only for the caller's own data.
+    // reset: { history?, connections? }; seed: { count, messagesPerSession? }
+    if (benchmarkMode && (path === 'benchmark/reset' || path === 'benchmark/seed')) {
+      const user = await authenticateUser()
+      if (!user) {
+        return handleCORS(NextResponse.json({ error: 'Unauthorized' }, { status: 401 }))
+      }
+
+      if (path === 'benchmark/seed') {
+        const count = parseInt(body.count, 10)
+        if (!(count > 0 && count <= BENCHMARK_MAX_SEED)) {
+          return handleCORS(NextResponse.json(
+            { error: `count must be between 1 and ${BENCHMARK_MAX_SEED}` },
+            { status: 400 }
+          ))
+        }
+        const messagesPerSession = Math.max(1, Math.min(parseInt(body.messagesPerSession, 10) || 4, 100))
+        const seeded = await seedSessions(user, count, { messagesPerSession })
+        return handleCORS(NextResponse.json({ seeded }))
+      }
+
+      const deleted = body.history ? await deleteUserSessions(user.id) : 0
+      // The next request reconnects, so it measures a cold Mongo connection
+      if (body.connections) {
+        await closeMongoConnection()
+      }
+      return handleCORS(NextResponse.json({ deleted, connectionsClosed: Boolean(body.connections) }))
+    }
+
     return handleCORS(NextResponse.json({ error: 'Not found' }, { status: 404 }))
   } catch (error) {
     console.error('API Error:', error)
@@ -18,6 +18,33 @@ const supabase = createClient(
   process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY
 )
 
+// Parse a server-sent event stream from /api/chat, calling onEvent(event, data) per event
+async function readChatStream(response, onEvent) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
 export default function App() {
   const [user, setUser] = useState(null)
   const [loading, setLoading] = useState(true)
@@ -96,14 +123,19 @@ export default function App() {
 
   const loadChatHistory = async () => {
     try {
-      const response = await fetch('/api/chats')
+      // Only the most recent session is shown, so list summaries and fetch just that one
+      const response = await fetch('/api/chats?summary=1&limit=1')
       if (response.ok) {
         const data = await response.json()
         if (data.chats && data.chats.length > 0) {
           // Load the most recent chat
-          const latestChat = data.chats[0]
-          setMessages(latestChat.messages)
-          setSessionId(latestChat.sessionId)
+          const latestSessionId = data.chats[0].sessionId
+          const chatResponse = await fetch(`/api/chats/${encodeURIComponent(latestSessionId)}`)
+          if (chatResponse.ok) {
+            const { chat } = await chatResponse.json()
+            setMessages(chat.messages)
+            setSessionId(chat.sessionId)
+          }
         } else {
           // Welcome message for new users
           setMessages([{
@@ -189,23 +221,43 @@ export default function App() {
         headers: {
           'Content-Type': 'application/json',
         },
+        // The server keeps the conversation history, so only the new message is sent
         body: JSON.stringify({
-          messages: updatedMessages,
-          sessionId: sessionId
+          message: userMessage.content,
+          sessionId: sessionId,
+          stream: true
         }),
       })
 
-      const data = await response.json()
-
       if (!response.ok) {
         if (response.status === 401) {
           handleSignOut()
           return
         }
+        const data = await response.json()
+        if (response.status === 429 || response.status === 503) {
+          const retryAfter = response.headers.get('Retry-After')
+          setMessages([...updatedMessages, {
+            role: 'assistant',
+            content: `${data.error}.${retryAfter ? ` Please try again in ${retryAfter}s.` : ''}`
+          }])
+          return
+        }
         throw new Error(data.error || 'Failed to get response')
       }
 
-      setMessages([...updatedMessages, { role: 'assistant', content: data.message }])
+      // Render tokens as they arrive
+      let aiMessage = ''
+      await readChatStream(response, (event, data) => {
+        if (event === 'token') {
+          aiMessage += data.content
+          setMessages([...updatedMessages, { role: 'assistant', content: aiMessage }])
+        } else if (event === 'meta' && data.sessionId) {
+          setSessionId(data.sessionId)
+        } else if (event === 'error') {
+          throw new Error(data.error || 'Failed to get response')
+        }
+      })
     } catch (error) {
       console.error('Error sending message:', error)
       setMessages([...updatedMessages, { 
@@ -424,7 +476,7 @@ export default function App() {
                   </div>
                 ))}
                 
-                {chatLoading && (
+                {chatLoading && messages[messages.length - 1]?.role === 'user' && (
                   <div className="flex items-start space-x-3">
                     <Avatar className="h-8 w-8 bg-blue-600">
                       <AvatarFallback>
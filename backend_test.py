@@ -4,6 +4,7 @@ Syntherion AI Backend API Testing Suite
 Tests all backend endpoints including health, authentication, chat, and user management
 """
 
+import gzip
 import requests
 import json
 import uuid
@@ -12,7 +13,7 @@ import os
 from datetime import datetime
 
 # Configuration
-BASE_URL = "https://9cb6fa81-a1c2-4384-8647-fb04d744403a.preview.emergentagent.com"
+BASE_URL = os.environ.get("BASE_URL", "https://9cb6fa81-a1c2-4384-8647-fb04d744403a.preview.emergentagent.com")
 API_BASE = f"{BASE_URL}/api"
 
 # Test data
@@ -22,12 +23,54 @@ TEST_MESSAGES = [
     {"role": "user", "content": "Hello, can you help me with a simple question?"}
 ]
 
+
+def poll_until(call, done, timeout=10, interval=0.25):
+    """Call `call()` until `done(result)` is true or `timeout` seconds pass; returns the last result"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = call()
+        if done(result) or time.monotonic() >= deadline:
+            return result
+        time.sleep(interval)
+
+
 class SyntherionAPITester:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, session=None, user_email=None):
+        self.session = session or requests.Session()
         self.auth_token = None
         self.user_data = None
         self.session_id = str(uuid.uuid4())
+        # Email of a user already signed in on `session` (a shared fixture from suite_runner.py)
+        self.user_email = user_email
+
+    def sign_in_new_user(self, prefix):
+        """Sign up and sign in a fresh user on self.session, unless a signed-in fixture was provided.
+        Returns (email, None) once GET /api/auth/user accepts the session, or (None, step) for the step that failed"""
+        if self.user_email:
+            return self.user_email, None
+
+        unique_email = f"{prefix}_{int(time.time())}_{uuid.uuid4().hex[:6]}@syntherion.ai"
+        credentials = {"email": unique_email, "password": TEST_PASSWORD}
+
+        signup_response = self.session.post(f"{API_BASE}/auth/signup", json=credentials, timeout=15)
+        if signup_response.status_code != 200:
+            return None, "create"
+
+        signin_response = self.session.post(f"{API_BASE}/auth/signin", json=credentials, timeout=15)
+        if signin_response.status_code != 200:
+            return None, "sign in"
+
+        # Wait for the session cookie to be accepted instead of sleeping a fixed time
+        poll_until(lambda: self.session.get(f"{API_BASE}/auth/user", timeout=10),
+                   lambda response: response.status_code == 200)
+        return unique_email, None
+
+    def create_chat(self, content):
+        """POST a one-message chat in a new session; returns (session id, response)"""
+        session_id = str(uuid.uuid4())
+        response = self.session.post(f"{API_BASE}/chat", json={"message": content, "sessionId": session_id},
+                                     timeout=60)
+        return session_id, response
         
     def log_test(self, test_name, success, message, response_data=None):
         """Log test results"""
@@ -68,7 +111,7 @@ class SyntherionAPITester:
             cors_headers = {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key, If-None-Match, traceparent'
             }
             
             missing_headers = []
@@ -139,18 +182,16 @@ class SyntherionAPITester:
                 return self.log_test("Authentication Signin", False, 
                                    "Failed to create test user for signin test")
             
-            # Wait a moment for user creation to complete
-            time.sleep(2)
-            
-            # Now test signin
+            # Retry until the new user can sign in rather than sleeping a fixed time
             signin_payload = {
                 "email": unique_email,
                 "password": TEST_PASSWORD
             }
             
-            response = self.session.post(f"{API_BASE}/auth/signin", 
-                                       json=signin_payload, 
-                                       timeout=15)
+            response = poll_until(lambda: self.session.post(f"{API_BASE}/auth/signin", 
+                                                            json=signin_payload, 
+                                                            timeout=15),
+                                  lambda response: response.status_code == 200)
             
             if response.status_code == 200:
                 data = response.json()
@@ -193,39 +234,11 @@ class SyntherionAPITester:
     def test_user_info_authorized(self):
         """Test GET /api/auth/user endpoint with authentication"""
         try:
-            # First create and sign in a user
-            unique_email = f"userinfo_test_{int(time.time())}@syntherion.ai"
-            
-            # Create user
-            signup_payload = {
-                "email": unique_email,
-                "password": TEST_PASSWORD
-            }
-            
-            signup_response = self.session.post(f"{API_BASE}/auth/signup", 
-                                              json=signup_payload, 
-                                              timeout=15)
-            
-            if signup_response.status_code != 200:
+            # Sign in a user (or reuse the runner's shared one)
+            unique_email, failed_step = self.sign_in_new_user("userinfo_test")
+            if not unique_email:
                 return self.log_test("User Info (Authorized)", False, 
-                                   "Failed to create test user for user info test")
-            
-            # Sign in to get authentication
-            signin_payload = {
-                "email": unique_email,
-                "password": TEST_PASSWORD
-            }
-            
-            signin_response = self.session.post(f"{API_BASE}/auth/signin", 
-                                              json=signin_payload, 
-                                              timeout=15)
-            
-            if signin_response.status_code != 200:
-                return self.log_test("User Info (Authorized)", False, 
-                                   "Failed to sign in test user for user info test")
-            
-            # Wait for authentication to be processed
-            time.sleep(2)
+                                   f"Failed to {failed_step} test user for user info test")
             
             # Now test user info endpoint
             response = self.session.get(f"{API_BASE}/auth/user", timeout=10)
@@ -279,39 +292,11 @@ class SyntherionAPITester:
     def test_chat_authorized(self):
         """Test POST /api/chat endpoint with authentication"""
         try:
-            # First create and sign in a user
-            unique_email = f"chat_test_{int(time.time())}@syntherion.ai"
-            
-            # Create user
-            signup_payload = {
-                "email": unique_email,
-                "password": TEST_PASSWORD
-            }
-            
-            signup_response = self.session.post(f"{API_BASE}/auth/signup", 
-                                              json=signup_payload, 
-                                              timeout=15)
-            
-            if signup_response.status_code != 200:
-                return self.log_test("Chat (Authorized)", False, 
-                                   "Failed to create test user for chat test")
-            
-            # Sign in to get authentication
-            signin_payload = {
-                "email": unique_email,
-                "password": TEST_PASSWORD
-            }
-            
-            signin_response = self.session.post(f"{API_BASE}/auth/signin", 
-                                              json=signin_payload, 
-                                              timeout=15)
-            
-            if signin_response.status_code != 200:
+            # Sign in a user (or reuse the runner's shared one)
+            unique_email, failed_step = self.sign_in_new_user("chat_test")
+            if not unique_email:
                 return self.log_test("Chat (Authorized)", False, 
-                                   "Failed to sign in test user for chat test")
-            
-            # Wait for authentication to be processed
-            time.sleep(2)
+                                   f"Failed to {failed_step} test user for chat test")
             
             # Now test chat endpoint
             payload = {
@@ -369,39 +354,11 @@ class SyntherionAPITester:
     def test_chat_history_authorized(self):
         """Test GET /api/chats endpoint with authentication"""
         try:
-            # First create and sign in a user
-            unique_email = f"history_test_{int(time.time())}@syntherion.ai"
-            
-            # Create user
-            signup_payload = {
-                "email": unique_email,
-                "password": TEST_PASSWORD
-            }
-            
-            signup_response = self.session.post(f"{API_BASE}/auth/signup", 
-                                              json=signup_payload, 
-                                              timeout=15)
-            
-            if signup_response.status_code != 200:
-                return self.log_test("Chat History (Authorized)", False, 
-                                   "Failed to create test user for chat history test")
-            
-            # Sign in to get authentication
-            signin_payload = {
-                "email": unique_email,
-                "password": TEST_PASSWORD
-            }
-            
-            signin_response = self.session.post(f"{API_BASE}/auth/signin", 
-                                              json=signin_payload, 
-                                              timeout=15)
-            
-            if signin_response.status_code != 200:
+            # Sign in a user (or reuse the runner's shared one)
+            unique_email, failed_step = self.sign_in_new_user("history_test")
+            if not unique_email:
                 return self.log_test("Chat History (Authorized)", False, 
-                                   "Failed to sign in test user for chat history test")
-            
-            # Wait for authentication to be processed
-            time.sleep(2)
+                                   f"Failed to {failed_step} test user for chat history test")
             
             # Now test chat history endpoint
             response = self.session.get(f"{API_BASE}/chats", timeout=10)
@@ -425,6 +382,203 @@ class SyntherionAPITester:
         except Exception as e:
             return self.log_test("Chat History (Authorized)", False, f"Exception occurred: {str(e)}")
     
+    def test_chat_history_etag(self):
+        """Test GET /api/chats returns an ETag and 304 for an unchanged history (uses the history test session)"""
+        try:
+            first = self.session.get(f"{API_BASE}/chats", timeout=10)
+            etag = first.headers.get('ETag')
+            if first.status_code != 200 or not etag:
+                return self.log_test("Chat History ETag", False,
+                                   f"Expected 200 with an ETag, got {first.status_code} / {etag}")
+
+            repeat = self.session.get(f"{API_BASE}/chats", headers={"If-None-Match": etag}, timeout=10)
+            if repeat.status_code != 304 or repeat.content:
+                return self.log_test("Chat History ETag", False,
+                                   f"Expected an empty 304 for a matching If-None-Match, got {repeat.status_code}")
+
+            return self.log_test("Chat History ETag", True, "Unchanged history revalidated with 304")
+
+        except Exception as e:
+            return self.log_test("Chat History ETag", False, f"Exception occurred: {str(e)}")
+
+    def export_sessions(self, **params):
+        """GET /api/chats/export; returns (response, exported sessions)"""
+        response = self.session.get(f"{API_BASE}/chats/export", params=params, timeout=30)
+        if response.status_code != 200:
+            return response, []
+        text = gzip.decompress(response.content).decode() if params.get("format") == "gzip" else response.text
+        return response, [json.loads(line) for line in text.splitlines() if line]
+
+    def test_chat_export(self):
+        """Test GET /api/chats/export as NDJSON and gzip includes a chat created first"""
+        try:
+            unique_email, failed_step = self.sign_in_new_user("export_test")
+            if not unique_email:
+                return self.log_test("Chat Export", False, f"Failed to {failed_step} test user for export test")
+
+            content = f"Export check {uuid.uuid4().hex}"
+            session_id, chat = self.create_chat(content)
+            if chat.status_code != 200:
+                return self.log_test("Chat Export", False,
+                                   f"Could not create a chat to export: status {chat.status_code}", chat.text)
+
+            # Transcripts may be written behind the response, so wait for the session to show up
+            response, sessions = poll_until(
+                self.export_sessions,
+                lambda result: any(s.get('sessionId') == session_id for s in result[1]))
+            if response.status_code != 200:
+                return self.log_test("Chat Export", False,
+                                   f"Chat export failed with status {response.status_code}", response.text)
+            if not response.headers.get('content-type', '').startswith('application/x-ndjson'):
+                return self.log_test("Chat Export", False,
+                                   f"Unexpected content type {response.headers.get('content-type')}")
+            if any('sessionId' not in session or 'messages' not in session for session in sessions):
+                return self.log_test("Chat Export", False, "Export line missing sessionId or messages", sessions[:1])
+
+            exported = next((s for s in sessions if s['sessionId'] == session_id), None)
+            if not exported:
+                return self.log_test("Chat Export", False, f"Session {session_id} missing from the export")
+            roles = [m.get('role') for m in exported['messages']]
+            if exported['messages'][0].get('content') != content or 'assistant' not in roles:
+                return self.log_test("Chat Export", False,
+                                   "Exported session lacks the user message or the reply", exported)
+
+            gzipped, gzipped_sessions = self.export_sessions(format="gzip")
+            if gzipped.status_code != 200 or not any(s.get('sessionId') == session_id for s in gzipped_sessions):
+                return self.log_test("Chat Export", False,
+                                   f"Gzip export (status {gzipped.status_code}) is missing session {session_id}")
+
+            return self.log_test("Chat Export", True,
+                               f"Exported {len(sessions)} sessions as NDJSON and gzip, including the new chat")
+
+        except Exception as e:
+            return self.log_test("Chat Export", False, f"Exception occurred: {str(e)}")
+
+    def search_sessions(self, query):
+        """GET /api/chats/search; returns (response, results)"""
+        response = self.session.get(f"{API_BASE}/chats/search", params={"q": query, "limit": 5}, timeout=10)
+        return response, response.json().get('results', []) if response.status_code == 200 else []
+
+    def test_chat_search(self):
+        """Test GET /api/chats/search finds a new chat by a unique word, for its owner only"""
+        try:
+            unique_email, failed_step = self.sign_in_new_user("search_test")
+            if not unique_email:
+                return self.log_test("Chat Search", False, f"Failed to {failed_step} test user for search test")
+
+            missing = self.session.get(f"{API_BASE}/chats/search", timeout=10)
+            if missing.status_code != 400:
+                return self.log_test("Chat Search", False,
+                                   f"Expected 400 without q but got {missing.status_code}")
+
+            # A word no other chat contains; ends in a digit so stemming leaves it alone
+            token = f"zq{uuid.uuid4().hex[:10]}7"
+            session_id, chat = self.create_chat(f"Please remember the code word {token} for later.")
+            if chat.status_code != 200:
+                return self.log_test("Chat Search", False,
+                                   f"Could not create a chat to search: status {chat.status_code}", chat.text)
+
+            # Wait until the (possibly written-behind) transcript is in the text index
+            response, results = poll_until(
+                lambda: self.search_sessions(token),
+                lambda result: any(r.get('sessionId') == session_id for r in result[1]), timeout=15)
+            if response.status_code != 200:
+                return self.log_test("Chat Search", False,
+                                   f"Chat search failed with status {response.status_code}", response.text)
+            if 'nextCursor' not in response.json():
+                return self.log_test("Chat Search", False, "Search returned an invalid format", response.json())
+
+            found = next((r for r in results if r.get('sessionId') == session_id), None)
+            if not found:
+                return self.log_test("Chat Search", False, f"Search for {token} did not return the new session",
+                                   results)
+            if 'score' not in found or not any(token in snippet.get('text', '') for snippet in found.get('snippets', [])):
+                return self.log_test("Chat Search", False, "Result lacks a score or a snippet with the word", found)
+
+            # Another user must not see it
+            other = SyntherionAPITester()
+            other_email, failed_step = other.sign_in_new_user("search_other")
+            if not other_email:
+                return self.log_test("Chat Search", False, f"Failed to {failed_step} a second user for search test")
+            other_response, other_results = other.search_sessions(token)
+            if other_response.status_code != 200 or other_results:
+                return self.log_test("Chat Search", False,
+                                   f"Second user's search returned status {other_response.status_code} "
+                                   f"with {len(other_results)} results", other_results)
+
+            return self.log_test("Chat Search", True,
+                               f"Search found the session by {token} with a matching snippet; other users see nothing")
+
+        except Exception as e:
+            return self.log_test("Chat Search", False, f"Exception occurred: {str(e)}")
+
+    def test_chat_batch(self):
+        """Test POST /api/chat/batch streams one NDJSON result per item (uses the history test session)"""
+        try:
+            payload = {
+                "items": [
+                    {"id": "a", "message": "What is 2 + 2?"},
+                    {"id": "b", "message": "Name a primary colour."},
+                ],
+                "concurrency": 2,
+            }
+            response = self.session.post(f"{API_BASE}/chat/batch", json=payload, timeout=60, stream=True)
+
+            if response.status_code != 200:
+                return self.log_test("Chat Batch", False,
+                                   f"Batch failed with status {response.status_code}", response.text)
+
+            lines = [json.loads(line) for line in response.iter_lines() if line]
+            results = {line['id']: line for line in lines if line.get('type') == 'result'}
+            done = lines[-1] if lines else {}
+
+            if done.get('type') != 'done':
+                return self.log_test("Chat Batch", False, "Batch stream did not end with a done line", lines)
+            if set(results) != {"a", "b"} or not all(r.get('message') for r in results.values()):
+                return self.log_test("Chat Batch", False,
+                                   f"Expected results for a and b, got {done.get('failed')} failures", lines)
+            if not done.get('saved'):
+                return self.log_test("Chat Batch", False, "Batch results were not saved", done)
+
+            return self.log_test("Chat Batch", True,
+                               f"Batch completed {done['succeeded']} items and saved them")
+
+        except Exception as e:
+            return self.log_test("Chat Batch", False, f"Exception occurred: {str(e)}")
+
+    def test_chat_batch_over_interactive_burst(self):
+        """Test a batch larger than the interactive burst (10) is accepted and leaves /api/chat usable"""
+        try:
+            unique_email, failed_step = self.sign_in_new_user("batch_burst_test")
+            if not unique_email:
+                return self.log_test("Chat Batch Over Burst", False,
+                                   f"Failed to {failed_step} test user for batch burst test")
+
+            items = [{"id": str(i), "message": f"Batch burst item {i}"} for i in range(12)]
+            response = self.session.post(f"{API_BASE}/chat/batch", json={"items": items, "concurrency": 4},
+                                         timeout=120, stream=True)
+            if response.status_code != 200:
+                return self.log_test("Chat Batch Over Burst", False,
+                                   f"12-item batch failed with status {response.status_code}", response.text)
+
+            lines = [json.loads(line) for line in response.iter_lines() if line]
+            done = lines[-1] if lines else {}
+            if done.get('type') != 'done' or done.get('succeeded') != len(items):
+                return self.log_test("Chat Batch Over Burst", False,
+                                   "Batch did not complete every item", done)
+
+            # The batch spends its own bucket, so the interactive one is still full
+            _, chat = self.create_chat("Still allowed after a batch?")
+            if chat.status_code != 200:
+                return self.log_test("Chat Batch Over Burst", False,
+                                   f"Chat after the batch returned status {chat.status_code}", chat.text)
+
+            return self.log_test("Chat Batch Over Burst", True,
+                               f"Completed a {len(items)}-item batch and chatted afterwards")
+
+        except Exception as e:
+            return self.log_test("Chat Batch Over Burst", False, f"Exception occurred: {str(e)}")
+
     def run_all_tests(self):
         """Run all backend API tests"""
         print("=" * 80)
@@ -455,6 +609,11 @@ class SyntherionAPITester:
         # Chat history tests
         results.append(self.test_chat_history_unauthorized())
         results.append(self.test_chat_history_authorized())
+        results.append(self.test_chat_history_etag())
+        results.append(self.test_chat_export())
+        results.append(self.test_chat_search())
+        results.append(self.test_chat_batch())
+        results.append(self.test_chat_batch_over_interactive_burst())
         
         # Summary
         passed = sum(results)
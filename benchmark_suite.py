@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Benchmark Suite
+Runs fixed scenarios against the app (backed by upstream_stubs.py), stores the
+results as JSON baselines under benchmarks/baselines/ and fails when p95 latency
+or throughput regresses past a threshold
+
+The app must run with BENCHMARK_MODE=1 (enables the /api/benchmark/* fixture
+endpoints) and a rate limit high enough for the chat scenarios, e.g.
+RATE_LIMIT_BURST=1000 RATE_LIMIT_PER_MINUTE=60000.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from backend_test import API_BASE
+from load_generator import percentile
+from suite_runner import sign_in_test_user, wait_until_ready
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baselines")
+
+# Upstream stand-in settings applied before every run so results don't depend
+# on how upstream_stubs.py was started
+STUB_SETTINGS = {
+    "latency_ms": 200,
+    "jitter_ms": 0,
+    "slow_rate": 0,
+    "error_rate": 0,
+    "tokens_per_second": 50,
+    "response_tokens": 60,
+}
+
+PROMPT_WORDS = (
+    "Summarize the trade-offs between consistency availability and partition tolerance "
+    "for a chat service that stores every conversation in a document database"
+).split()
+
+# history: sessions seeded for the user first (None keeps whatever is there).
+# cold: drop the Mongo pool before every request. prompt_words: chat prompt length.
+Scenario = namedtuple("Scenario", "name method path history requests concurrency cold prompt_words")
+
+SCENARIOS = [
+    Scenario("health", "GET", "/health", None, 200, 8, False, 0),
+    Scenario("chats_cold", "GET", "/chats", 10, 20, 1, True, 0),
+    Scenario("chats_warm_10", "GET", "/chats", 10, 200, 8, False, 0),
+    Scenario("chats_warm_1k", "GET", "/chats", 1000, 200, 8, False, 0),
+    Scenario("chats_warm_10k", "GET", "/chats", 10000, 200, 8, False, 0),
+    Scenario("chat_prompt_short", "POST", "/chat", 10, 50, 4, False, 20),
+    Scenario("chat_prompt_medium", "POST", "/chat", 10, 50, 4, False, 500),
+    Scenario("chat_prompt_long", "POST", "/chat", 10, 50, 4, False, 3000),
+]
+
+WARMUP_REQUESTS = 5
+
+
+def prompt_text(words, index):
+    """A prompt of `words` words; the index makes every prompt unique so the response cache can't answer it"""
+    body = " ".join(PROMPT_WORDS[i % len(PROMPT_WORDS)] for i in range(words))
+    return f"[{index}] {body}"
+
+
+class BenchmarkClient:
+    """Thread-local sessions that all carry the fixture user's cookies"""
+
+    def __init__(self, cookies):
+        self.cookies = cookies
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.cookies.update(self.cookies)
+        return self.local.session
+
+    def post(self, path, payload, timeout=120):
+        response = self.session.post(f"{API_BASE}{path}", json=payload, timeout=timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST {path} returned {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+
+def prepare(client, scenario, prepared_history):
+    """Reset and seed the user's history for `scenario`; returns the history size now in place"""
+    if scenario.history is None or scenario.history == prepared_history:
+        return prepared_history
+    client.post("/benchmark/reset", {"history": True})
+    client.post("/benchmark/seed", {"count": scenario.history})
+    return scenario.history
+
+
+def timed_request(client, scenario, index):
+    """Issue one scenario request; returns (latency_ms, status or None on a transport error)"""
+    if scenario.cold:
+        client.post("/benchmark/reset", {"connections": True})
+
+    url = f"{API_BASE}{scenario.path}"
+    started = time.perf_counter()
+    try:
+        if scenario.method == "GET":
+            response = client.session.get(url, timeout=60)
+        else:
+            response = client.session.post(url, json={
+                "messages": [{"role": "user", "content": prompt_text(scenario.prompt_words, index)}],
+                "sessionId": str(uuid.uuid4()),
+            }, timeout=120)
+        response.content  # read the whole body
+        status = response.status_code
+    except requests.RequestException:
+        status = None
+    return (time.perf_counter() - started) * 1000, status
+
+
+def run_scenario(client, scenario):
+    run_id = uuid.uuid4().hex[:8]
+    for i in range(WARMUP_REQUESTS if not scenario.cold else 0):
+        timed_request(client, scenario, f"warmup-{run_id}-{i}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=scenario.concurrency) as pool:
+        samples = list(pool.map(lambda i: timed_request(client, scenario, f"{run_id}-{i}"), range(scenario.requests)))
+    wall_seconds = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, status in samples if status == 200)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": scenario.requests,
+        "concurrency": scenario.concurrency,
+        "history": scenario.history,
+        "errors": scenario.requests - len(latencies),
+        "statuses": statuses,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "rps": len(latencies) / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, max_p95_regression, max_throughput_regression):
+    """Rows of (scenario, old, new, problems) for scenarios in either run"""
+    rows = []
+    for name in dict.fromkeys([*baseline["scenarios"], *current["scenarios"]]):
+        old = baseline["scenarios"].get(name)
+        new = current["scenarios"].get(name)
+        problems = []
+        if new and new["errors"]:
+            problems.append(f"{new['errors']} errors")
+        if old and new:
+            if old["p95_ms"] and new["p95_ms"] > old["p95_ms"] * (1 + max_p95_regression / 100):
+                problems.append("p95")
+            if old["rps"] and new["rps"] < old["rps"] * (1 - max_throughput_regression / 100):
+                problems.append("throughput")
+        rows.append((name, old, new, problems))
+    return rows
+
+
+def change(old, new):
+    if not old or not new:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def cell(stats, key):
+    return f"{stats[key]:.1f}" if stats else "-"
+
+
+def print_comparison(rows, baseline_label, current_label):
+    print(f"\nComparing {current_label} against {baseline_label}")
+    print(f"{'Scenario':<20} {'p95 old':>9} {'p95 new':>9} {'Δ p95':>8} {'rps old':>9} {'rps new':>9} {'Δ rps':>8}  Status")
+    print("-" * 92)
+    for name, old, new, problems in rows:
+        status = "❌ " + ", ".join(problems) if problems else ("new" if not old else "removed" if not new else "✅")
+        print(f"{name:<20} {cell(old, 'p95_ms'):>9} {cell(new, 'p95_ms'):>9} "
+              f"{change(old and old['p95_ms'], new and new['p95_ms']):>8} "
+              f"{cell(old, 'rps'):>9} {cell(new, 'rps'):>9} {change(old and old['rps'], new and new['rps']):>8}  {status}")
+
+
+def baseline_path(name):
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Syntherion AI benchmark suite with stored baselines")
+    parser.add_argument("--scenario", action="append", choices=[s.name for s in SCENARIOS],
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--baseline", default="default",
+                        help="baseline name under benchmarks/baselines/ (or a .json path) to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the --baseline file")
+    parser.add_argument("--max-p95-regression", type=float, default=20,
+                        help="fail when a scenario's p95 grows by more than this percentage")
+    parser.add_argument("--max-throughput-regression", type=float, default=20,
+                        help="fail when a scenario's requests/second drops by more than this percentage")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="only print the comparison between two stored result files")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8001",
+                        help="OpenRouter stand-in to pin to STUB_SETTINGS ('' to leave it as is)")
+    parser.add_argument("--json-out", help="write this run's results to this path")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.compare:
+        old_path, new_path = (baseline_path(path) for path in args.compare)
+        rows = compare(load_results(old_path), load_results(new_path),
+                       args.max_p95_regression, args.max_throughput_regression)
+        print_comparison(rows, old_path, new_path)
+        sys.exit(1 if any(problems for *_, problems in rows) else 0)
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+
+    print("=" * 80)
+    print("SYNTHERION AI BENCHMARK SUITE")
+    print("=" * 80)
+    print(f"Testing against: {API_BASE}")
+    print(f"Scenarios: {', '.join(s.name for s in scenarios)}")
+    print(f"Test started at: {datetime.now().isoformat()}")
+    print("=" * 80)
+
+    if wait_until_ready(60) in (None, 503):
+        print("\n❌ API not ready after 60s")
+        sys.exit(1)
+    if args.stub_url:
+        response = requests.post(f"{args.stub_url.rstrip('/')}/__stub/config", json=STUB_SETTINGS, timeout=10)
+        response.raise_for_status()
+        print(f"Upstream stand-in pinned to: {json.dumps(STUB_SETTINGS)}")
+
+    cookies, _ = sign_in_test_user()
+    client = BenchmarkClient(cookies)
+    try:
+        client.post("/benchmark/reset", {})
+    except RuntimeError as e:
+        print(f"\n❌ Benchmark fixtures unavailable (is the app running with BENCHMARK_MODE=1?): {e}")
+        sys.exit(1)
+
+    results = {
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "base_url": API_BASE,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "stub_settings": STUB_SETTINGS if args.stub_url else None,
+        "scenarios": {},
+    }
+    prepared_history = None
+    for scenario in scenarios:
+        prepared_history = prepare(client, scenario, prepared_history)
+        stats = run_scenario(client, scenario)
+        results["scenarios"][scenario.name] = stats
+        print(f"{scenario.name:<20} p50 {stats['p50_ms']:8.1f}ms  p95 {stats['p95_ms']:8.1f}ms  "
+              f"p99 {stats['p99_ms']:8.1f}ms  {stats['rps']:8.1f} req/s  errors {stats['errors']}")
+        if stats["statuses"].get("429"):
+            print("   ⚠️  rate limited; raise RATE_LIMIT_BURST / RATE_LIMIT_PER_MINUTE for benchmarks")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_out}")
+
+    path = baseline_path(args.baseline)
+    failed = any(stats["errors"] for stats in results["scenarios"].values())
+    if os.path.exists(path):
+        rows = compare(load_results(path), results, args.max_p95_regression, args.max_throughput_regression)
+        print_comparison(rows, path, "this run")
+        failed = any(problems for *_, problems in rows)
+    else:
+        print(f"\nNo baseline at {path}; nothing to compare against")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {path}")
+
+    if failed:
+        print("\nBENCHMARK REGRESSION")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
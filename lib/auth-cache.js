@@ -0,0 +1,206 @@
+import crypto from 'crypto'
+
+// Verified sessions, keyed by a hash of the access token so raw tokens never sit in memory
+const ttlMs = parseInt(process.env.AUTH_CACHE_TTL_MS, 10) || 60000
+const maxEntries = parseInt(process.env.AUTH_CACHE_MAX_ENTRIES, 10) || 10000
+const jwtSecret = process.env.SUPABASE_JWT_SECRET
+const jwksUrl = process.env.SUPABASE_JWKS_URL ||
+  (process.env.NEXT_PUBLIC_SUPABASE_URL && `${process.env.NEXT_PUBLIC_SUPABASE_URL}/auth/v1/.well-known/jwks.json`)
+const JWKS_TTL_MS = 10 * 60 * 1000
+
+const SIGNING_ALGORITHMS = {
+  RS256: { hash: 'sha256' },
+  ES256: { hash: 'sha256', dsaEncoding: 'ieee-p1363' },
+}
+
+function getState() {
+  if (!globalThis._syntherionAuthCache) {
+    globalThis._syntherionAuthCache = {
+      entries: new Map(),
+      revoked: new Map(),
+      jwks: null,
+      stats: {
+        hits: 0,
+        misses: 0,
+        localVerified: 0,
+        localRejected: 0,
+        remoteVerified: 0,
+        evictions: 0,
+        invalidations: 0,
+      },
+    }
+  }
+  return globalThis._syntherionAuthCache
+}
+
+function tokenKey(accessToken) {
+  return crypto.createHash('sha256').update(accessToken).digest('hex')
+}
+
+function decodeSegment(segment) {
+  return JSON.parse(Buffer.from(segment, 'base64url').toString('utf8'))
+}
+
+// Fetch the project's signing keys, refreshing every few minutes
+async function loadJwks(state) {
+  if (!jwksUrl) return null
+  if (state.jwks && state.jwks.expiresAt > Date.now()) {
+    return state.jwks.keys
+  }
+  const response = await fetch(jwksUrl)
+  if (!response.ok) {
+    throw new Error(`JWKS request failed with status ${response.status}`)
+  }
+  const { keys = [] } = await response.json()
+  state.jwks = { keys, expiresAt: Date.now() + JWKS_TTL_MS }
+  return keys
+}
+
+// Check the token signature locally.
+// Returns the claims, `false` for a token that is definitely invalid, or
+// `null` when it can't be checked here (no key configured, unknown key id).
+async function verifyLocally(state, accessToken) {
+  const [headerSegment, payloadSegment, signatureSegment] = accessToken.split('.')
+  if (!signatureSegment) return false
+
+  let header, claims
+  try {
+    header = decodeSegment(headerSegment)
+    claims = decodeSegment(payloadSegment)
+  } catch {
+    return false
+  }
+
+  const signedData = Buffer.from(`${headerSegment}.${payloadSegment}`)
+  const signature = Buffer.from(signatureSegment, 'base64url')
+  let valid
+
+  if (header.alg === 'HS256') {
+    if (!jwtSecret) return null
+    const expected = crypto.createHmac('sha256', jwtSecret).update(signedData).digest()
+    valid = expected.length === signature.length && crypto.timingSafeEqual(expected, signature)
+  } else if (SIGNING_ALGORITHMS[header.alg]) {
+    let keys
+    try {
+      keys = await loadJwks(state)
+    } catch (error) {
+      console.error('JWKS fetch error:', error)
+      return null
+    }
+    const jwk = keys?.find((key) => key.kid === header.kid)
+    if (!jwk) return null
+    const { hash, dsaEncoding } = SIGNING_ALGORITHMS[header.alg]
+    const key = crypto.createPublicKey({ key: jwk, format: 'jwk' })
+    valid = crypto.verify(hash, signedData, dsaEncoding ? { key, dsaEncoding } : key, signature)
+  } else {
+    return null
+  }
+
+  if (!valid) return false
+  if (!claims.sub || claims.aud !== 'authenticated') return false
+  if (!claims.exp || claims.exp * 1000 <= Date.now()) return false
+  return claims
+}
+
+// Shape verified JWT claims like the user object supabase.auth.getUser() returns
+function userFromClaims(claims) {
+  return {
+    id: claims.sub,
+    aud: claims.aud,
+    role: claims.role,
+    email: claims.email,
+    phone: claims.phone,
+    app_metadata: claims.app_metadata || {},
+    user_metadata: claims.user_metadata || {},
+    is_anonymous: claims.is_anonymous || false,
+  }
+}
+
+function tokenExpiry(accessToken) {
+  try {
+    const exp = decodeSegment(accessToken.split('.')[1]).exp
+    return exp ? exp * 1000 : Date.now() + ttlMs
+  } catch {
+    return Date.now() + ttlMs
+  }
+}
+
+function remember(state, key, user, expiresAt) {
+  state.entries.delete(key)
+  state.entries.set(key, { user, expiresAt: Math.min(Date.now() + ttlMs, expiresAt) })
+  while (state.entries.size > maxEntries) {
+    state.entries.delete(state.entries.keys().next().value)
+    state.stats.evictions++
+  }
+}
+
+// Resolve the user for an access token: from the cache, by local JWT
+// verification, or finally through fetchUser (the Supabase round trip)
+export async function verifyAccessToken(accessToken, fetchUser) {
+  const state = getState()
+  const key = tokenKey(accessToken)
+  const now = Date.now()
+
+  const revokedUntil = state.revoked.get(key)
+  if (revokedUntil) {
+    if (revokedUntil > now) return null
+    state.revoked.delete(key)
+  }
+
+  const cached = state.entries.get(key)
+  if (cached && cached.expiresAt > now) {
+    // Refresh recency for LRU eviction
+    state.entries.delete(key)
+    state.entries.set(key, cached)
+    state.stats.hits++
+    return cached.user
+  }
+  if (cached) {
+    state.entries.delete(key)
+  }
+  state.stats.misses++
+
+  const claims = await verifyLocally(state, accessToken)
+  if (claims === false) {
+    state.stats.localRejected++
+    return null
+  }
+  if (claims) {
+    state.stats.localVerified++
+    const user = userFromClaims(claims)
+    remember(state, key, user, claims.exp * 1000)
+    return user
+  }
+
+  const user = await fetchUser()
+  if (!user) return null
+  state.stats.remoteVerified++
+  remember(state, key, user, tokenExpiry(accessToken))
+  return user
+}
+
+// Drop a token from the cache and refuse it until it expires (used on sign-out)
+export function invalidateAccessToken(accessToken) {
+  const state = getState()
+  const key = tokenKey(accessToken)
+  state.entries.delete(key)
+  state.revoked.set(key, tokenExpiry(accessToken))
+  state.stats.invalidations++
+
+  // Revocations are only needed until the token would have expired anyway
+  for (const [revokedKey, until] of state.revoked) {
+    if (until <= Date.now()) state.revoked.delete(revokedKey)
+  }
+}
+
+export function getAuthCacheStats() {
+  const state = getState()
+  const lookups = state.stats.hits + state.stats.misses
+  return {
+    ...state.stats,
+    size: state.entries.size,
+    revoked: state.revoked.size,
+    hitRate: lookups ? state.stats.hits / lookups : 0,
+    localVerification: jwtSecret ? 'hs256' : jwksUrl ? 'jwks' : 'disabled',
+  }
+}
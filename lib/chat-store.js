@@ -0,0 +1,486 @@
+import crypto from 'crypto'
+import { ObjectId } from 'mongodb'
+import { connectToMongoDB } from '@/lib/mongodb'
+import { measureStage } from '@/lib/metrics'
+import { getWriteBehindQueue } from '@/lib/write-behind'
+
+// One document per conversation; turns are appended with $push
+export const SESSIONS_COLLECTION = 'sessions'
+
+const TITLE_LENGTH = 60
+
+export const DEFAULT_PAGE_SIZE = 50
+export const MAX_PAGE_SIZE = 200
+// Sessions fetched per cursor round trip during exports
+const EXPORT_BATCH_SIZE = 100
+
+export const DEFAULT_SEARCH_LIMIT = 20
+export const MAX_SEARCH_LIMIT = 50
+// Matching messages turned into snippets per session, and context kept around each match
+const SNIPPETS_PER_SESSION = 3
+const SNIPPET_CONTEXT = 60
+// Synthetic sessions inserted per insertMany when seeding benchmark history
+const SEED_BATCH_SIZE = 1000
+
+// Transcript appends are acknowledged before they reach Mongo unless WRITE_BEHIND=false
+const writeBehind = process.env.WRITE_BEHIND !== 'false'
+// Ids of the most recent queued appends kept on each session so retried writes are not applied twice
+const APPLIED_OPS_KEPT = 50
+
+// Fields returned by the summary listing; messages are fetched per session
+const SUMMARY_PROJECTION = {
+  _id: 0,
+  id: 1,
+  sessionId: 1,
+  title: 1,
+  messageCount: 1,
+  createdAt: 1,
+  updatedAt: 1,
+}
+
+// Bookkeeping fields never returned to clients
+const INTERNAL_PROJECTION = { appliedOps: 0, legacyChatIds: 0 }
+// Full sessions as returned by the API: the public id, not Mongo's _id, and no owner fields
+const SESSION_PROJECTION = { ...INTERNAL_PROJECTION, _id: 0, userId: 0, userEmail: 0 }
+
+// Create the indexes the session queries rely on, once per process
+function ensureIndexes(db) {
+  if (!globalThis._syntherionSessionIndexes) {
+    globalThis._syntherionSessionIndexes = db.collection(SESSIONS_COLLECTION).createIndexes([
+      // History listing and cursor pagination: find({ userId }).sort({ updatedAt: -1, _id: -1 })
+      { key: { userId: 1, updatedAt: -1, _id: -1 }, name: 'userId_updatedAt_id' },
+      // Appends and single-session fetches: { sessionId, userId }
+      { key: { sessionId: 1, userId: 1 }, name: 'sessionId_userId' },
+      // Exports walk a user's sessions in _id order so they can resume after any document
+      { key: { userId: 1, _id: 1 }, name: 'userId_id' },
+      // Search: the userId prefix keeps every text query to one user's postings
+      {
+        key: { userId: 1, title: 'text', 'messages.content': 'text' },
+        name: 'userId_text',
+        weights: { title: 3, 'messages.content': 1 },
+        default_language: 'english',
+      },
+    ]).catch((error) => {
+      globalThis._syntherionSessionIndexes = null
+      console.error('Failed to create session indexes:', error)
+    })
+  }
+  return globalThis._syntherionSessionIndexes
+}
+
+async function sessionsCollection() {
+  const db = await connectToMongoDB()
+  await ensureIndexes(db)
+  return db.collection(SESSIONS_COLLECTION)
+}
+
+// Keep only the fields the model API understands
+function toStoredMessage(message) {
+  return { role: message.role, content: message.content }
+}
+
+// Title a session after its first user message
+export function sessionTitle(messages) {
+  const first = messages.find((message) => message.role === 'user')
+  const text = (first?.content || 'New chat').replace(/\s+/g, ' ').trim()
+  return text.length > TITLE_LENGTH ? `${text.slice(0, TITLE_LENGTH - 1)}…` : text
+}
+
+// Messages the client sent since the last assistant reply, i.e. the ones not stored yet
+export function newTurnMessages(messages) {
+  let start = messages.length
+  while (start > 0 && messages[start - 1].role !== 'assistant') {
+    start--
+  }
+  return messages.slice(start)
+}
+
+// Append a turn to the user's session, creating the session on first use.
+// With write-behind enabled the append is queued and written in the background.
+export async function appendToSession(user, sessionId, turnMessages) {
+  const messages = turnMessages.map(toStoredMessage)
+
+  if (writeBehind) {
+    await appendQueue().enqueue({
+      opId: crypto.randomUUID(),
+      userId: user.id,
+      userEmail: user.email,
+      sessionId,
+      messages,
+      at: new Date().toISOString(),
+    })
+    return { id: sessionId, sessionId }
+  }
+
+  const sessions = await sessionsCollection()
+  const { updateOne } = appendOperation(user, sessionId, messages, new Date())
+  await measureStage('mongo_write', () => sessions.updateOne(updateOne.filter, updateOne.update, { upsert: true }))
+
+  return { id: sessionId, sessionId }
+}
+
+// Upsert that appends `messages` to a session
+function appendOperation(user, sessionId, messages, now) {
+  return {
+    updateOne: {
+      filter: { sessionId, userId: user.id },
+      update: {
+        $push: { messages: { $each: messages } },
+        $inc: { messageCount: messages.length },
+        $set: { updatedAt: now },
+        $setOnInsert: {
+          id: sessionId,
+          userEmail: user.email,
+          title: sessionTitle(messages),
+          createdAt: now,
+        },
+      },
+      upsert: true,
+    },
+  }
+}
+
+// Append many turns at once, e.g. the results of a batch request: one
+// bulkWrite, or with write-behind one trip through the queue.
+// `turns` is a list of { sessionId, messages }.
+export async function appendTurns(user, turns) {
+  if (turns.length === 0) return
+  if (writeBehind) {
+    await Promise.all(turns.map((turn) => appendToSession(user, turn.sessionId, turn.messages)))
+    return
+  }
+
+  const sessions = await sessionsCollection()
+  const now = new Date()
+  await measureStage('mongo_write', () => sessions.bulkWrite(
+    turns.map((turn) => appendOperation(user, turn.sessionId, turn.messages.map(toStoredMessage), now)),
+    // Ordered, so turns for the same session land in the order they were given
+    { ordered: true }
+  ))
+}
+
+// Upsert for one queued append. A pipeline update so the append is skipped
+// when its opId was already applied by an earlier attempt whose ack was lost.
+function queuedAppendOperation(item) {
+  const at = new Date(item.at)
+  const fresh = { $not: [{ $in: [item.opId, { $ifNull: ['$appliedOps', []] }] }] }
+  return {
+    updateOne: {
+      filter: { sessionId: item.sessionId, userId: item.userId },
+      update: [
+        { $set: { _fresh: fresh } },
+        {
+          $set: {
+            messages: {
+              $cond: ['$_fresh', { $concatArrays: [{ $ifNull: ['$messages', []] }, { $literal: item.messages }] }, '$messages'],
+            },
+            messageCount: {
+              $cond: ['$_fresh', { $add: [{ $ifNull: ['$messageCount', 0] }, item.messages.length] }, '$messageCount'],
+            },
+            appliedOps: {
+              $cond: [
+                '$_fresh',
+                { $slice: [{ $concatArrays: [{ $ifNull: ['$appliedOps', []] }, [item.opId]] }, -APPLIED_OPS_KEPT] },
+                '$appliedOps',
+              ],
+            },
+            updatedAt: { $max: ['$updatedAt', at] },
+            id: { $ifNull: ['$id', { $literal: item.sessionId }] },
+            userEmail: { $ifNull: ['$userEmail', { $literal: item.userEmail }] },
+            title: { $ifNull: ['$title', { $literal: sessionTitle(item.messages) }] },
+            createdAt: { $ifNull: ['$createdAt', at] },
+          },
+        },
+        { $unset: '_fresh' },
+      ],
+      upsert: true,
+    },
+  }
+}
+
+// Write a batch of queued appends in one ordered bulkWrite. Order matters for
+// appends to the same session, so on failure everything from the first failed
+// operation onwards is retried.
+async function writeQueuedAppends(items) {
+  const sessions = await sessionsCollection()
+  try {
+    await measureStage('mongo_write', () => sessions.bulkWrite(items.map(queuedAppendOperation), { ordered: true }))
+  } catch (error) {
+    const writeErrors = [].concat(error.writeErrors || [])
+    if (writeErrors.length) {
+      const firstFailed = Math.min(...writeErrors.map((writeError) => writeError.index))
+      error.failedIndexes = items.map((_, index) => index).slice(firstFailed)
+    }
+    throw error
+  }
+}
+
+function appendQueue() {
+  return getWriteBehindQueue('session-appends', writeQueuedAppends)
+}
+
+// Queued appends for a session that are not (known to be) in Mongo yet
+function pendingAppends(userId, sessionId, appliedOps = []) {
+  if (!writeBehind) return []
+  const applied = new Set(appliedOps)
+  return appendQueue()
+    .pending()
+    .filter((item) => item.userId === userId && item.sessionId === sessionId && !applied.has(item.opId))
+}
+
+// Overlay queued appends on a stored session so a user reads their own writes
+function withPendingAppends(session, userId, sessionId, historyLimit = null) {
+  const pending = pendingAppends(userId, sessionId, session?.appliedOps)
+  if (session) delete session.appliedOps
+  if (!pending.length) return session
+
+  const messages = pending.flatMap((item) => item.messages)
+  const merged = session || {
+    id: sessionId,
+    sessionId,
+    title: sessionTitle(messages),
+    createdAt: new Date(pending[0].at),
+    messageCount: 0,
+    messages: [],
+  }
+  merged.messages = [...(merged.messages || []), ...messages]
+  if (historyLimit) merged.messages = merged.messages.slice(-historyLimit)
+  merged.messageCount = (merged.messageCount || 0) + messages.length
+  merged.updatedAt = new Date(pending[pending.length - 1].at)
+  return merged
+}
+
+export function getSessionWriteStats() {
+  return { writeBehind, ...(writeBehind ? appendQueue().getStats() : {}) }
+}
+
+// Write out queued appends now, e.g. before reading sessions back in bulk
+export async function flushSessionWrites() {
+  if (writeBehind) await appendQueue().flush()
+}
+
+// History page cursors are `<updatedAt ISO>_<_id hex>`: many sessions can share
+// one updatedAt (every session in a batch append gets the same timestamp), so
+// _id breaks the tie. A bare ISO timestamp (older clients) is still accepted.
+// Returns { updatedAt, id } or null when the value is malformed.
+export function parseSessionCursor(value) {
+  const [time, id] = value.split('_')
+  const updatedAt = new Date(time)
+  if (Number.isNaN(updatedAt.getTime()) || (id !== undefined && !/^[0-9a-f]{24}$/i.test(id))) {
+    return null
+  }
+  return { updatedAt, id: id === undefined ? null : new ObjectId(id) }
+}
+
+function sessionCursor(session) {
+  return `${session.updatedAt.toISOString()}_${session._id.toHexString()}`
+}
+
+// A page of the user's sessions, most recently active first.
+// `before` is the parsed nextCursor of the previous page (see parseSessionCursor).
+// Appends still queued by write-behind show up once flushed.
+export async function listSessions(userId, { before = null, limit = DEFAULT_PAGE_SIZE, summary = false } = {}) {
+  const sessions = await sessionsCollection()
+  const filter = { userId }
+  if (before?.id) {
+    filter.$or = [
+      { updatedAt: { $lt: before.updatedAt } },
+      { updatedAt: before.updatedAt, _id: { $lt: before.id } },
+    ]
+  } else if (before) {
+    filter.updatedAt = { $lt: before.updatedAt }
+  }
+
+  // _id is fetched for the cursor and stripped from the response
+  const projection = { ...(summary ? SUMMARY_PROJECTION : SESSION_PROJECTION) }
+  delete projection._id
+
+  // Fetch one extra document to know whether another page exists
+  const page = await measureStage('mongo_query', () => sessions
+    .find(filter, { projection })
+    .sort({ updatedAt: -1, _id: -1 })
+    .limit(limit + 1)
+    .toArray())
+
+  const hasMore = page.length > limit
+  const chats = hasMore ? page.slice(0, limit) : page
+  return {
+    chats: chats.map(({ _id, ...chat }) => chat),
+    nextCursor: hasMore ? sessionCursor(chats[chats.length - 1]) : null,
+  }
+}
+
+// Cursor over all of a user's sessions for export, oldest first.
+// `from`/`to` bound updatedAt; `after` is the _id of the last session already exported.
+export async function exportSessionsCursor(userId, { from = null, to = null, after = null } = {}) {
+  await flushSessionWrites()
+  const sessions = await sessionsCollection()
+  const filter = { userId }
+  if (after) {
+    filter._id = { $gt: new ObjectId(after) }
+  }
+  if (from || to) {
+    filter.updatedAt = {
+      ...(from ? { $gte: from } : {}),
+      ...(to ? { $lt: to } : {}),
+    }
+  }
+  return sessions
+    .find(filter, { projection: INTERNAL_PROJECTION })
+    .sort({ _id: 1 })
+    .batchSize(EXPORT_BATCH_SIZE)
+}
+
+function escapeRegExp(text) {
+  return text.replace(/[.*+?^${}()|[\]\\]/g, '\\$&')
+}
+
+// Search terms as the text index sees them: words and quoted phrases, minus negations
+function searchTerms(query) {
+  const terms = []
+  for (const match of query.matchAll(/(-?)"([^"]+)"|(-?)(\S+)/g)) {
+    if (match[1] || match[3]) continue
+    terms.push((match[2] || match[4]).trim())
+  }
+  return terms.filter(Boolean)
+}
+
+// A window of text around the first term found, with ellipses where it was cut
+function snippet(text, pattern) {
+  const match = pattern.exec(text)
+  if (!match) {
+    return text.length > SNIPPET_CONTEXT * 2 ? `${text.slice(0, SNIPPET_CONTEXT * 2)}…` : text
+  }
+  const start = Math.max(0, match.index - SNIPPET_CONTEXT)
+  const end = Math.min(text.length, match.index + match[0].length + SNIPPET_CONTEXT)
+  return `${start > 0 ? '…' : ''}${text.slice(start, end).replace(/\s+/g, ' ').trim()}${end < text.length ? '…' : ''}`
+}
+
+// Ranked full-text search over a user's sessions.
+// Returns { results: [{ id, sessionId, title, updatedAt, score, snippets }], nextCursor }
+// where nextCursor is the offset of the next page.
+export async function searchSessions(userId, query, { offset = 0, limit = DEFAULT_SEARCH_LIMIT } = {}) {
+  const sessions = await sessionsCollection()
+  const terms = searchTerms(query)
+  // Text search matches stems ("running" finds "run"), so snippets match on the terms' prefixes
+  const pattern = terms.length
+    ? new RegExp(terms.map((term) => escapeRegExp(term.length > 4 ? term.slice(0, -2) : term)).join('|'), 'i')
+    : null
+
+  const page = await measureStage('mongo_query', () => sessions.aggregate([
+    { $match: { userId, $text: { $search: query } } },
+    { $sort: { score: { $meta: 'textScore' }, updatedAt: -1 } },
+    { $skip: offset },
+    { $limit: limit + 1 },
+    {
+      $project: {
+        _id: 0,
+        id: 1,
+        sessionId: 1,
+        title: 1,
+        updatedAt: 1,
+        score: { $meta: 'textScore' },
+        // Only the matching messages of this page's sessions leave the server
+        matches: pattern
+          ? {
+            $slice: [
+              {
+                $filter: {
+                  input: '$messages',
+                  cond: { $regexMatch: { input: '$$this.content', regex: pattern.source, options: 'i' } },
+                },
+              },
+              SNIPPETS_PER_SESSION,
+            ],
+          }
+          : [],
+      },
+    },
+  ]).toArray())
+
+  const hasMore = page.length > limit
+  const results = (hasMore ? page.slice(0, limit) : page).map(({ matches, ...session }) => ({
+    ...session,
+    snippets: matches.map((message) => ({ role: message.role, text: snippet(message.content, pattern) })),
+  }))
+  return { results, nextCursor: hasMore ? String(offset + limit) : null }
+}
+
+// A single session with its full transcript, including queued appends
+export async function getSession(userId, sessionId) {
+  const sessions = await sessionsCollection()
+  const session = await measureStage('mongo_query', () => sessions.findOne(
+    { sessionId, userId },
+    // appliedOps is kept here so queued appends already written aren't shown twice
+    { projection: { _id: 0, userId: 0, userEmail: 0 } }
+  ))
+  return withPendingAppends(session, userId, sessionId)
+}
+
+// The recent part of a session used to build the model prompt
+export async function getSessionContext(userId, sessionId, historyLimit) {
+  const sessions = await sessionsCollection()
+  const session = await measureStage('mongo_query', () => sessions.findOne(
+    { sessionId, userId },
+    {
+      projection: {
+        _id: 0,
+        messages: { $slice: -historyLimit },
+        messageCount: 1,
+        summary: 1,
+        summarizedCount: 1,
+        appliedOps: 1,
+      },
+    }
+  ))
+  return withPendingAppends(session, userId, sessionId, historyLimit)
+}
+
+// Store the rolling summary of the messages that no longer fit the context window
+export async function saveSessionSummary(userId, sessionId, { summary, summarizedCount }) {
+  const sessions = await sessionsCollection()
+  await measureStage('mongo_write', () =>
+    sessions.updateOne({ sessionId, userId }, { $set: { summary, summarizedCount } })
+  )
+}
+
+// Benchmark fixtures: insert `count` synthetic sessions for `user`, one
+// minute apart so history pages sort deterministically. Returns the count inserted.
+export async function seedSessions(user, count, { messagesPerSession = 4 } = {}) {
+  const sessions = await sessionsCollection()
+  const start = Date.now() - count * 60000
+  let inserted = 0
+  for (let offset = 0; offset < count; offset += SEED_BATCH_SIZE) {
+    const documents = []
+    for (let i = offset; i < Math.min(count, offset + SEED_BATCH_SIZE); i++) {
+      const sessionId = crypto.randomUUID()
+      const at = new Date(start + i * 60000)
+      const messages = Array.from({ length: messagesPerSession }, (_, turn) => ({
+        role: turn % 2 === 0 ? 'user' : 'assistant',
+        content: `Benchmark conversation ${i} message ${turn}: the quick brown fox jumps over the lazy dog.`,
+      }))
+      documents.push({
+        id: sessionId,
+        sessionId,
+        userId: user.id,
+        userEmail: user.email,
+        title: sessionTitle(messages),
+        messages,
+        messageCount: messages.length,
+        createdAt: at,
+        updatedAt: at,
+      })
+    }
+    const result = await measureStage('mongo_write', () => sessions.insertMany(documents, { ordered: false }))
+    inserted += result.insertedCount
+  }
+  return inserted
+}
+
+// Remove every session belonging to `userId`. Returns the count deleted.
+export async function deleteUserSessions(userId) {
+  await flushSessionWrites()
+  const sessions = await sessionsCollection()
+  const result = await measureStage('mongo_write', () => sessions.deleteMany({ userId }))
+  return result.deletedCount
+}
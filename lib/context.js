@@ -0,0 +1,95 @@
+// Server-side conversation context: fit stored history plus the new turn into a token budget
+
+const tokenBudget = parseInt(process.env.CONTEXT_TOKEN_BUDGET, 10) || 6000
+const strategy = process.env.CONTEXT_STRATEGY === 'summary' ? 'summary' : 'truncate'
+// Share of the budget kept free for the rolling summary in `summary` mode
+const SUMMARY_SHARE = 0.25
+// Fixed per-message cost of the chat template (role markers, separators)
+const MESSAGE_OVERHEAD_TOKENS = 4
+
+export const CONTEXT_HISTORY_LIMIT = parseInt(process.env.CONTEXT_HISTORY_LIMIT, 10) || 200
+
+// Approximate token count. No tokenizer ships with the app, so use the usual
+// ~4 characters per token heuristic, which errs high for English prose.
+export function estimateTokens(text) {
+  return Math.ceil((text || '').length / 4)
+}
+
+export function messageTokens(message) {
+  return estimateTokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+}
+
+function summaryMessage(summary) {
+  return { role: 'system', content: `Summary of the earlier conversation:\n${summary}` }
+}
+
+// Index into `history` of the oldest message that still fits in `budget`
+function windowStart(history, budget) {
+  let used = 0
+  let start = history.length
+  while (start > 0) {
+    const cost = messageTokens(history[start - 1])
+    if (used + cost > budget) break
+    used += cost
+    start--
+  }
+  return start
+}
+
+// Build the prompt for a turn.
+//
+// `session` is the stored context ({ messages, messageCount, summary, summarizedCount })
+// with `messages` holding only the most recent CONTEXT_HISTORY_LIMIT entries.
+// `summarize(previousSummary, messages)` produces a new rolling summary; it is
+// only called in `summary` mode when older messages fall out of the window.
+// Returns { messages, tokens, dropped, summaryUpdate } where summaryUpdate, if
+// set, should be saved back to the session.
+export async function buildPromptMessages(session, turnMessages, { summarize } = {}) {
+  const history = session?.messages || []
+  const turnTokens = turnMessages.reduce((total, message) => total + messageTokens(message), 0)
+  const historyBudget = Math.max(0, tokenBudget - turnTokens)
+
+  if (strategy !== 'summary' || !summarize) {
+    const start = windowStart(history, historyBudget)
+    const messages = [...history.slice(start), ...turnMessages]
+    return {
+      messages,
+      tokens: messages.reduce((total, message) => total + messageTokens(message), 0),
+      dropped: (session?.messageCount || history.length) - (history.length - start),
+      summaryUpdate: null,
+    }
+  }
+
+  // Absolute position of history[0] within the full transcript
+  const base = (session?.messageCount || history.length) - history.length
+  let summary = session?.summary || null
+  let summarizedCount = session?.summarizedCount || 0
+
+  const start = windowStart(history, Math.floor(historyBudget * (1 - SUMMARY_SHARE)))
+  let summaryUpdate = null
+
+  // Fold messages that slid out of the window into the rolling summary
+  if (summarizedCount < base + start) {
+    const fold = history.slice(Math.max(0, summarizedCount - base), start)
+    try {
+      summary = await summarize(summary, fold)
+      summarizedCount = base + start
+      summaryUpdate = { summary, summarizedCount }
+    } catch (error) {
+      console.error('Context summary error:', error)
+    }
+  }
+
+  // If summarising failed, the older messages are simply dropped
+  const messages = [
+    ...(summary ? [summaryMessage(summary)] : []),
+    ...history.slice(start),
+    ...turnMessages,
+  ]
+  return {
+    messages,
+    tokens: messages.reduce((total, message) => total + messageTokens(message), 0),
+    dropped: base + start,
+    summaryUpdate,
+  }
+}
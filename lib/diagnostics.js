@@ -0,0 +1,114 @@
+import { constants, monitorEventLoopDelay, PerformanceObserver } from 'perf_hooks'
+import v8 from 'v8'
+
+// Process diagnostics for soak tests: memory, GC pauses (from a
+// PerformanceObserver on 'gc' entries), event loop delay and the handles and
+// requests keeping the process busy
+
+const GC_KINDS = {
+  [constants.NODE_PERFORMANCE_GC_MINOR]: 'minor',
+  [constants.NODE_PERFORMANCE_GC_MAJOR]: 'major',
+  [constants.NODE_PERFORMANCE_GC_INCREMENTAL]: 'incremental',
+  [constants.NODE_PERFORMANCE_GC_WEAKCB]: 'weakcb',
+}
+
+const MB = 1024 * 1024
+// Event loop delay sampling interval; each sample includes it, so it is subtracted
+const LOOP_RESOLUTION_MS = 20
+
+function round(value) {
+  return Math.round(value * 100) / 100
+}
+
+// Observers start on first use and run for the life of the process
+function getState() {
+  if (!globalThis._syntherionDiagnostics) {
+    const gc = {}
+    for (const kind of Object.values(GC_KINDS)) {
+      gc[kind] = { count: 0, totalMs: 0, maxMs: 0 }
+    }
+    const observer = new PerformanceObserver((list) => {
+      for (const entry of list.getEntries()) {
+        const stats = gc[GC_KINDS[entry.detail?.kind ?? entry.kind]]
+        if (!stats) continue
+        stats.count++
+        stats.totalMs += entry.duration
+        stats.maxMs = Math.max(stats.maxMs, entry.duration)
+      }
+    })
+    observer.observe({ entryTypes: ['gc'] })
+
+    const loopDelay = monitorEventLoopDelay({ resolution: LOOP_RESOLUTION_MS })
+    loopDelay.enable()
+
+    globalThis._syntherionDiagnostics = { gc, observer, loopDelay, startedAt: Date.now() }
+  }
+  return globalThis._syntherionDiagnostics
+}
+
+// Active libuv handles/requests by type (TCPSocketWrap, Timeout, FSReqCallback, ...)
+function activeResources() {
+  const counts = {}
+  for (const type of process.getActiveResourcesInfo?.() || []) {
+    counts[type] = (counts[type] || 0) + 1
+  }
+  return counts
+}
+
+// One diagnostics sample. Memory figures are in MB, times in ms; GC totals are
+// cumulative, event loop delay covers the time since the previous sample. With
+// `collectGarbage` (needs node --expose-gc) a full GC runs first, so heapUsed
+// reflects live objects only.
+export function getDiagnostics({ collectGarbage = false } = {}) {
+  const state = getState()
+  const forcedGc = Boolean(collectGarbage && typeof globalThis.gc === 'function')
+  if (forcedGc) {
+    globalThis.gc()
+  }
+
+  const memory = process.memoryUsage()
+  const heap = v8.getHeapStatistics()
+  const gcTotals = Object.values(state.gc).reduce(
+    (totals, stats) => ({
+      count: totals.count + stats.count,
+      totalMs: totals.totalMs + stats.totalMs,
+      maxMs: Math.max(totals.maxMs, stats.maxMs),
+    }),
+    { count: 0, totalMs: 0, maxMs: 0 }
+  )
+
+  const delayMs = (nanoseconds) => round(Math.max(0, nanoseconds / 1e6 - LOOP_RESOLUTION_MS))
+  const eventLoopDelay = {
+    p50: delayMs(state.loopDelay.percentile(50)),
+    p99: delayMs(state.loopDelay.percentile(99)),
+    max: delayMs(state.loopDelay.max),
+  }
+  state.loopDelay.reset()
+
+  return {
+    at: new Date().toISOString(),
+    uptimeSeconds: round(process.uptime()),
+    forcedGc,
+    memory: {
+      rss: round(memory.rss / MB),
+      heapTotal: round(memory.heapTotal / MB),
+      heapUsed: round(memory.heapUsed / MB),
+      external: round(memory.external / MB),
+      arrayBuffers: round(memory.arrayBuffers / MB),
+      heapLimit: round(heap.heap_size_limit / MB),
+      nativeContexts: heap.number_of_native_contexts,
+      detachedContexts: heap.number_of_detached_contexts,
+    },
+    gc: {
+      ...gcTotals,
+      totalMs: round(gcTotals.totalMs),
+      maxMs: round(gcTotals.maxMs),
+      byKind: Object.fromEntries(Object.entries(state.gc).map(([kind, stats]) => [
+        kind,
+        { count: stats.count, totalMs: round(stats.totalMs), maxMs: round(stats.maxMs) },
+      ])),
+    },
+    eventLoopDelay,
+    activeResources: activeResources(),
+  }
+}
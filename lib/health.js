@@ -0,0 +1,91 @@
+// Readiness probe: checks each dependency, with results cached briefly so
+// load balancer probes don't add load to the dependencies themselves
+
+const cacheMs = parseInt(process.env.HEALTH_CACHE_MS, 10) || 5000
+const timeoutMs = parseInt(process.env.HEALTH_CHECK_TIMEOUT_MS, 10) || 2000
+const degradedMs = parseInt(process.env.HEALTH_DEGRADED_MS, 10) || 1000
+
+function withTimeout(promise, ms) {
+  let timer
+  const timeout = new Promise((_, reject) => {
+    timer = setTimeout(() => reject(new Error(`Timed out after ${ms}ms`)), ms)
+  })
+  return Promise.race([promise, timeout]).finally(() => clearTimeout(timer))
+}
+
+// Run one check. A check may resolve to { degraded: 'reason' } to report a
+// reachable but struggling dependency.
+async function runCheck(check) {
+  const startedAt = performance.now()
+  try {
+    const result = await withTimeout(Promise.resolve().then(check), timeoutMs)
+    const latencyMs = Math.round((performance.now() - startedAt) * 10) / 10
+    if (result?.degraded) {
+      return { status: 'degraded', latencyMs, reason: result.degraded }
+    }
+    if (latencyMs > degradedMs) {
+      return { status: 'degraded', latencyMs, reason: `Slower than ${degradedMs}ms` }
+    }
+    return { status: 'healthy', latencyMs }
+  } catch (error) {
+    return {
+      status: 'unhealthy',
+      latencyMs: Math.round((performance.now() - startedAt) * 10) / 10,
+      error: error.message,
+    }
+  }
+}
+
+function overallStatus(checks, definitions) {
+  let status = 'healthy'
+  for (const [name, result] of Object.entries(checks)) {
+    if (result.status === 'unhealthy' && !definitions[name].optional) return 'unhealthy'
+    if (result.status !== 'healthy') status = 'degraded'
+  }
+  return status
+}
+
+// Supabase auth reachability via GoTrue's health endpoint.
+// `fetchImpl` lets callers ping over their own connection pool.
+export async function pingSupabaseAuth(fetchImpl = fetch) {
+  const response = await fetchImpl(`${process.env.NEXT_PUBLIC_SUPABASE_URL}/auth/v1/health`, {
+    headers: { apikey: process.env.NEXT_PUBLIC_SUPABASE_ANON_KEY },
+    cache: 'no-store',
+  })
+  if (!response.ok) {
+    throw new Error(`Supabase auth returned ${response.status}`)
+  }
+}
+
+// definitions: { name: { check, optional } }. Optional checks only run on deep
+// probes and can degrade, but never fail, readiness.
+export function createReadinessProbe(definitions) {
+  const cache = new Map()
+
+  return async function probe({ deep = false } = {}) {
+    const key = deep ? 'deep' : 'shallow'
+    const cached = cache.get(key)
+    if (cached && (cached.pending || Date.now() - cached.at < cacheMs)) {
+      const report = await cached.report
+      return { ...report, cached: !cached.pending, ageMs: Date.now() - cached.at }
+    }
+
+    const entry = { at: Date.now(), pending: true, report: null }
+    entry.report = (async () => {
+      const names = Object.keys(definitions).filter((name) => deep || !definitions[name].optional)
+      const results = await Promise.all(names.map((name) => runCheck(definitions[name].check)))
+      const checks = Object.fromEntries(names.map((name, index) => [name, results[index]]))
+      return {
+        status: overallStatus(checks, definitions),
+        timestamp: new Date().toISOString(),
+        checks,
+      }
+    })()
+    cache.set(key, entry)
+
+    const report = await entry.report
+    entry.at = Date.now()
+    entry.pending = false
+    return { ...report, cached: false, ageMs: 0 }
+  }
+}
@@ -0,0 +1,76 @@
+import crypto from 'crypto'
+import { promisify } from 'util'
+import zlib from 'zlib'
+import { measureStage } from '@/lib/metrics'
+
+// JSON responses with an ETag (304 on a matching If-None-Match) and
+// gzip/brotli compression negotiated from Accept-Encoding
+
+const brotliCompress = promisify(zlib.brotliCompress)
+const gzip = promisify(zlib.gzip)
+
+// Bodies smaller than this are sent as-is; compressing them saves nothing
+const COMPRESSION_THRESHOLD = parseInt(process.env.COMPRESSION_THRESHOLD_BYTES, 10) || 1024
+
+// Preferred encoding the client accepts, honouring q=0 exclusions
+export function negotiateEncoding(acceptEncoding) {
+  const accepted = new Map()
+  for (const part of (acceptEncoding || '').split(',')) {
+    const [name, ...params] = part.trim().toLowerCase().split(';')
+    if (!name) continue
+    const q = params.map((param) => param.trim()).find((param) => param.startsWith('q='))
+    accepted.set(name, q ? parseFloat(q.slice(2)) : 1)
+  }
+  const allows = (name) => (accepted.get(name) ?? accepted.get('*') ?? 0) > 0
+  if (allows('br')) return 'br'
+  if (allows('gzip')) return 'gzip'
+  return null
+}
+
+function etagFor(body) {
+  return `"${crypto.createHash('sha1').update(body).digest('base64url')}"`
+}
+
+function matchesEtag(ifNoneMatch, etag) {
+  if (!ifNoneMatch) return false
+  return ifNoneMatch === '*' || ifNoneMatch.split(',').some((tag) => tag.trim().replace(/^W\//, '') === etag)
+}
+
+// Build a JSON response for `request`. The ETag is computed over the
+// uncompressed body, so it is stable across encodings.
+export async function jsonResponse(request, data, { status = 200, headers = {} } = {}) {
+  const body = Buffer.from(JSON.stringify(data))
+  const etag = etagFor(body)
+  const baseHeaders = {
+    'Content-Type': 'application/json',
+    ETag: etag,
+    Vary: 'Accept-Encoding',
+    // Private data: caches may keep it but must revalidate every time
+    'Cache-Control': 'private, no-cache',
+    ...headers,
+  }
+
+  if (status === 200 && matchesEtag(request.headers.get('if-none-match'), etag)) {
+    return new Response(null, { status: 304, headers: { ETag: etag, Vary: 'Accept-Encoding', 'Cache-Control': baseHeaders['Cache-Control'] } })
+  }
+
+  const encoding = body.length >= COMPRESSION_THRESHOLD && negotiateEncoding(request.headers.get('accept-encoding'))
+  if (!encoding) {
+    return new Response(body, { status, headers: baseHeaders })
+  }
+
+  const compressed = await measureStage('compress', () => (encoding === 'br'
+    ? brotliCompress(body, {
+      params: {
+        // Quality 4 is close to gzip's speed with a noticeably better ratio on JSON
+        [zlib.constants.BROTLI_PARAM_QUALITY]: 4,
+        [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length,
+      },
+    })
+    : gzip(body, { level: 6 })))
+
+  return new Response(compressed, {
+    status,
+    headers: { ...baseHeaders, 'Content-Encoding': encoding, 'Content-Length': String(compressed.length) },
+  })
+}
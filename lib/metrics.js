@@ -0,0 +1,237 @@
+import { AsyncLocalStorage } from 'async_hooks'
+import { endTrace, startSpan, startTrace, traceResponseHeader } from '@/lib/tracing'
+
+// In-process Prometheus-style metrics with per-request stage timings.
+// Stages of traced requests are also recorded as spans (see lib/tracing.js).
+
+const DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+const requestContext = new AsyncLocalStorage()
+
+function getRegistry() {
+  if (!globalThis._syntherionMetrics) {
+    globalThis._syntherionMetrics = { metrics: new Map(), gauges: new Map() }
+  }
+  return globalThis._syntherionMetrics
+}
+
+function labelKey(labels) {
+  return JSON.stringify(Object.entries(labels).sort(([a], [b]) => a.localeCompare(b)))
+}
+
+function formatLabels(labels, extra = {}) {
+  const entries = Object.entries({ ...labels, ...extra })
+  if (entries.length === 0) return ''
+  const body = entries
+    .map(([key, value]) => `${key}="${String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n')}"`)
+    .join(',')
+  return `{${body}}`
+}
+
+function getMetric(name, type, help) {
+  const { metrics } = getRegistry()
+  if (!metrics.has(name)) {
+    metrics.set(name, { name, type, help, series: new Map() })
+  }
+  return metrics.get(name)
+}
+
+function getSeries(metric, labels, init) {
+  const key = labelKey(labels)
+  if (!metric.series.has(key)) {
+    metric.series.set(key, { labels, ...init() })
+  }
+  return metric.series.get(key)
+}
+
+export function incrementCounter(name, help, labels = {}, amount = 1) {
+  const series = getSeries(getMetric(name, 'counter', help), labels, () => ({ value: 0 }))
+  series.value += amount
+}
+
+export function adjustGauge(name, help, labels = {}, amount = 1) {
+  const series = getSeries(getMetric(name, 'gauge', help), labels, () => ({ value: 0 }))
+  series.value += amount
+}
+
+export function observeHistogram(name, help, labels, value, buckets = DURATION_BUCKETS) {
+  const series = getSeries(getMetric(name, 'histogram', help), labels, () => ({
+    buckets,
+    counts: buckets.map(() => 0),
+    sum: 0,
+    count: 0,
+  }))
+  series.buckets.forEach((bound, index) => {
+    if (value <= bound) series.counts[index]++
+  })
+  series.sum += value
+  series.count++
+}
+
+// Gauges read at scrape time, e.g. pool statistics owned by another module.
+// `collect` returns a number or an object of { labelValue: number } for `labelName`.
+export function registerGauge(name, help, collect, labelName = null) {
+  getRegistry().gauges.set(name, { help, collect, labelName })
+}
+
+// Render every metric in the Prometheus text exposition format
+export function renderMetrics() {
+  const { metrics, gauges } = getRegistry()
+  const lines = []
+
+  for (const metric of metrics.values()) {
+    lines.push(`# HELP ${metric.name} ${metric.help}`)
+    lines.push(`# TYPE ${metric.name} ${metric.type}`)
+    for (const series of metric.series.values()) {
+      if (metric.type === 'histogram') {
+        series.buckets.forEach((bound, index) => {
+          lines.push(`${metric.name}_bucket${formatLabels(series.labels, { le: bound })} ${series.counts[index]}`)
+        })
+        lines.push(`${metric.name}_bucket${formatLabels(series.labels, { le: '+Inf' })} ${series.count}`)
+        lines.push(`${metric.name}_sum${formatLabels(series.labels)} ${series.sum}`)
+        lines.push(`${metric.name}_count${formatLabels(series.labels)} ${series.count}`)
+      } else {
+        lines.push(`${metric.name}${formatLabels(series.labels)} ${series.value}`)
+      }
+    }
+  }
+
+  for (const [name, { help, collect, labelName }] of gauges) {
+    let value
+    try {
+      value = collect()
+    } catch (error) {
+      console.error(`Metric collector ${name} failed:`, error)
+      continue
+    }
+    lines.push(`# HELP ${name} ${help}`)
+    lines.push(`# TYPE ${name} gauge`)
+    if (labelName && value && typeof value === 'object') {
+      for (const [labelValue, number] of Object.entries(value)) {
+        lines.push(`${name}${formatLabels({ [labelName]: labelValue })} ${Number(number) || 0}`)
+      }
+    } else {
+      lines.push(`${name} ${Number(value) || 0}`)
+    }
+  }
+
+  return `${lines.join('\n')}\n`
+}
+
+// Start timing a stage (auth, mongo_query, openrouter, ...) of the current request.
+// Returns a function that ends the stage; it records the duration once. On a
+// sampled trace the stage is a span, child of the enclosing stage or request;
+// its id is exposed as `end.spanId`.
+export function startStage(stage) {
+  const context = requestContext.getStore()
+  const startedAt = performance.now()
+  adjustGauge('stage_in_flight', 'Stage executions currently in progress', { stage })
+  const span = context?.trace.sampled ? startSpan(context.trace, context.spanId, stage) : null
+  let ended = false
+
+  const end = () => {
+    if (ended) return
+    ended = true
+    const durationMs = performance.now() - startedAt
+    adjustGauge('stage_in_flight', 'Stage executions currently in progress', { stage }, -1)
+    observeHistogram('stage_duration_seconds', 'Duration of request stages in seconds', { stage }, durationMs / 1000)
+    if (context) {
+      context.stages.push({ stage, durationMs })
+    }
+    span?.end({ 'syntherion.stage': stage })
+  }
+  end.spanId = span?.spanId
+  return end
+}
+
+// Attach a value (e.g. the authenticated user id) to the current request, for
+// wrappers that run after the handler such as traffic capture
+export function setRequestAttribute(name, value) {
+  const context = requestContext.getStore()
+  if (context) {
+    context.attributes[name] = value
+  }
+}
+
+export function getRequestAttributes() {
+  return requestContext.getStore()?.attributes || {}
+}
+
+export async function measureStage(stage, fn) {
+  const end = startStage(stage)
+  const context = requestContext.getStore()
+  try {
+    // Stages started inside fn nest under this one in the trace
+    return await (end.spanId ? requestContext.run({ ...context, spanId: end.spanId }, fn) : fn())
+  } finally {
+    end()
+  }
+}
+
+// Routes served by app/api/[[...path]]/route.js, used as labels as-is
+const KNOWN_ROUTES = new Set([
+  '', 'health', 'health/ready', 'metrics', 'diagnostics',
+  'auth/user', 'auth/signup', 'auth/signin', 'auth/signout',
+  'chat', 'chat/batch', 'chats', 'chats/export', 'chats/search',
+  'benchmark/reset', 'benchmark/seed',
+])
+
+// Collapse ids in paths and send unknown paths (404s, scanners) to one label
+// so labels stay low-cardinality
+export function routeLabel(path) {
+  if (KNOWN_ROUTES.has(path)) {
+    return path || '/'
+  }
+  if (path.startsWith('chats/')) {
+    return 'chats/:id'
+  }
+  return 'unmatched'
+}
+
+// Server-Timing header value: one entry per stage (durations summed) plus the total
+function serverTiming(stages, totalMs) {
+  const totals = new Map()
+  for (const { stage, durationMs } of stages) {
+    totals.set(stage, (totals.get(stage) || 0) + durationMs)
+  }
+  const entries = [...totals].map(([stage, durationMs]) => `${stage};dur=${durationMs.toFixed(1)}`)
+  entries.push(`total;dur=${totalMs.toFixed(1)}`)
+  return entries.join(', ')
+}
+
+// Run a route handler with request counters, latency histograms, in-flight
+// gauges, a Server-Timing header on the response and, when the request is
+// traced, a server span plus a traceresponse header
+export async function withRequestMetrics(request, path, handler) {
+  const labels = { method: request.method, path: routeLabel(path) }
+  const trace = startTrace(request.headers.get('traceparent'))
+  const context = { stages: [], attributes: {}, trace, spanId: trace.spanId }
+  const startedAt = performance.now()
+  let status = 500
+
+  adjustGauge('http_requests_in_flight', 'HTTP requests currently being served', labels)
+  try {
+    const response = await requestContext.run(context, () => handler(request))
+    status = response.status
+    try {
+      response.headers.set('Server-Timing', serverTiming(context.stages, performance.now() - startedAt))
+      response.headers.set('traceresponse', traceResponseHeader(trace))
+    } catch {
+      // Immutable headers (e.g. a proxied fetch response)
+    }
+    return response
+  } finally {
+    if (trace.sampled) {
+      endTrace(trace, `${request.method} ${labels.path}`, {
+        'http.request.method': request.method,
+        'http.route': labels.path,
+        'http.response.status_code': status,
+      }, status >= 500)
+    }
+    const durationSeconds = (performance.now() - startedAt) / 1000
+    const requestLabels = { ...labels, status }
+    adjustGauge('http_requests_in_flight', 'HTTP requests currently being served', labels, -1)
+    incrementCounter('http_requests_total', 'HTTP requests served', requestLabels)
+    observeHistogram('http_request_duration_seconds', 'HTTP request latency in seconds', requestLabels, durationSeconds)
+  }
+}
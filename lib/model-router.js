@@ -0,0 +1,361 @@
+import { incrementCounter, observeHistogram } from '@/lib/metrics'
+import { tryAcquireUpstreamSlot } from '@/lib/rate-limit'
+
+// Latency-aware routing over a pool of OpenRouter models.
+// MODEL_POOL lists `model@contextTokens` entries in order of preference. Each
+// completion goes to the fastest healthy model whose context fits the request,
+// falls back to the next one on timeouts, 429s and 5xx, and with MODEL_HEDGE=true
+// sends a second request once the first has run longer than the model's p95.
+// A hedge takes its own upstream slot and is skipped when none is free.
+
+function envInt(name, fallback) {
+  const value = parseInt(process.env[name], 10)
+  return Number.isNaN(value) ? fallback : value
+}
+
+const DEFAULT_POOL = 'mistralai/mistral-7b-instruct@32768'
+const attemptTimeoutMs = envInt('MODEL_TIMEOUT_MS', 30000)
+// Longest gap between two chunks of a stream before it is abandoned
+const streamIdleTimeoutMs = envInt('MODEL_STREAM_IDLE_MS', 15000)
+const hedging = process.env.MODEL_HEDGE === 'true'
+const hedgeMinDelayMs = envInt('MODEL_HEDGE_MIN_MS', 250)
+const hedgePercentile = envInt('MODEL_HEDGE_PERCENTILE', 95)
+// Consecutive failures after which a model is skipped for MODEL_COOLDOWN_MS
+const FAILURE_THRESHOLD = envInt('MODEL_FAILURE_THRESHOLD', 3)
+const cooldownMs = envInt('MODEL_COOLDOWN_MS', 30000)
+
+// Rolling window sizes for the per-model statistics
+const LATENCY_WINDOW = 200
+const OUTCOME_WINDOW = 50
+// Fewer samples than this in a size class falls back to the model's overall latency
+const MIN_CLASS_SAMPLES = 5
+
+// Prompt size classes, in estimated tokens; latency is tracked per class
+const SIZE_CLASSES = [
+  ['small', 1000],
+  ['medium', 4000],
+  ['large', Infinity],
+]
+
+function parsePool(value) {
+  return value
+    .split(',')
+    .map((entry) => entry.trim())
+    .filter(Boolean)
+    .map((entry) => {
+      const at = entry.lastIndexOf('@')
+      const contextTokens = at > 0 ? parseInt(entry.slice(at + 1), 10) : NaN
+      return Number.isNaN(contextTokens)
+        ? { name: entry, contextTokens: Infinity }
+        : { name: entry.slice(0, at), contextTokens }
+    })
+}
+
+export const MODEL_POOL = parsePool(process.env.MODEL_POOL || DEFAULT_POOL)
+export const DEFAULT_MODEL = MODEL_POOL[0].name
+
+function sizeClass(promptTokens) {
+  return SIZE_CLASSES.find(([, limit]) => promptTokens < limit)[0]
+}
+
+function getState() {
+  if (!globalThis._syntherionModelRouter) {
+    globalThis._syntherionModelRouter = {
+      models: new Map(),
+      stats: { primary: 0, fallbacks: 0, hedges: 0, hedgeWins: 0, hedgesSkipped: 0, exhausted: 0, streamsStalled: 0 },
+    }
+  }
+  return globalThis._syntherionModelRouter
+}
+
+function modelState(name) {
+  const { models } = getState()
+  if (!models.has(name)) {
+    models.set(name, {
+      latencies: [],
+      byClass: Object.fromEntries(SIZE_CLASSES.map(([label]) => [label, []])),
+      outcomes: [],
+      consecutiveFailures: 0,
+      unhealthyUntil: 0,
+    })
+  }
+  return models.get(name)
+}
+
+function pushWindow(window, value, size) {
+  window.push(value)
+  if (window.length > size) window.shift()
+}
+
+function percentileOf(values, pct) {
+  if (values.length === 0) return null
+  const sorted = [...values].sort((a, b) => a - b)
+  return sorted[Math.min(sorted.length - 1, Math.ceil((pct / 100) * sorted.length) - 1)]
+}
+
+function errorRate(model) {
+  const { outcomes } = modelState(model)
+  return outcomes.length ? outcomes.filter((ok) => !ok).length / outcomes.length : 0
+}
+
+function latencySamples(model, promptTokens) {
+  const state = modelState(model)
+  const forClass = state.byClass[sizeClass(promptTokens)]
+  return forClass.length >= MIN_CLASS_SAMPLES ? forClass : state.latencies
+}
+
+function recordSuccess(model, promptTokens, latencyMs) {
+  const state = modelState(model)
+  pushWindow(state.latencies, latencyMs, LATENCY_WINDOW)
+  pushWindow(state.byClass[sizeClass(promptTokens)], latencyMs, LATENCY_WINDOW)
+  pushWindow(state.outcomes, true, OUTCOME_WINDOW)
+  state.consecutiveFailures = 0
+  state.unhealthyUntil = 0
+}
+
+function recordFailure(model) {
+  const state = modelState(model)
+  pushWindow(state.outcomes, false, OUTCOME_WINDOW)
+  state.consecutiveFailures++
+  if (state.consecutiveFailures >= FAILURE_THRESHOLD) {
+    state.unhealthyUntil = Date.now() + cooldownMs
+  }
+}
+
+function isHealthy(model) {
+  return modelState(model).unhealthyUntil <= Date.now()
+}
+
+// Expected latency used for ranking. Models without samples score 0 so they
+// get tried and measured; errors inflate the score of flaky models.
+function expectedLatency(model, promptTokens) {
+  const median = percentileOf(latencySamples(model, promptTokens), 50)
+  return (median ?? 0) * (1 + errorRate(model))
+}
+
+// Candidate models for a request, best first. Models in cooldown stay at the
+// end as a last resort rather than failing the request outright.
+export function rankModels(promptTokens, maxTokens = 0) {
+  const fitting = MODEL_POOL.filter((model) => model.contextTokens >= promptTokens + maxTokens)
+  const byLatency = (a, b) => expectedLatency(a.name, promptTokens) - expectedLatency(b.name, promptTokens)
+  const healthy = fitting.filter((model) => isHealthy(model.name)).sort(byLatency)
+  const cooling = fitting.filter((model) => !isHealthy(model.name))
+  return [...healthy, ...cooling].map((model) => model.name)
+}
+
+function hedgeDelay(model, promptTokens) {
+  const p95 = percentileOf(latencySamples(model, promptTokens), hedgePercentile)
+  return Math.max(hedgeMinDelayMs, p95 ?? attemptTimeoutMs / 2)
+}
+
+class AttemptTimeoutError extends Error {
+  constructor(model, timeoutMs) {
+    super(`${model} did not respond within ${timeoutMs}ms`)
+    this.name = 'AttemptTimeoutError'
+  }
+}
+
+class StreamIdleError extends Error {
+  constructor(model, timeoutMs) {
+    super(`${model} stream stalled for ${timeoutMs}ms`)
+    this.name = 'StreamIdleError'
+  }
+}
+
+// Next chunk of a stream, or StreamIdleError (aborting the request) when none
+// arrives within MODEL_STREAM_IDLE_MS
+async function nextChunk(iterator, controller, model) {
+  const pending = iterator.next()
+  // The abort below rejects `pending` after the race is already lost
+  pending.catch(() => {})
+  let timer
+  const idle = new Promise((_, reject) => {
+    timer = setTimeout(() => {
+      getState().stats.streamsStalled++
+      recordFailure(model)
+      incrementCounter('model_attempts_total', 'Completion attempts by model and outcome', { model, outcome: 'stalled' })
+      controller.abort()
+      reject(new StreamIdleError(model, streamIdleTimeoutMs))
+    }, streamIdleTimeoutMs)
+  })
+  try {
+    return await Promise.race([pending, idle])
+  } finally {
+    clearTimeout(timer)
+  }
+}
+
+// Timeouts, rate limits, upstream 5xx and connection failures are worth
+// another model; other client errors (bad request, auth) are not
+function isRetryable(error) {
+  if (error instanceof AttemptTimeoutError) return true
+  if (error?.status === undefined) return true
+  return error.status === 408 || error.status === 429 || error.status >= 500
+}
+
+// A single request to one model. For streams the attempt resolves at the
+// first chunk, so fallback and hedging apply to time-to-first-token; after
+// that each chunk must arrive within MODEL_STREAM_IDLE_MS.
+function startAttempt(client, model, params, promptTokens) {
+  const controller = new AbortController()
+  const startedAt = performance.now()
+  let timedOut = false
+  let cancelled = false
+  const timer = setTimeout(() => {
+    timedOut = true
+    controller.abort()
+  }, attemptTimeoutMs)
+
+  const promise = (async () => {
+    try {
+      const response = await client.chat.completions.create(
+        { ...params, model },
+        { signal: controller.signal, maxRetries: 0 }
+      )
+      let result = response
+      if (params.stream) {
+        const iterator = response[Symbol.asyncIterator]()
+        const first = await iterator.next()
+        result = {
+          controller,
+          async *[Symbol.asyncIterator]() {
+            if (first.done) return
+            yield first.value
+            for (let next = await nextChunk(iterator, controller, model); !next.done;
+              next = await nextChunk(iterator, controller, model)) {
+              yield next.value
+            }
+          },
+        }
+      }
+      const latencyMs = performance.now() - startedAt
+      recordSuccess(model, promptTokens, latencyMs)
+      incrementCounter('model_attempts_total', 'Completion attempts by model and outcome', { model, outcome: 'success' })
+      observeHistogram('model_latency_seconds', 'Completion latency (first token when streaming) by model', { model }, latencyMs / 1000)
+      return result
+    } catch (error) {
+      if (cancelled) throw error
+      const failure = timedOut ? new AttemptTimeoutError(model, attemptTimeoutMs) : error
+      recordFailure(model)
+      incrementCounter('model_attempts_total', 'Completion attempts by model and outcome', {
+        model,
+        outcome: timedOut ? 'timeout' : 'error',
+      })
+      throw failure
+    } finally {
+      clearTimeout(timer)
+    }
+  })()
+
+  return {
+    model,
+    promise,
+    cancel() {
+      cancelled = true
+      controller.abort()
+      incrementCounter('model_attempts_total', 'Completion attempts by model and outcome', { model, outcome: 'cancelled' })
+    },
+  }
+}
+
+// Run a chat completion through the model pool.
+// `params` are the usual chat.completions.create parameters without `model`;
+// `promptTokens` is the estimated size of the prompt.
+// Resolves to { response, model, hedged } where `response` is the completion,
+// or for streams an async iterable of chunks with an abortable `controller`.
+export function routeCompletion(client, params, { promptTokens = 0 } = {}) {
+  const state = getState()
+  let candidates = rankModels(promptTokens, params.max_tokens || 0)
+  if (candidates.length === 0) {
+    return Promise.reject(new Error(`No model in the pool fits a ${promptTokens}-token prompt`))
+  }
+  // With a single model, the hedge (and the fallback) is a second request to it
+  if (hedging && candidates.length === 1) {
+    candidates = [candidates[0], candidates[0]]
+  }
+
+  return new Promise((resolve, reject) => {
+    const running = new Set()
+    let next = 0
+    let settled = false
+    let lastError = null
+    let hedgeTimer = null
+    // The caller holds one upstream slot; a hedge holds a second until the race
+    // is decided, after which at most one request is left running
+    let releaseHedgeSlot = null
+
+    const finish = (outcome) => {
+      settled = true
+      clearTimeout(hedgeTimer)
+      releaseHedgeSlot?.()
+      for (const attempt of running) attempt.cancel()
+      running.clear()
+      outcome()
+    }
+
+    const launch = (reason) => {
+      const attempt = startAttempt(client, candidates[next++], params, promptTokens)
+      running.add(attempt)
+      if (reason === 'fallback') state.stats.fallbacks++
+      if (reason === 'hedge') state.stats.hedges++
+      if (reason === 'primary') state.stats.primary++
+
+      attempt.promise.then(
+        (response) => {
+          if (settled) return
+          running.delete(attempt)
+          if (reason === 'hedge') state.stats.hedgeWins++
+          finish(() => resolve({ response, model: attempt.model, hedged: reason === 'hedge' }))
+        },
+        (error) => {
+          if (settled) return
+          running.delete(attempt)
+          lastError = error
+          if (!isRetryable(error)) {
+            finish(() => reject(error))
+          } else if (next < candidates.length) {
+            console.warn(`Model ${attempt.model} failed (${error.message}), falling back to ${candidates[next]}`)
+            launch('fallback')
+          } else if (running.size === 0) {
+            state.stats.exhausted++
+            finish(() => reject(lastError))
+          }
+        }
+      )
+    }
+
+    launch('primary')
+    if (hedging && next < candidates.length) {
+      hedgeTimer = setTimeout(() => {
+        if (settled || next >= candidates.length) return
+        releaseHedgeSlot = tryAcquireUpstreamSlot()
+        if (releaseHedgeSlot) {
+          launch('hedge')
+        } else {
+          state.stats.hedgesSkipped++
+        }
+      }, hedgeDelay(candidates[0], promptTokens))
+    }
+  })
+}
+
+export function getModelRouterStats() {
+  const { stats } = getState()
+  return {
+    ...stats,
+    hedging,
+    streamIdleTimeoutMs,
+    models: Object.fromEntries(MODEL_POOL.map(({ name, contextTokens }) => {
+      const model = modelState(name)
+      return [name, {
+        contextTokens,
+        healthy: isHealthy(name),
+        samples: model.latencies.length,
+        p50Ms: percentileOf(model.latencies, 50),
+        p95Ms: percentileOf(model.latencies, 95),
+        errorRate: errorRate(name),
+        consecutiveFailures: model.consecutiveFailures,
+      }]
+    })),
+  }
+}
@@ -0,0 +1,119 @@
+import { MongoClient } from 'mongodb'
+import { measureStage } from '@/lib/metrics'
+
+const dbName = process.env.DB_NAME || 'syntherion_ai'
+
+// Read an integer pool setting from the environment
+function envInt(name, fallback) {
+  const value = parseInt(process.env[name], 10)
+  return Number.isNaN(value) ? fallback : value
+}
+
+const poolOptions = {
+  maxPoolSize: envInt('MONGO_MAX_POOL_SIZE', 20),
+  minPoolSize: envInt('MONGO_MIN_POOL_SIZE', 2),
+  maxIdleTimeMS: envInt('MONGO_MAX_IDLE_TIME_MS', 60000),
+  waitQueueTimeoutMS: envInt('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000),
+  serverSelectionTimeoutMS: envInt('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+}
+
+// Track connection pool pressure from the driver's CMAP events
+function trackPoolEvents(client, stats) {
+  client.on('connectionCreated', () => { stats.created++; stats.open++ })
+  client.on('connectionClosed', () => { stats.closed++; stats.open = Math.max(0, stats.open - 1) })
+  client.on('connectionCheckOutStarted', () => { stats.waiting++ })
+  client.on('connectionCheckedOut', () => {
+    stats.waiting = Math.max(0, stats.waiting - 1)
+    stats.checkedOut++
+    stats.checkouts++
+  })
+  client.on('connectionCheckOutFailed', () => {
+    stats.waiting = Math.max(0, stats.waiting - 1)
+    stats.checkoutFailures++
+  })
+  client.on('connectionCheckedIn', () => { stats.checkedOut = Math.max(0, stats.checkedOut - 1) })
+  client.on('connectionPoolCleared', () => { stats.cleared++ })
+}
+
+// One client per process, cached on globalThis so Next.js hot reloads and
+// re-evaluated route modules reuse the existing pool instead of opening another
+function getMongo() {
+  if (!globalThis._syntherionMongo) {
+    const client = new MongoClient(process.env.MONGO_URL, poolOptions)
+    const stats = {
+      created: 0,
+      closed: 0,
+      open: 0,
+      checkedOut: 0,
+      waiting: 0,
+      checkouts: 0,
+      checkoutFailures: 0,
+      cleared: 0,
+    }
+    trackPoolEvents(client, stats)
+    globalThis._syntherionMongo = { client, stats, connecting: null }
+  }
+  return globalThis._syntherionMongo
+}
+
+// Connect once and share the pending promise between concurrent callers
+export async function connectToMongoDB() {
+  const mongo = getMongo()
+  if (!mongo.connecting) {
+    mongo.connecting = mongo.client.connect().catch((error) => {
+      // Let the next request retry instead of caching the failure
+      mongo.connecting = null
+      throw error
+    })
+  }
+
+  try {
+    await measureStage('mongo_connect', () => mongo.connecting)
+    return mongo.client.db(dbName)
+  } catch (error) {
+    console.error('MongoDB connection error:', error)
+    throw error
+  }
+}
+
+// Close the pool; the next connectToMongoDB() starts a new client from scratch.
+// Used by benchmarks to measure cold-connection latency.
+export async function closeMongoConnection() {
+  const mongo = globalThis._syntherionMongo
+  if (!mongo) return
+  globalThis._syntherionMongo = null
+  await mongo.client.close()
+}
+
+// Round trip to the server; reports a degraded pool when callers are queueing for connections
+export async function pingMongoDB() {
+  const db = await connectToMongoDB()
+  await db.command({ ping: 1 })
+  const { stats } = getMongo()
+  if (stats.waiting > 0 && stats.checkedOut >= poolOptions.maxPoolSize) {
+    return { degraded: `Connection pool exhausted (${stats.waiting} waiting)` }
+  }
+  return null
+}
+
+// Snapshot of pool configuration and live counters
+export function getMongoPoolStats() {
+  const { stats } = getMongo()
+  return {
+    ...stats,
+    maxPoolSize: poolOptions.maxPoolSize,
+    minPoolSize: poolOptions.minPoolSize,
+    maxIdleTimeMS: poolOptions.maxIdleTimeMS,
+  }
+}
+
+// Warm the pool on first import so the first request doesn't pay for the handshake
+if (
+  process.env.MONGO_URL &&
+  process.env.MONGO_WARMUP !== 'false' &&
+  process.env.NEXT_PHASE !== 'phase-production-build'
+) {
+  connectToMongoDB().catch(() => {
+    // Already logged; the first request will retry
+  })
+}
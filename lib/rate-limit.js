@@ -0,0 +1,225 @@
+import { connectToMongoDB } from '@/lib/mongodb'
+import { measureStage } from '@/lib/metrics'
+
+// Per-user token buckets for /api/chat and /api/chat/batch plus a process-wide
+// semaphore with a bounded wait queue in front of upstream model calls. Buckets
+// live in memory; RATE_LIMIT_MONGO=true shares them across instances through a
+// Mongo collection.
+
+function envNumber(name, fallback) {
+  const value = parseFloat(process.env[name])
+  return Number.isNaN(value) ? fallback : value
+}
+
+// Burst size and refill rate for one kind of bucket, from `${prefix}_BURST`
+// and `${prefix}_PER_MINUTE`
+function bucketConfig(prefix, burst, perMinute) {
+  const capacity = envNumber(`${prefix}_BURST`, burst)
+  const refillPerSecond = envNumber(`${prefix}_PER_MINUTE`, perMinute) / 60
+  // Seconds for an empty bucket to refill completely; idle Mongo buckets expire after this
+  return { capacity, refillPerSecond, fullRefillSeconds: capacity / refillPerSecond }
+}
+
+// Interactive chats
+export const CHAT_RATE_LIMIT = bucketConfig('RATE_LIMIT', 10, 30)
+// Batch jobs, one token per item, kept apart so a batch doesn't starve the
+// same user's interactive chats
+export const BATCH_RATE_LIMIT = bucketConfig('BATCH_RATE_LIMIT', 100, 100)
+
+const maxBuckets = envNumber('RATE_LIMIT_MAX_ENTRIES', 10000)
+const mongoMode = process.env.RATE_LIMIT_MONGO === 'true'
+
+export const UPSTREAM_CONCURRENCY = envNumber('UPSTREAM_CONCURRENCY', 16)
+const upstreamQueueLimit = envNumber('UPSTREAM_QUEUE_LIMIT', 64)
+const upstreamQueueTimeoutMs = envNumber('UPSTREAM_QUEUE_TIMEOUT_MS', 10000)
+
+export const RATE_LIMIT_COLLECTION = 'rate_limits'
+
+function getState() {
+  if (!globalThis._syntherionRateLimit) {
+    globalThis._syntherionRateLimit = {
+      buckets: new Map(),
+      mongoIndexes: null,
+      inUse: 0,
+      waiters: [],
+      stats: { allowed: 0, limited: 0, mongoErrors: 0, upstreamQueued: 0, upstreamRejected: 0 },
+    }
+  }
+  return globalThis._syntherionRateLimit
+}
+
+// Time until the bucket holds `cost` tokens again
+function retryAfterMs(config, tokens, cost) {
+  return Math.ceil((Math.max(0, cost - tokens) / config.refillPerSecond) * 1000)
+}
+
+function takeLocalToken(state, config, key, now, cost) {
+  const { capacity, refillPerSecond } = config
+  const bucket = state.buckets.get(key) || { tokens: capacity, updatedAt: now }
+  bucket.tokens = Math.min(capacity, bucket.tokens + ((now - bucket.updatedAt) / 1000) * refillPerSecond)
+  bucket.updatedAt = now
+  const allowed = bucket.tokens >= cost
+  if (allowed) bucket.tokens -= cost
+
+  // Most recently used last, so the oldest idle buckets are evicted first
+  state.buckets.delete(key)
+  state.buckets.set(key, bucket)
+  while (state.buckets.size > maxBuckets) {
+    state.buckets.delete(state.buckets.keys().next().value)
+  }
+  return { allowed, tokens: bucket.tokens }
+}
+
+async function bucketsCollection(state) {
+  const db = await connectToMongoDB()
+  const collection = db.collection(RATE_LIMIT_COLLECTION)
+  if (!state.mongoIndexes) {
+    state.mongoIndexes = collection.createIndex(
+      { expiresAt: 1 },
+      { name: 'expiresAt_ttl', expireAfterSeconds: 0 }
+    ).catch((error) => {
+      state.mongoIndexes = null
+      console.error('Failed to create rate limit indexes:', error)
+    })
+  }
+  await state.mongoIndexes
+  return collection
+}
+
+// Refill and take a token in one atomic pipeline update, so concurrent
+// requests on different instances can't both spend the last token
+async function takeSharedToken(state, config, key, now, cost) {
+  const { capacity, refillPerSecond, fullRefillSeconds } = config
+  const collection = await bucketsCollection(state)
+  const at = new Date(now)
+  const elapsedSeconds = { $divide: [{ $subtract: [at, { $ifNull: ['$updatedAt', at] }] }, 1000] }
+  const bucket = await measureStage('mongo_write', () => collection.findOneAndUpdate(
+    { _id: key },
+    [
+      {
+        $set: {
+          tokens: {
+            $min: [
+              capacity,
+              { $add: [{ $ifNull: ['$tokens', capacity] }, { $multiply: [elapsedSeconds, refillPerSecond] }] },
+            ],
+          },
+          updatedAt: at,
+          expiresAt: new Date(now + fullRefillSeconds * 1000),
+        },
+      },
+      { $set: { allowed: { $gte: ['$tokens', cost] } } },
+      { $set: { tokens: { $cond: ['$allowed', { $subtract: ['$tokens', cost] }, '$tokens'] } } },
+    ],
+    { upsert: true, returnDocument: 'after' }
+  ))
+  return { allowed: bucket.allowed, tokens: bucket.tokens }
+}
+
+// Take `cost` tokens (all or none) from `key`'s bucket, sized by `config`
+// (CHAT_RATE_LIMIT or BATCH_RATE_LIMIT); a cost above the burst size can
+// never be allowed.
+// Returns { allowed, remaining, limit, retryAfterMs }.
+export async function consumeRateLimit(key, cost = 1, config = CHAT_RATE_LIMIT) {
+  const state = getState()
+  const now = Date.now()
+  let result
+  if (mongoMode) {
+    try {
+      result = await takeSharedToken(state, config, key, now, cost)
+    } catch (error) {
+      // Limiting per instance beats failing every chat while Mongo is away
+      state.stats.mongoErrors++
+      console.error('Shared rate limit error, using the local bucket:', error)
+    }
+  }
+  result = result || takeLocalToken(state, config, key, now, cost)
+
+  state.stats[result.allowed ? 'allowed' : 'limited']++
+  return {
+    allowed: result.allowed,
+    remaining: Math.floor(result.tokens),
+    limit: config.capacity,
+    retryAfterMs: result.allowed ? 0 : retryAfterMs(config, result.tokens, cost),
+  }
+}
+
+export class UpstreamBusyError extends Error {
+  constructor(message, retryAfterMs) {
+    super(message)
+    this.name = 'UpstreamBusyError'
+    this.retryAfterMs = retryAfterMs
+  }
+}
+
+// Take a slot; the release function hands it straight to the next waiter
+function grantSlot(state) {
+  state.inUse++
+  let released = false
+  return () => {
+    if (released) return
+    released = true
+    state.inUse--
+    const next = state.waiters.shift()
+    if (next) {
+      clearTimeout(next.timer)
+      next.resolve(grantSlot(state))
+    }
+  }
+}
+
+// Wait for one of UPSTREAM_CONCURRENCY upstream slots.
+// Resolves to a release function (safe to call more than once). Rejects with
+// UpstreamBusyError when the wait queue is full or the wait times out.
+export function acquireUpstreamSlot() {
+  const state = getState()
+
+  if (state.inUse < UPSTREAM_CONCURRENCY) {
+    return Promise.resolve(grantSlot(state))
+  }
+  if (state.waiters.length >= upstreamQueueLimit) {
+    state.stats.upstreamRejected++
+    return Promise.reject(new UpstreamBusyError('Upstream queue is full', upstreamQueueTimeoutMs))
+  }
+
+  state.stats.upstreamQueued++
+  return new Promise((resolve, reject) => {
+    const waiter = { resolve }
+    waiter.timer = setTimeout(() => {
+      state.waiters = state.waiters.filter((w) => w !== waiter)
+      state.stats.upstreamRejected++
+      reject(new UpstreamBusyError('Timed out waiting for an upstream slot', upstreamQueueTimeoutMs))
+    }, upstreamQueueTimeoutMs)
+    state.waiters.push(waiter)
+  })
+}
+
+// A slot only if one is free right now, for optional extra calls (hedges)
+// that should never queue ahead of or alongside requests already waiting.
+// Returns a release function, or null.
+export function tryAcquireUpstreamSlot() {
+  const state = getState()
+  if (state.inUse >= UPSTREAM_CONCURRENCY || state.waiters.length > 0) {
+    return null
+  }
+  return grantSlot(state)
+}
+
+export async function withUpstreamSlot(fn) {
+  const release = await measureStage('upstream_queue', acquireUpstreamSlot)
+  try {
+    return await fn()
+  } finally {
+    release()
+  }
+}
+
+export function getRateLimitStats() {
+  const { buckets, inUse, waiters, stats } = getState()
+  return {
+    ...stats,
+    buckets: buckets.size,
+    mode: mongoMode ? 'mongo' : 'memory',
+    upstream: { inUse, queued: waiters.length, concurrency: UPSTREAM_CONCURRENCY, queueLimit: upstreamQueueLimit },
+  }
+}
@@ -0,0 +1,212 @@
+import crypto from 'crypto'
+import { connectToMongoDB } from '@/lib/mongodb'
+import { measureStage } from '@/lib/metrics'
+
+// Completion cache in front of OpenRouter.
+// Tiers: in-process LRU/TTL, optional shared Mongo collection, and an opt-in
+// semantic tier that matches similar single-question prompts.
+
+const enabled = process.env.RESPONSE_CACHE !== 'false'
+const ttlMs = parseInt(process.env.RESPONSE_CACHE_TTL_MS, 10) || 10 * 60 * 1000
+const maxEntries = parseInt(process.env.RESPONSE_CACHE_MAX_ENTRIES, 10) || 1000
+const mongoTier = process.env.RESPONSE_CACHE_MONGO === 'true'
+const semanticTier = process.env.RESPONSE_CACHE_SEMANTIC === 'true'
+const similarityThreshold = parseFloat(process.env.RESPONSE_CACHE_SIMILARITY) || 0.92
+
+export const RESPONSE_CACHE_COLLECTION = 'response_cache'
+
+// Dimensions of the hashed bag-of-words embedding
+const EMBEDDING_DIMENSIONS = 512
+
+function getState() {
+  if (!globalThis._syntherionResponseCache) {
+    globalThis._syntherionResponseCache = {
+      entries: new Map(),
+      vectors: new Map(),
+      mongoIndexes: null,
+      stats: { exactHits: 0, mongoHits: 0, semanticHits: 0, misses: 0, stores: 0, evictions: 0 },
+    }
+  }
+  return globalThis._syntherionResponseCache
+}
+
+function normalizeText(text) {
+  return String(text || '').replace(/\s+/g, ' ').trim()
+}
+
+function normalizeMessages(messages) {
+  return messages.map((message) => ({ role: message.role, content: normalizeText(message.content) }))
+}
+
+// Sampling parameters that change the answer are part of every key
+function paramsKey(options) {
+  return JSON.stringify({ model: options.model, temperature: options.temperature, max_tokens: options.max_tokens })
+}
+
+function exactKey(messages, options) {
+  return crypto
+    .createHash('sha256')
+    .update(paramsKey(options))
+    .update(JSON.stringify(normalizeMessages(messages)))
+    .digest('hex')
+}
+
+// Locally computed embedding: hashed unigrams and bigrams of the lowercased
+// text, L2-normalised so the dot product is the cosine similarity
+export function embed(text) {
+  const vector = new Float32Array(EMBEDDING_DIMENSIONS)
+  const words = normalizeText(text).toLowerCase().match(/[\p{L}\p{N}']+/gu) || []
+  const features = [...words, ...words.slice(1).map((word, index) => `${words[index]} ${word}`)]
+  for (const feature of features) {
+    const hash = crypto.createHash('md5').update(feature).digest()
+    const index = hash.readUInt32LE(0) % EMBEDDING_DIMENSIONS
+    vector[index] += hash[4] & 1 ? 1 : -1
+  }
+  let norm = 0
+  for (const value of vector) norm += value * value
+  norm = Math.sqrt(norm) || 1
+  for (let i = 0; i < vector.length; i++) vector[i] /= norm
+  return vector
+}
+
+function cosine(a, b) {
+  let dot = 0
+  for (let i = 0; i < a.length; i++) dot += a[i] * b[i]
+  return dot
+}
+
+// Only stand-alone questions are matched semantically; with history in the
+// prompt, "similar" is not a safe notion of "same answer"
+function semanticText(messages) {
+  const users = messages.filter((message) => message.role === 'user')
+  const others = messages.filter((message) => message.role !== 'user' && message.role !== 'system')
+  return users.length === 1 && others.length === 0 ? users[0].content : null
+}
+
+function remember(state, key, entry) {
+  state.entries.delete(key)
+  state.entries.set(key, entry)
+  while (state.entries.size > maxEntries) {
+    const oldest = state.entries.keys().next().value
+    state.entries.delete(oldest)
+    state.vectors.delete(oldest)
+    state.stats.evictions++
+  }
+}
+
+async function cacheCollection(state) {
+  const db = await connectToMongoDB()
+  const collection = db.collection(RESPONSE_CACHE_COLLECTION)
+  if (!state.mongoIndexes) {
+    state.mongoIndexes = collection.createIndexes([
+      { key: { key: 1 }, name: 'key', unique: true },
+      // Mongo's TTL monitor removes entries once expiresAt passes
+      { key: { expiresAt: 1 }, name: 'expiresAt_ttl', expireAfterSeconds: 0 },
+    ]).catch((error) => {
+      state.mongoIndexes = null
+      console.error('Failed to create response cache indexes:', error)
+    })
+  }
+  await state.mongoIndexes
+  return collection
+}
+
+function findSimilar(state, vector, params, now) {
+  let best = null
+  for (const [key, candidate] of state.vectors) {
+    if (candidate.params !== params) continue
+    const entry = state.entries.get(key)
+    if (!entry || entry.expiresAt <= now) continue
+    const similarity = cosine(vector, candidate.vector)
+    if (similarity >= similarityThreshold && (!best || similarity > best.similarity)) {
+      best = { entry, similarity }
+    }
+  }
+  return best
+}
+
+// Look up a cached completion for this prompt.
+// Returns { message, source: 'exact' | 'semantic', similarity? } or null.
+export async function lookupCachedResponse(messages, options) {
+  if (!enabled) return null
+  return measureStage('response_cache', async () => {
+    const state = getState()
+    const key = exactKey(messages, options)
+    const now = Date.now()
+
+    const entry = state.entries.get(key)
+    if (entry && entry.expiresAt > now) {
+      remember(state, key, entry)
+      state.stats.exactHits++
+      return { message: entry.message, source: 'exact' }
+    }
+
+    if (mongoTier) {
+      try {
+        const collection = await cacheCollection(state)
+        const shared = await collection.findOne({ key, expiresAt: { $gt: new Date(now) } })
+        if (shared) {
+          remember(state, key, { message: shared.message, expiresAt: shared.expiresAt.getTime() })
+          state.stats.mongoHits++
+          return { message: shared.message, source: 'exact' }
+        }
+      } catch (error) {
+        console.error('Response cache lookup error:', error)
+      }
+    }
+
+    const text = semanticTier && semanticText(messages)
+    if (text) {
+      const match = findSimilar(state, embed(text), paramsKey(options), now)
+      if (match) {
+        state.stats.semanticHits++
+        return { message: match.entry.message, source: 'semantic', similarity: match.similarity }
+      }
+    }
+
+    state.stats.misses++
+    return null
+  })
+}
+
+// Remember a fresh completion in every enabled tier
+export async function storeCachedResponse(messages, options, message) {
+  if (!enabled || !message) return
+  const state = getState()
+  const key = exactKey(messages, options)
+  const expiresAt = Date.now() + ttlMs
+
+  remember(state, key, { message, expiresAt })
+  state.stats.stores++
+
+  const text = semanticTier && semanticText(messages)
+  if (text) {
+    state.vectors.set(key, { vector: embed(text), params: paramsKey(options) })
+  }
+
+  if (mongoTier) {
+    try {
+      const collection = await cacheCollection(state)
+      await collection.updateOne(
+        { key },
+        { $set: { message, model: options.model, expiresAt: new Date(expiresAt) } },
+        { upsert: true }
+      )
+    } catch (error) {
+      console.error('Response cache store error:', error)
+    }
+  }
+}
+
+export function getResponseCacheStats() {
+  const { stats, entries } = getState()
+  const hits = stats.exactHits + stats.mongoHits + stats.semanticHits
+  const lookups = hits + stats.misses
+  return {
+    ...stats,
+    size: entries.size,
+    hitRate: lookups ? hits / lookups : 0,
+    enabled,
+    tiers: ['memory', ...(mongoTier ? ['mongo'] : []), ...(semanticTier ? ['semantic'] : [])],
+  }
+}
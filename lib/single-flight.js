@@ -0,0 +1,101 @@
+import crypto from 'crypto'
+
+// Single-flight coalescing: concurrent requests with the same key share one
+// execution. Flights started with retainMs keep their result afterwards, so
+// retries carrying the same idempotency key replay it instead of re-running.
+
+const MAX_RETAINED = parseInt(process.env.IDEMPOTENCY_MAX_ENTRIES, 10) || 10000
+export const IDEMPOTENCY_TTL_MS = parseInt(process.env.IDEMPOTENCY_TTL_MS, 10) || 10 * 60 * 1000
+
+function getState() {
+  if (!globalThis._syntherionSingleFlight) {
+    globalThis._syntherionSingleFlight = {
+      flights: new Map(),
+      retained: new Map(),
+      stats: { leaders: 0, coalesced: 0, replayed: 0, conflicts: 0 },
+    }
+  }
+  return globalThis._syntherionSingleFlight
+}
+
+export function hashMessages(messages) {
+  return crypto
+    .createHash('sha256')
+    .update(JSON.stringify(messages.map((message) => [message.role, message.content])))
+    .digest('hex')
+}
+
+function pruneRetained(state) {
+  const now = Date.now()
+  for (const [key, entry] of state.retained) {
+    if (entry.expiresAt > now && state.retained.size <= MAX_RETAINED) break
+    state.retained.delete(key)
+  }
+}
+
+// Join or start the flight for `key`.
+//
+// Returns one of:
+//   { leader: true, resolve(result), reject(error) } - caller does the work
+//   { leader: false, promise }                      - await the leader's result
+//   { conflict: true }                              - key reused with a different fingerprint
+//
+// `fingerprint` identifies the request payload; an idempotency key reused for
+// a different payload is a client error rather than a replay.
+export function beginFlight(key, { retainMs = 0, fingerprint = null } = {}) {
+  const state = getState()
+  pruneRetained(state)
+
+  const existing = state.flights.get(key) || state.retained.get(key)
+  if (existing && (!existing.expiresAt || existing.expiresAt > Date.now())) {
+    if (fingerprint && existing.fingerprint && existing.fingerprint !== fingerprint) {
+      state.stats.conflicts++
+      return { conflict: true }
+    }
+    if (state.flights.has(key)) {
+      state.stats.coalesced++
+    } else {
+      state.stats.replayed++
+    }
+    return { leader: false, promise: existing.promise }
+  }
+
+  let resolvePromise, rejectPromise
+  const promise = new Promise((resolve, reject) => {
+    resolvePromise = resolve
+    rejectPromise = reject
+  })
+  // Nobody may be waiting; don't let a failed flight become an unhandled rejection
+  promise.catch(() => {})
+
+  const flight = { promise, fingerprint, expiresAt: null }
+  state.flights.set(key, flight)
+  state.stats.leaders++
+  let settled = false
+
+  return {
+    leader: true,
+    resolve(result) {
+      if (settled) return
+      settled = true
+      state.flights.delete(key)
+      if (retainMs > 0) {
+        flight.expiresAt = Date.now() + retainMs
+        state.retained.set(key, flight)
+      }
+      resolvePromise(result)
+    },
+    reject(error) {
+      if (settled) return
+      settled = true
+      // Failed flights are not retained, so a retry runs again
+      state.flights.delete(key)
+      rejectPromise(error)
+    },
+  }
+}
+
+export function getSingleFlightStats() {
+  const { flights, retained, stats } = getState()
+  return { ...stats, inFlight: flights.size, retained: retained.size }
+}
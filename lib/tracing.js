@@ -0,0 +1,173 @@
+import crypto from 'crypto'
+import fs from 'fs'
+
+// W3C trace context for API requests. A sampled `traceparent` from the
+// client (or TRACE_SAMPLE_RATE for requests without one) makes the request a
+// server span whose stages (see startStage in metrics.js) become child spans.
+// Finished spans are exported as OTLP/JSON: appended to TRACE_EXPORT_PATH one
+// ExportTraceServiceRequest per line, and/or POSTed to an OTLP/HTTP endpoint.
+
+const exportPath = process.env.TRACE_EXPORT_PATH
+const otlpEndpoint = process.env.OTEL_EXPORTER_OTLP_TRACES_ENDPOINT
+const sampleRate = parseFloat(process.env.TRACE_SAMPLE_RATE) || 0
+const tracingEnabled = Boolean(exportPath || otlpEndpoint)
+
+const SERVICE_NAME = process.env.OTEL_SERVICE_NAME || 'syntherion-api'
+const FLUSH_INTERVAL_MS = 1000
+const MAX_BATCH = 512
+
+const TRACEPARENT = /^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$/
+
+export const SPAN_KIND_INTERNAL = 1
+export const SPAN_KIND_SERVER = 2
+
+function getState() {
+  if (!globalThis._syntherionTracing) {
+    globalThis._syntherionTracing = { buffer: [], timer: null, stream: null, exported: 0, errors: 0 }
+  }
+  return globalThis._syntherionTracing
+}
+
+function randomId(bytes) {
+  return crypto.randomBytes(bytes).toString('hex')
+}
+
+// Wall-clock time in Unix nanoseconds (microsecond precision), as OTLP wants it
+export function nowUnixNano() {
+  return (BigInt(Math.round((performance.timeOrigin + performance.now()) * 1000)) * 1000n).toString()
+}
+
+function attributeValue(value) {
+  if (typeof value === 'number' && Number.isInteger(value)) return { intValue: String(value) }
+  if (typeof value === 'number') return { doubleValue: value }
+  if (typeof value === 'boolean') return { boolValue: value }
+  return { stringValue: String(value) }
+}
+
+// Trace context for an incoming request: continues the caller's trace, or
+// starts one (sampled at TRACE_SAMPLE_RATE) when there is no valid traceparent
+export function startTrace(traceparent) {
+  const match = TRACEPARENT.exec((traceparent || '').trim().toLowerCase())
+  const valid = match && !/^0+$/.test(match[1]) && !/^0+$/.test(match[2])
+  const traceId = valid ? match[1] : randomId(16)
+  const sampled = tracingEnabled && (valid ? (parseInt(match[3], 16) & 1) === 1 : Math.random() < sampleRate)
+  return {
+    traceId,
+    parentSpanId: valid ? match[2] : null,
+    spanId: randomId(8),
+    sampled,
+    startTimeUnixNano: nowUnixNano(),
+  }
+}
+
+// traceresponse header (W3C Trace Context Level 2): the server span's id, so
+// a client can find its request in the exported spans
+export function traceResponseHeader(trace) {
+  return `00-${trace.traceId}-${trace.spanId}-${trace.sampled ? '01' : '00'}`
+}
+
+// Start a child span of `parentSpanId`; returns { spanId, end(attributes) }
+export function startSpan(trace, parentSpanId, name, kind = SPAN_KIND_INTERNAL) {
+  const spanId = randomId(8)
+  const startTimeUnixNano = nowUnixNano()
+  return {
+    spanId,
+    end(attributes = {}, error = false) {
+      recordSpan({
+        traceId: trace.traceId,
+        spanId,
+        parentSpanId,
+        name,
+        kind,
+        startTimeUnixNano,
+        endTimeUnixNano: nowUnixNano(),
+        attributes,
+        error,
+      })
+    },
+  }
+}
+
+// End the request's server span
+export function endTrace(trace, name, attributes, error) {
+  recordSpan({
+    traceId: trace.traceId,
+    spanId: trace.spanId,
+    parentSpanId: trace.parentSpanId,
+    name,
+    kind: SPAN_KIND_SERVER,
+    startTimeUnixNano: trace.startTimeUnixNano,
+    endTimeUnixNano: nowUnixNano(),
+    attributes,
+    error,
+  })
+}
+
+function recordSpan({ attributes, error, parentSpanId, ...span }) {
+  const state = getState()
+  state.buffer.push({
+    ...span,
+    ...(parentSpanId ? { parentSpanId } : {}),
+    attributes: Object.entries(attributes).map(([key, value]) => ({ key, value: attributeValue(value) })),
+    // 2 = STATUS_CODE_ERROR, 0 = STATUS_CODE_UNSET
+    status: { code: error ? 2 : 0 },
+  })
+  if (state.buffer.length >= MAX_BATCH) {
+    flushSpans()
+  } else if (!state.timer) {
+    state.timer = setTimeout(flushSpans, FLUSH_INTERVAL_MS)
+    state.timer.unref?.()
+  }
+}
+
+function exportRequest(spans) {
+  return {
+    resourceSpans: [{
+      resource: { attributes: [{ key: 'service.name', value: { stringValue: SERVICE_NAME } }] },
+      scopeSpans: [{ scope: { name: 'syntherion' }, spans }],
+    }],
+  }
+}
+
+// Write out buffered spans; also runs on a timer and before exit
+export function flushSpans() {
+  const state = getState()
+  clearTimeout(state.timer)
+  state.timer = null
+  if (state.buffer.length === 0) return
+  const spans = state.buffer
+  state.buffer = []
+  const body = JSON.stringify(exportRequest(spans))
+
+  if (exportPath) {
+    if (!state.stream) {
+      state.stream = fs.createWriteStream(exportPath, { flags: 'a' })
+      state.stream.on('error', (error) => {
+        state.errors++
+        console.error('Span export to file failed:', error)
+      })
+    }
+    state.stream.write(`${body}\n`)
+  }
+  if (otlpEndpoint) {
+    fetch(otlpEndpoint, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body })
+      .then((response) => {
+        if (!response.ok) throw new Error(`collector returned ${response.status}`)
+      })
+      .catch((error) => {
+        state.errors++
+        console.error('Span export to collector failed:', error.message)
+      })
+  }
+  state.exported += spans.length
+}
+
+export function getTracingStats() {
+  const { buffer, exported, errors } = getState()
+  return { enabled: tracingEnabled, sampleRate, buffered: buffer.length, exported, errors }
+}
+
+if (tracingEnabled && !globalThis._syntherionTracingExitHook) {
+  globalThis._syntherionTracingExitHook = true
+  process.once('beforeExit', flushSpans)
+}
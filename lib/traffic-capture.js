@@ -0,0 +1,144 @@
+import crypto from 'crypto'
+import fs from 'fs'
+import { getRequestAttributes, routeLabel } from '@/lib/metrics'
+
+// Capture mode: with TRAFFIC_CAPTURE_PATH set, every API request is appended
+// to that file as one JSON line describing its shape (route, message counts
+// and sizes, timing) for traffic_replay.py. No message text, credentials or
+// raw ids are written; users and sessions appear as salted hashes.
+
+const capturePath = process.env.TRAFFIC_CAPTURE_PATH
+// A fixed salt keeps hashes stable across restarts, so one trace can span several
+const captureSalt = process.env.TRAFFIC_CAPTURE_SALT || crypto.randomBytes(16).toString('hex')
+
+// Query parameters copied as-is; everything else is dropped or reduced to a length
+const KEPT_PARAMS = ['limit', 'summary', 'format', 'deep']
+const LENGTH_PARAMS = ['q']
+
+function getState() {
+  if (!globalThis._syntherionTrafficCapture) {
+    globalThis._syntherionTrafficCapture = { stream: null, startedAt: null, lastAt: null, written: 0, errors: 0 }
+  }
+  return globalThis._syntherionTrafficCapture
+}
+
+function openStream(state) {
+  if (!state.stream) {
+    state.stream = fs.createWriteStream(capturePath, { flags: 'a' })
+    state.stream.on('error', (error) => {
+      state.errors++
+      console.error('Traffic capture write failed:', error)
+    })
+  }
+  return state.stream
+}
+
+function anonymize(value) {
+  if (!value) return null
+  return crypto.createHash('sha256').update(`${captureSalt}:${value}`).digest('hex').slice(0, 16)
+}
+
+function messageShape(messages) {
+  if (!Array.isArray(messages)) return undefined
+  return messages.map((message) => ({
+    role: message?.role,
+    chars: typeof message?.content === 'string' ? message.content.length : 0,
+  }))
+}
+
+// Sizes and counts of a JSON body; never the text itself
+function bodyShape(path, body) {
+  if (!body || typeof body !== 'object') return {}
+  if (path === 'chat') {
+    return {
+      session: anonymize(body.sessionId),
+      messages: messageShape(typeof body.message === 'string'
+        ? [{ role: 'user', content: body.message }]
+        : body.messages),
+      stream: body.stream === true,
+    }
+  }
+  if (path === 'chat/batch') {
+    return {
+      concurrency: body.concurrency,
+      items: Array.isArray(body.items)
+        ? body.items.map((item) => ({
+          session: anonymize(item?.sessionId),
+          messages: messageShape(typeof item?.message === 'string'
+            ? [{ role: 'user', content: item.message }]
+            : item?.messages),
+        }))
+        : undefined,
+    }
+  }
+  return {}
+}
+
+function queryShape(searchParams) {
+  const query = {}
+  for (const name of KEPT_PARAMS) {
+    if (searchParams.has(name)) query[name] = searchParams.get(name)
+  }
+  for (const name of LENGTH_PARAMS) {
+    if (searchParams.has(name)) query[`${name}Length`] = searchParams.get(name).length
+  }
+  return query
+}
+
+async function readBody(request) {
+  if (request.method !== 'POST') return { bytes: 0, json: null }
+  const text = await request.clone().text()
+  try {
+    return { bytes: Buffer.byteLength(text), json: JSON.parse(text) }
+  } catch {
+    return { bytes: Buffer.byteLength(text), json: null }
+  }
+}
+
+// Run `handler` and, in capture mode, record the request's shape once it has
+// a response. For streamed responses durationMs is the time to the headers.
+// Must run inside withRequestMetrics so the authenticated user is known.
+export async function captureTraffic(request, path, handler) {
+  // Scrapes are monitoring, not traffic
+  if (!capturePath || path === 'metrics') {
+    return handler(request)
+  }
+
+  const state = getState()
+  const now = Date.now()
+  state.startedAt ??= now
+  const gapMs = state.lastAt === null ? 0 : now - state.lastAt
+  state.lastAt = now
+
+  const { searchParams } = new URL(request.url)
+  const body = await readBody(request)
+  const startedAt = performance.now()
+  let status = 500
+  try {
+    const response = await handler(request)
+    status = response.status
+    return response
+  } finally {
+    const entry = {
+      at: new Date(now).toISOString(),
+      offsetMs: now - state.startedAt,
+      gapMs,
+      method: request.method,
+      path: routeLabel(path),
+      user: anonymize(getRequestAttributes().userId),
+      ...(routeLabel(path) === 'chats/:id' ? { session: anonymize(path.slice('chats/'.length)) } : {}),
+      query: queryShape(searchParams),
+      bodyBytes: body.bytes,
+      ...bodyShape(path, body.json),
+      status,
+      durationMs: Math.round((performance.now() - startedAt) * 10) / 10,
+    }
+    openStream(state).write(`${JSON.stringify(entry)}\n`)
+    state.written++
+  }
+}
+
+export function getTrafficCaptureStats() {
+  const { written, errors } = getState()
+  return { enabled: Boolean(capturePath), path: capturePath || null, written, errors }
+}
@@ -0,0 +1,139 @@
+import http from 'http'
+import https from 'https'
+import { Readable } from 'stream'
+
+// Keep-alive connection pools for upstream APIs (OpenRouter, Supabase), with
+// reuse counters and an optional background ping that keeps a socket warm
+// through idle periods so requests don't pay a fresh TLS handshake.
+
+function envInt(name, fallback) {
+  const value = parseInt(process.env[name], 10)
+  return Number.isNaN(value) ? fallback : value
+}
+
+const agentOptions = {
+  keepAlive: true,
+  keepAliveMsecs: 1000,
+  maxSockets: envInt('UPSTREAM_MAX_SOCKETS', 64),
+  maxFreeSockets: envInt('UPSTREAM_MAX_FREE_SOCKETS', 16),
+  // Idle sockets close before the upstream's own idle timeout (typically 60s) can reset them
+  timeout: envInt('UPSTREAM_IDLE_TIMEOUT_MS', 55000),
+  // Reuse the most recently used socket so the rest can idle out
+  scheduling: 'lifo',
+}
+const keepWarmMs = envInt('UPSTREAM_KEEPWARM_MS', 25000)
+
+function getRegistry() {
+  if (!globalThis._syntherionUpstreamAgents) {
+    globalThis._syntherionUpstreamAgents = new Map()
+  }
+  return globalThis._syntherionUpstreamAgents
+}
+
+// The pooled agent for `name`, created on first use for `baseUrl`'s protocol
+export function getUpstreamAgent(name, baseUrl) {
+  const registry = getRegistry()
+  if (!registry.has(name)) {
+    const Agent = new URL(baseUrl).protocol === 'http:' ? http.Agent : https.Agent
+    const agent = new Agent(agentOptions)
+    const stats = { created: 0, reused: 0, errors: 0, warmups: 0, warmupFailures: 0 }
+
+    // createConnection runs once per new socket (one TLS handshake each),
+    // reuseSocket each time a pooled socket is handed to another request
+    const createConnection = agent.createConnection.bind(agent)
+    agent.createConnection = (options, callback) => {
+      stats.created++
+      const socket = createConnection(options, callback)
+      socket?.once?.('error', () => stats.errors++)
+      return socket
+    }
+    const reuseSocket = agent.reuseSocket.bind(agent)
+    agent.reuseSocket = (socket, request) => {
+      stats.reused++
+      return reuseSocket(socket, request)
+    }
+
+    registry.set(name, { agent, stats, baseUrl, timer: null })
+  }
+  return registry.get(name).agent
+}
+
+function countSockets(group) {
+  return Object.values(group).reduce((total, sockets) => total + sockets.length, 0)
+}
+
+// fetch() over the named agent's pool, for clients that take a custom fetch
+// (supabase-js). Bodies are strings or bytes, which covers JSON APIs.
+export function agentFetch(name, baseUrl) {
+  const agent = getUpstreamAgent(name, baseUrl)
+  return (input, init = {}) => new Promise((resolve, reject) => {
+    const url = new URL(typeof input === 'string' || input instanceof URL ? input : input.url)
+    const method = (init.method || 'GET').toUpperCase()
+    const transport = url.protocol === 'http:' ? http : https
+    const request = transport.request(url, {
+      method,
+      headers: Object.fromEntries(new Headers(init.headers || {})),
+      agent,
+      signal: init.signal,
+    }, (response) => {
+      const headers = new Headers()
+      for (let i = 0; i < response.rawHeaders.length; i += 2) {
+        headers.append(response.rawHeaders[i], response.rawHeaders[i + 1])
+      }
+      const empty = method === 'HEAD' || response.statusCode === 204 || response.statusCode === 304
+      if (empty) response.resume()
+      resolve(new Response(empty ? null : Readable.toWeb(response), {
+        status: response.statusCode,
+        statusText: response.statusMessage,
+        headers,
+      }))
+    })
+    request.on('error', reject)
+    const body = init.body instanceof URLSearchParams ? init.body.toString() : init.body
+    request.end(body ?? undefined)
+  })
+}
+
+// Periodically send a cheap request through the pool so at least one socket
+// stays open. The timer is unref'd and never keeps the process alive.
+// Only a 2xx counts as a warmup; an upstream that doesn't implement HEAD
+// (405/501, usually with Connection: close) is pinged with GET from then on.
+export function keepWarm(name, url, headers = {}) {
+  const entry = getRegistry().get(name)
+  if (!entry || entry.timer || keepWarmMs <= 0 || process.env.NEXT_PHASE === 'phase-production-build') {
+    return
+  }
+  const fetchWarm = agentFetch(name, entry.baseUrl)
+  let method = 'HEAD'
+  const ping = async () => {
+    try {
+      const response = await fetchWarm(url, { method, headers, signal: AbortSignal.timeout(5000) })
+      // Drain the body so the socket goes back to the pool
+      await response.arrayBuffer()
+      entry.stats[response.ok ? 'warmups' : 'warmupFailures']++
+      if (method === 'HEAD' && (response.status === 405 || response.status === 501)) {
+        method = 'GET'
+      }
+    } catch {
+      entry.stats.warmupFailures++
+    }
+  }
+  ping()
+  entry.timer = setInterval(ping, keepWarmMs)
+  entry.timer.unref?.()
+}
+
+export function getUpstreamAgentStats() {
+  const stats = {}
+  for (const [name, { agent, stats: counters }] of getRegistry()) {
+    const requests = counters.created + counters.reused
+    stats[name] = {
+      ...counters,
+      reuseRatio: requests ? counters.reused / requests : 0,
+      active: countSockets(agent.sockets),
+      idle: countSockets(agent.freeSockets),
+      queued: countSockets(agent.requests),
+    }
+  }
+  return stats
+}
@@ -0,0 +1,243 @@
+import fs from 'fs'
+import os from 'os'
+import path from 'path'
+import { observeHistogram } from '@/lib/metrics'
+
+// Write-behind queue: callers enqueue and return immediately, a background
+// loop writes batches. Bounded in memory, retried with jittered backoff, and
+// spilled to a local NDJSON file when the store stays unavailable or the
+// process exits with writes still pending. The spill file is replayed on start.
+
+function envInt(name, fallback) {
+  const value = parseInt(process.env[name], 10)
+  return Number.isNaN(value) ? fallback : value
+}
+
+const defaults = {
+  maxQueue: envInt('WRITE_BEHIND_MAX_QUEUE', 5000),
+  batchSize: envInt('WRITE_BEHIND_BATCH_SIZE', 200),
+  flushIntervalMs: envInt('WRITE_BEHIND_FLUSH_INTERVAL_MS', 50),
+  maxRetries: envInt('WRITE_BEHIND_MAX_RETRIES', 5),
+  retryBaseMs: envInt('WRITE_BEHIND_RETRY_BASE_MS', 200),
+  enqueueTimeoutMs: envInt('WRITE_BEHIND_ENQUEUE_TIMEOUT_MS', 5000),
+  spillDir: process.env.WRITE_BEHIND_SPILL_DIR || os.tmpdir(),
+}
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// Full jitter: a random delay up to the exponential backoff cap
+function backoffMs(attempt, baseMs) {
+  return Math.random() * baseMs * 2 ** attempt
+}
+
+class WriteBehindQueue {
+  // writeBatch(items) persists a batch and throws on failure. It may throw an
+  // error with `failedIndexes` to retry only part of the batch.
+  constructor(name, writeBatch, options = {}) {
+    this.name = name
+    this.writeBatch = writeBatch
+    this.options = { ...defaults, ...options }
+    this.spillPath = path.join(this.options.spillDir, `syntherion-${name}-spill.ndjson`)
+    this.queue = []
+    this.inFlight = []
+    this.spaceWaiters = []
+    this.timer = null
+    this.flushing = null
+    this.stats = {
+      enqueued: 0,
+      written: 0,
+      batches: 0,
+      failures: 0,
+      retries: 0,
+      spilled: 0,
+      replayed: 0,
+      backpressureWaits: 0,
+      lastFlushMs: 0,
+      lastError: null,
+    }
+  }
+
+  // Queue an item. When the queue is full the caller waits for space
+  // (backpressure); if none frees up in time the item goes to the spill file.
+  async enqueue(item) {
+    if (this.queue.length >= this.options.maxQueue) {
+      this.stats.backpressureWaits++
+      const gotSpace = await this.waitForSpace()
+      if (!gotSpace) {
+        this.spill([item])
+        return
+      }
+    }
+    this.queue.push(item)
+    this.stats.enqueued++
+    this.schedule()
+  }
+
+  waitForSpace() {
+    return new Promise((resolve) => {
+      const waiter = { resolve }
+      waiter.timer = setTimeout(() => {
+        this.spaceWaiters = this.spaceWaiters.filter((w) => w !== waiter)
+        resolve(false)
+      }, this.options.enqueueTimeoutMs)
+      this.spaceWaiters.push(waiter)
+      this.schedule()
+    })
+  }
+
+  releaseWaiters() {
+    while (this.spaceWaiters.length && this.queue.length < this.options.maxQueue) {
+      const waiter = this.spaceWaiters.shift()
+      clearTimeout(waiter.timer)
+      waiter.resolve(true)
+    }
+  }
+
+  schedule() {
+    if (this.timer || this.flushing) return
+    this.timer = setTimeout(() => {
+      this.timer = null
+      this.flush().catch((error) => console.error(`Write-behind ${this.name} flush error:`, error))
+    }, this.options.flushIntervalMs)
+    this.timer.unref?.()
+  }
+
+  // Write everything currently queued, batch by batch
+  async flush() {
+    if (this.flushing) return this.flushing
+    this.flushing = (async () => {
+      while (this.queue.length) {
+        const batch = this.queue.splice(0, this.options.batchSize)
+        this.inFlight = batch
+        this.releaseWaiters()
+        await this.writeWithRetry(batch)
+        this.inFlight = []
+      }
+    })().finally(() => {
+      this.flushing = null
+      if (this.queue.length) this.schedule()
+    })
+    return this.flushing
+  }
+
+  async writeWithRetry(batch) {
+    let pending = batch
+    for (let attempt = 0; pending.length; attempt++) {
+      const startedAt = performance.now()
+      try {
+        await this.writeBatch(pending)
+        this.recordFlush(startedAt, pending.length)
+        if (attempt === 0) this.replaySpill()
+        return
+      } catch (error) {
+        this.stats.failures++
+        this.stats.lastError = error.message
+        const failed = error.failedIndexes
+        if (failed) {
+          this.recordFlush(startedAt, pending.length - failed.length)
+          pending = failed.map((index) => pending[index])
+        }
+        if (attempt >= this.options.maxRetries) {
+          console.error(`Write-behind ${this.name}: giving up after ${attempt + 1} attempts, spilling ${pending.length} items:`, error)
+          this.spill(pending)
+          return
+        }
+        this.stats.retries++
+        await sleep(backoffMs(attempt, this.options.retryBaseMs))
+      }
+    }
+  }
+
+  recordFlush(startedAt, count) {
+    const durationMs = performance.now() - startedAt
+    this.stats.batches++
+    this.stats.written += count
+    this.stats.lastFlushMs = durationMs
+    observeHistogram('write_behind_flush_seconds', 'Write-behind batch write latency in seconds', { queue: this.name }, durationMs / 1000)
+  }
+
+  // Synchronous so it is safe from the process 'exit' handler
+  spill(items) {
+    if (!items.length) return
+    try {
+      fs.appendFileSync(this.spillPath, items.map((item) => `${JSON.stringify(item)}\n`).join(''))
+      this.stats.spilled += items.length
+    } catch (error) {
+      console.error(`Write-behind ${this.name}: failed to spill ${items.length} items:`, error)
+    }
+  }
+
+  // Re-queue anything a previous run (or a failed flush) spilled to disk
+  replaySpill() {
+    if (!fs.existsSync(this.spillPath)) return
+    const replayPath = `${this.spillPath}.${process.pid}.replay`
+    try {
+      fs.renameSync(this.spillPath, replayPath)
+    } catch {
+      return // Another process picked it up
+    }
+    const lines = fs.readFileSync(replayPath, 'utf8').split('\n').filter(Boolean)
+    fs.unlinkSync(replayPath)
+    for (const line of lines) {
+      try {
+        this.queue.push(JSON.parse(line))
+        this.stats.replayed++
+      } catch {
+        console.error(`Write-behind ${this.name}: skipping corrupt spill line`)
+      }
+    }
+    if (lines.length) {
+      console.log(`Write-behind ${this.name}: replaying ${lines.length} spilled items`)
+      this.schedule()
+    }
+  }
+
+  // Items not yet written, including the batch currently being written
+  pending() {
+    return [...this.inFlight, ...this.queue]
+  }
+
+  getStats() {
+    return { ...this.stats, depth: this.queue.length, inFlight: this.inFlight.length, maxQueue: this.options.maxQueue }
+  }
+}
+
+function installShutdownHooks(registry) {
+  // Best effort: give pending writes a chance to reach the store...
+  const drain = () => Promise.race([
+    Promise.all([...registry.values()].map((queue) => queue.flush())),
+    sleep(5000),
+  ])
+  for (const [signal, code] of [['SIGTERM', 143], ['SIGINT', 130]]) {
+    process.once(signal, async () => {
+      await drain()
+      // Listening for a signal suppresses the default exit; restore it if nobody else handles it
+      if (process.listenerCount(signal) === 0) process.exit(code)
+    })
+  }
+  process.once('beforeExit', drain)
+  // ...and whatever is still pending when the process actually exits goes to disk
+  process.once('exit', () => {
+    for (const queue of registry.values()) {
+      queue.spill(queue.pending())
+    }
+  })
+}
+
+// One queue per name per process, surviving hot reloads
+export function getWriteBehindQueue(name, writeBatch, options) {
+  if (!globalThis._syntherionWriteBehind) {
+    globalThis._syntherionWriteBehind = new Map()
+    installShutdownHooks(globalThis._syntherionWriteBehind)
+  }
+  const registry = globalThis._syntherionWriteBehind
+  if (!registry.has(name)) {
+    const queue = new WriteBehindQueue(name, writeBatch, options)
+    registry.set(name, queue)
+    queue.replaySpill()
+  } else {
+    // Pick up the latest writer after a hot reload
+    registry.get(name).writeBatch = writeBatch
+  }
+  return registry.get(name)
+}
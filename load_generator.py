@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Load Generator
+Drives concurrent virtual users against the backend API endpoints with asyncio
+and reports per-endpoint throughput and latency percentiles
+
+Each virtual user signs up as its own user by default, so the per-user chat
+rate limit (RATE_LIMIT_BURST=10, RATE_LIMIT_PER_MINUTE=30) applies per VU.
+Chat-heavy mixes or --identity shared still need the app started with higher
+limits, e.g. RATE_LIMIT_BURST=1000 RATE_LIMIT_PER_MINUTE=60000. Otherwise the
+run measures the rate limiter; 429s are reported in their own column.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import aiohttp
+import requests
+from yarl import URL
+
+from backend_test import API_BASE, TEST_MESSAGES, SyntherionAPITester
+from test_auth_bypass import TEST_EMAIL, TEST_PASSWORD
+
+# Endpoint scenarios, mirroring the checks in SyntherionAPITester.
+# Each entry is (method, path, needs_auth, expected_status)
+SCENARIOS = {
+    "health": ("GET", "/health", False, 200),
+    "auth_user": ("GET", "/auth/user", True, 200),
+    "chats": ("GET", "/chats", True, 200),
+    "chat": ("POST", "/chat", True, 200),
+    "chat_stream": ("POST", "/chat", True, 200),
+    "chat_batch": ("POST", "/chat/batch", True, 200),
+}
+
+DEFAULT_MIX = "health=1,auth_user=2,chats=2,chat=1"
+
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+def parse_mix(mix):
+    """Parse a scenario mix like 'chat=1,chats=3' into (names, weights)"""
+    names, weights = [], []
+    for part in mix.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    if not names:
+        raise ValueError("Scenario mix is empty")
+    return names, weights
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LoadProfile:
+    """Ramp-up, sustained and ramp-down phases for a target level (users or rate)"""
+
+    def __init__(self, target, ramp_up, sustain, ramp_down):
+        self.target = target
+        self.ramp_up = ramp_up
+        self.sustain = sustain
+        self.ramp_down = ramp_down
+
+    @property
+    def duration(self):
+        return self.ramp_up + self.sustain + self.ramp_down
+
+    def phase(self, elapsed):
+        if elapsed < self.ramp_up:
+            return "ramp-up"
+        if elapsed < self.ramp_up + self.sustain:
+            return "sustain"
+        return "ramp-down"
+
+    def level(self, elapsed):
+        """Target level at the given number of seconds into the run"""
+        if elapsed < self.ramp_up:
+            return self.target * elapsed / self.ramp_up
+        if elapsed < self.ramp_up + self.sustain:
+            return self.target
+        if elapsed < self.duration:
+            return self.target * (self.duration - elapsed) / self.ramp_down
+        return 0
+
+
+class LatencyRecorder:
+    """Collects per-endpoint samples and summarises them"""
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, endpoint, phase, latency_ms, status, ok, extra=None):
+        sample = {
+            "endpoint": endpoint,
+            "phase": phase,
+            "latency_ms": latency_ms,
+            "status": status,
+            "ok": ok,
+        }
+        if extra:
+            sample.update(extra)
+        self.samples.append(sample)
+
+    def summary(self, phases=None):
+        """Per-endpoint throughput and latency percentiles for the selected phases"""
+        selected = [s for s in self.samples if phases is None or s["phase"] in phases]
+        endpoints = {}
+        for sample in selected:
+            endpoints.setdefault(sample["endpoint"], []).append(sample)
+
+        summary = {}
+        for endpoint, samples in sorted(endpoints.items()):
+            latencies = sorted(s["latency_ms"] for s in samples)
+            ttfts = sorted(s["ttft_ms"] for s in samples if s.get("ttft_ms") is not None)
+            statuses = {}
+            models = {}
+            for s in samples:
+                statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+                if s.get("model"):
+                    models[s["model"]] = models.get(s["model"], 0) + 1
+            summary[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(1 for s in samples if not s["ok"]),
+                "rate_limited": statuses.get("429", 0),
+                "statuses": statuses,
+                "mean_ms": sum(latencies) / len(latencies),
+                "max_ms": latencies[-1],
+                **{f"p{p:g}_ms": percentile(latencies, p) for p in PERCENTILES},
+            }
+            if ttfts:
+                summary[endpoint]["ttft"] = {f"p{p:g}_ms": percentile(ttfts, p) for p in PERCENTILES}
+            if models:
+                summary[endpoint]["models"] = models
+            if any("items" in s for s in samples):
+                summary[endpoint]["items"] = sum(s.get("items", 0) for s in samples)
+        return summary
+
+
+class VirtualUser:
+    """One simulated client with its own cookie jar, sharing the connection pool"""
+
+    def __init__(self, index, connector, timeout, batch_size=10, batch_concurrency=4, unique_prompts=True):
+        self.index = index
+        self.unique_prompts = unique_prompts
+        self.prompts_sent = 0
+        self.batch_size = batch_size
+        self.batch_concurrency = batch_concurrency
+        self.session_id = str(uuid.uuid4())
+        self.http = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=timeout,
+        )
+        self.signed_in = False
+
+    async def sign_in(self, identity="per-user"):
+        """Sign in so authenticated scenarios get a session cookie: as a fresh user of
+        its own (per-user), or with the shared test credentials (shared)"""
+        if identity == "per-user":
+            session = requests.Session()
+            email, _ = await asyncio.to_thread(SyntherionAPITester(session).sign_in_new_user, f"load{self.index}")
+            if email:
+                self.http.cookie_jar.update_cookies({c.name: c.value for c in session.cookies}, URL(API_BASE))
+            self.signed_in = email is not None
+            return self.signed_in
+
+        payload = {"email": TEST_EMAIL, "password": TEST_PASSWORD}
+        async with self.http.post(f"{API_BASE}/auth/signin", json=payload) as response:
+            await response.read()
+            self.signed_in = response.status == 200
+        return self.signed_in
+
+    def prompt(self, suffix=""):
+        """The user message to send. Unique per request unless prompts repeat, so neither
+        single-flight coalescing nor the response cache can answer it instead of upstream"""
+        content = TEST_MESSAGES[-1]["content"] + suffix
+        if not self.unique_prompts:
+            return content
+        self.prompts_sent += 1
+        return f"{content} [vu {self.index} #{self.prompts_sent} {uuid.uuid4().hex[:8]}]"
+
+    async def run(self, scenario):
+        """Issue one scenario request, returning (status, ok, extra)"""
+        method, path, _, expected = SCENARIOS[scenario]
+        kwargs = {}
+        if scenario == "chat":
+            kwargs["json"] = {"messages": [{"role": "user", "content": self.prompt()}], "sessionId": self.session_id}
+        elif scenario == "chat_stream":
+            kwargs["json"] = {
+                "messages": [{"role": "user", "content": self.prompt()}],
+                "sessionId": self.session_id,
+                "stream": True,
+            }
+        elif scenario == "chat_batch":
+            kwargs["json"] = {
+                "items": [
+                    {"id": i, "message": self.prompt(f" (batch item {i})")}
+                    for i in range(self.batch_size)
+                ],
+                "concurrency": self.batch_concurrency,
+            }
+        started = time.monotonic()
+        async with self.http.request(method, f"{API_BASE}{path}", **kwargs) as response:
+            if scenario == "chat_stream" and response.status == expected:
+                return await self.read_stream(response, started)
+            if scenario == "chat_batch" and response.status == expected:
+                return await self.read_batch(response, started)
+            if scenario == "chat" and response.status == expected:
+                data = await response.json()
+                return response.status, True, {"model": data.get("model")}
+            await response.read()
+            return response.status, response.status == expected, None
+
+    async def read_stream(self, response, started):
+        """Consume an SSE chat stream, timing the first token separately from the whole response"""
+        event = None
+        ttft_ms = None
+        model = None
+        ok = False
+        async for raw_line in response.content:
+            line = raw_line.decode().strip()
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                if event == "token" and ttft_ms is None:
+                    ttft_ms = (time.monotonic() - started) * 1000
+                elif event == "done":
+                    ok = True
+                    model = json.loads(line[5:]).get("model")
+                elif event == "error":
+                    ok = False
+        return response.status, ok, {"ttft_ms": ttft_ms, "model": model}
+
+    async def read_batch(self, response, started):
+        """Consume an NDJSON batch stream; the first finished item counts as the first token"""
+        ttft_ms = None
+        done = None
+        async for raw_line in response.content:
+            line = raw_line.decode().strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if data["type"] in ("result", "error") and ttft_ms is None:
+                ttft_ms = (time.monotonic() - started) * 1000
+            elif data["type"] == "done":
+                done = data
+        ok = done is not None and done["failed"] == 0 and done["saved"]
+        return response.status, ok, {"ttft_ms": ttft_ms, "items": done["succeeded"] if done else 0}
+
+    async def close(self):
+        await self.http.close()
+
+
+class LoadGenerator:
+    """Runs a scenario mix in closed-loop (concurrency) or open-loop (rate) mode"""
+
+    def __init__(self, args):
+        self.args = args
+        self.names, self.weights = parse_mix(args.mix)
+        self.profile = LoadProfile(
+            args.rate if args.rate else args.users,
+            args.ramp_up,
+            args.duration,
+            args.ramp_down,
+        )
+        self.recorder = LatencyRecorder()
+        self.users = []
+        self.started_at = None
+        self.in_flight = 0
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def pick_scenario(self):
+        return random.choices(self.names, weights=self.weights)[0]
+
+    async def execute(self, user, scenario, scheduled_at=None):
+        """Run one request and record it; open-loop latency is measured from its scheduled time"""
+        phase = self.profile.phase(self.elapsed())
+        start = scheduled_at if scheduled_at is not None else time.monotonic()
+        self.in_flight += 1
+        try:
+            status, ok, extra = await user.run(scenario)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, ok, extra = type(e).__name__, False, None
+        finally:
+            self.in_flight -= 1
+        latency_ms = (time.monotonic() - start) * 1000
+        self.recorder.record(scenario, phase, latency_ms, status, ok, extra)
+
+    async def closed_loop_user(self, user):
+        """A virtual user loops while the profile says it should be active"""
+        while True:
+            elapsed = self.elapsed()
+            if elapsed >= self.profile.duration:
+                return
+            if user.index >= math.ceil(self.profile.level(elapsed)):
+                await asyncio.sleep(0.05)
+                continue
+            await self.execute(user, self.pick_scenario())
+            if self.args.think_time:
+                await asyncio.sleep(random.uniform(0, 2 * self.args.think_time))
+
+    async def open_loop(self):
+        """Schedule arrivals at the profile's target rate regardless of response times"""
+        limit = asyncio.Semaphore(self.args.max_in_flight)
+        tasks = set()
+        next_at = time.monotonic()
+
+        async def fire(scheduled_at):
+            async with limit:
+                await self.execute(random.choice(self.users), self.pick_scenario(), scheduled_at)
+
+        while True:
+            elapsed = self.elapsed()
+            if elapsed >= self.profile.duration:
+                break
+            rate = self.profile.level(elapsed)
+            if rate <= 0:
+                await asyncio.sleep(0.05)
+                next_at = time.monotonic()
+                continue
+            interval = random.expovariate(rate) if self.args.poisson else 1 / rate
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(fire(next_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.args.max_connections)
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        self.users = [
+            VirtualUser(i, connector, timeout, self.args.batch_size, self.args.batch_concurrency,
+                        not self.args.repeat_prompts)
+            for i in range(self.args.users)
+        ]
+        try:
+            if any(SCENARIOS[name][2] for name in self.names):
+                results = await asyncio.gather(*(u.sign_in(self.args.identity) for u in self.users),
+                                               return_exceptions=True)
+                signed_in = sum(1 for r in results if r is True)
+                print(f"Signed in {signed_in}/{len(self.users)} virtual users")
+
+            self.started_at = time.monotonic()
+            if self.args.rate:
+                await self.open_loop()
+            else:
+                await asyncio.gather(*(self.closed_loop_user(u) for u in self.users))
+        finally:
+            for user in self.users:
+                await user.close()
+            await connector.close()
+        return self.recorder
+
+
+def print_report(summary, wall_seconds):
+    """Print a per-endpoint throughput and latency table"""
+    print("\n" + "=" * 80)
+    print("LOAD TEST SUMMARY")
+    print("=" * 80)
+    header = (f"{'Endpoint':<12}{'Reqs':>8}{'Err':>6}{'429':>6}{'RPS':>9}"
+              + "".join(f"{f'p{p:g}':>10}" for p in PERCENTILES))
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in summary.items():
+        rps = stats["requests"] / wall_seconds if wall_seconds else 0
+        row = f"{endpoint:<12}{stats['requests']:>8}{stats['errors']:>6}{stats['rate_limited']:>6}{rps:>9.1f}"
+        row += "".join(f"{stats[f'p{p:g}_ms']:>10.1f}" for p in PERCENTILES)
+        print(row)
+    print("-" * len(header))
+
+    streamed = {endpoint: stats["ttft"] for endpoint, stats in summary.items() if "ttft" in stats}
+    if streamed:
+        print("Time to first token")
+        for endpoint, ttft in streamed.items():
+            row = f"{endpoint:<12}{'':>29}" + "".join(f"{ttft[f'p{p:g}_ms']:>10.1f}" for p in PERCENTILES)
+            print(row)
+        print("-" * len(header))
+
+    batched = {endpoint: stats["items"] for endpoint, stats in summary.items() if "items" in stats}
+    if batched:
+        print("Batch items completed")
+        for endpoint, items in batched.items():
+            rate = items / wall_seconds if wall_seconds else 0
+            print(f"{endpoint:<12}{items:>8}{rate:>15.1f} items/s")
+        print("-" * len(header))
+
+    routed = {endpoint: stats["models"] for endpoint, stats in summary.items() if "models" in stats}
+    if routed:
+        print("Models used")
+        for endpoint, models in routed.items():
+            print(f"{endpoint:<12}" + ", ".join(f"{model}: {count}" for model, count in sorted(models.items())))
+        print("-" * len(header))
+    print("Latencies in milliseconds; Err includes 429s")
+    rate_limited = sum(stats["rate_limited"] for stats in summary.values())
+    if rate_limited:
+        print(f"⚠️  {rate_limited} requests were rate limited (429); start the app with higher "
+              "RATE_LIMIT_BURST/RATE_LIMIT_PER_MINUTE to measure the app rather than the limiter")
+    print("=" * 80)
+
+
+def parse_limits(values):
+    """Parse --max-p99 values: a bare number applies to every endpoint, ENDPOINT=MS to one"""
+    limits = {}
+    for value in values or []:
+        endpoint, _, ms = value.rpartition("=")
+        limits[endpoint or "*"] = float(ms)
+    return limits
+
+
+def check_limits(summary, limits):
+    """Return a message for every endpoint whose p99 exceeds its limit"""
+    violations = []
+    for endpoint, stats in summary.items():
+        limit = limits.get(endpoint, limits.get("*"))
+        if limit is not None and stats["p99_ms"] > limit:
+            violations.append(f"{endpoint}: p99 {stats['p99_ms']:.1f}ms exceeds {limit:g}ms")
+    return violations
+
+
+async def configure_stub(stub_url, values):
+    """Apply live settings (e.g. injected slowness) to an upstream_stubs.py server"""
+    async with aiohttp.ClientSession() as http:
+        async with http.post(f"{stub_url.rstrip('/')}/__stub/config", json=values) as response:
+            data = await response.json()
+            if response.status != 200:
+                raise RuntimeError(f"Stub rejected config: {data.get('error')}")
+            return data
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Syntherion AI async load generator")
+    parser.add_argument("--users", type=int, default=10, help="virtual users (closed-loop concurrency)")
+    parser.add_argument("--rate", type=float, default=0, help="target requests/second (switches to open-loop mode)")
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds to ramp up to the target")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to sustain the target")
+    parser.add_argument("--ramp-down", type=float, default=5, help="seconds to ramp down from the target")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted scenario mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0, help="mean seconds between requests per user")
+    parser.add_argument("--identity", choices=["per-user", "shared"], default="per-user",
+                        help="sign each virtual user up as its own user, or all in as the shared test user")
+    parser.add_argument("--poisson", action="store_true", help="use exponential inter-arrival times in rate mode")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="cap on concurrent requests in rate mode")
+    parser.add_argument("--max-connections", type=int, default=0, help="connection pool size (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--phase", choices=["all", "sustain"], default="all", help="phases included in the report")
+    parser.add_argument("--json-out", help="write the summary as JSON to this path")
+    parser.add_argument("--batch-size", type=int, default=10, help="conversations per chat_batch request")
+    parser.add_argument("--batch-concurrency", type=int, default=4, help="server-side fan-out for chat_batch")
+    parser.add_argument("--repeat-prompts", action="store_true",
+                        help="send the same chat prompt every time, so coalescing and the response cache "
+                             "answer most chats (by default every prompt is unique and reaches upstream)")
+    parser.add_argument("--max-p99", action="append", metavar="[ENDPOINT=]MS",
+                        help="fail (exit 1) if p99 latency exceeds this; repeatable per endpoint")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8001",
+                        help="OpenRouter stand-in to configure with --stub-config")
+    parser.add_argument("--stub-config", type=json.loads, metavar="JSON",
+                        help='settings to apply to the stand-in first, e.g. \'{"slow_rate": 0.05, "slow_latency_ms": 3000}\'')
+    return parser
+
+
+async def main(argv=None):
+    args = build_parser().parse_args(argv)
+    mode = f"rate {args.rate:g} req/s" if args.rate else f"{args.users} concurrent users"
+
+    print("=" * 80)
+    print("SYNTHERION AI LOAD GENERATOR")
+    print("=" * 80)
+    print(f"Testing against: {API_BASE}")
+    print(f"Load: {mode}, ramp-up {args.ramp_up:g}s, sustain {args.duration:g}s, ramp-down {args.ramp_down:g}s")
+    print(f"Scenario mix: {args.mix}")
+    if args.stub_config:
+        await configure_stub(args.stub_url, args.stub_config)
+        print(f"Upstream stand-in configured: {json.dumps(args.stub_config)}")
+    print(f"Test started at: {datetime.now().isoformat()}")
+    print("=" * 80)
+
+    generator = LoadGenerator(args)
+    recorder = await generator.run()
+
+    phases = None if args.phase == "all" else {args.phase}
+    wall_seconds = generator.profile.duration if phases is None else generator.profile.sustain
+    summary = recorder.summary(phases)
+    print_report(summary, wall_seconds)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({
+                "base_url": API_BASE,
+                "mode": mode,
+                "args": vars(args),
+                "wall_seconds": wall_seconds,
+                "endpoints": summary,
+            }, f, indent=2)
+        print(f"Summary written to {args.json_out}")
+
+    violations = check_limits(summary, parse_limits(args.max_p99))
+    if violations:
+        print("\nLATENCY THRESHOLDS EXCEEDED")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+
+    return summary
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
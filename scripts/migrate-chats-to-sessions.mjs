@@ -0,0 +1,129 @@
+// Fold legacy per-turn `chats` documents into one `sessions` document per conversation.
+//
+// Every legacy turn stored the full transcript so far, so the newest document of
+// each (userId, sessionId) group already holds the complete conversation. Sessions
+// that received new turns after the deploy get the legacy transcript prepended.
+//
+// Each session records the legacy chat ids it was built from (legacyChatIds), so a
+// rerun after a crash between the session write and the marking of the legacy
+// documents leaves already-migrated groups alone instead of prepending them twice.
+//
+// Usage: node --env-file=.env scripts/migrate-chats-to-sessions.mjs [--dry-run] [--delete] [--batch-size=500]
+import { MongoClient } from 'mongodb'
+
+const args = process.argv.slice(2)
+const dryRun = args.includes('--dry-run')
+const deleteLegacy = args.includes('--delete')
+const batchSize = parseInt(args.find((arg) => arg.startsWith('--batch-size='))?.split('=')[1] || '500', 10)
+
+const TITLE_LENGTH = 60
+
+function sessionTitle(messages) {
+  const first = messages.find((message) => message.role === 'user')
+  const text = (first?.content || 'New chat').replace(/\s+/g, ' ').trim()
+  return text.length > TITLE_LENGTH ? `${text.slice(0, TITLE_LENGTH - 1)}…` : text
+}
+
+// Upsert one group into its session. Pipeline update so the prepend is skipped when
+// any of the group's chat ids was already folded in by an earlier run.
+function migrationOperation(userId, sessionId, group, messages) {
+  const fresh = {
+    $eq: [{ $size: { $setIntersection: [{ $ifNull: ['$legacyChatIds', []] }, { $literal: group.ids }] } }, 0],
+  }
+  return {
+    updateOne: {
+      filter: { sessionId, userId },
+      update: [
+        { $set: { _fresh: fresh } },
+        {
+          $set: {
+            messages: {
+              $cond: ['$_fresh', { $concatArrays: [{ $literal: messages }, { $ifNull: ['$messages', []] }] }, '$messages'],
+            },
+            messageCount: {
+              $cond: ['$_fresh', { $add: [{ $ifNull: ['$messageCount', 0] }, messages.length] }, '$messageCount'],
+            },
+            legacyChatIds: {
+              $cond: ['$_fresh', { $concatArrays: [{ $ifNull: ['$legacyChatIds', []] }, { $literal: group.ids }] }, '$legacyChatIds'],
+            },
+            createdAt: { $min: [{ $ifNull: ['$createdAt', group.createdAt] }, group.createdAt] },
+            updatedAt: { $max: ['$updatedAt', group.updatedAt] },
+            id: { $ifNull: ['$id', { $literal: sessionId }] },
+            userEmail: { $ifNull: ['$userEmail', { $literal: group.userEmail }] },
+            title: { $ifNull: ['$title', { $literal: sessionTitle(messages) }] },
+          },
+        },
+        { $unset: '_fresh' },
+      ],
+      upsert: true,
+    },
+  }
+}
+
+async function flush(db, operations, migratedIds, totals) {
+  if (operations.length === 0) return
+  if (!dryRun) {
+    await db.collection('sessions').bulkWrite(operations, { ordered: false })
+    if (deleteLegacy) {
+      await db.collection('chats').deleteMany({ _id: { $in: migratedIds } })
+    } else {
+      await db.collection('chats').updateMany(
+        { _id: { $in: migratedIds } },
+        { $set: { migratedAt: new Date() } }
+      )
+    }
+  }
+  totals.sessions += operations.length
+  totals.chats += migratedIds.length
+  console.log(`  ${totals.sessions} sessions from ${totals.chats} chat documents`)
+}
+
+async function main() {
+  const client = new MongoClient(process.env.MONGO_URL)
+  await client.connect()
+  const db = client.db(process.env.DB_NAME || 'syntherion_ai')
+
+  console.log(`Migrating chats -> sessions${dryRun ? ' (dry run)' : ''}${deleteLegacy ? ', deleting legacy documents' : ''}`)
+
+  const groups = db.collection('chats').aggregate([
+    { $match: { migratedAt: { $exists: false } } },
+    { $sort: { createdAt: 1 } },
+    {
+      $group: {
+        _id: { userId: '$userId', sessionId: '$sessionId' },
+        messages: { $last: '$messages' },
+        userEmail: { $last: '$userEmail' },
+        createdAt: { $first: '$createdAt' },
+        updatedAt: { $last: '$updatedAt' },
+        ids: { $push: '$_id' },
+      },
+    },
+  ], { allowDiskUse: true })
+
+  const totals = { sessions: 0, chats: 0 }
+  let operations = []
+  let migratedIds = []
+
+  for await (const group of groups) {
+    const { userId, sessionId } = group._id
+    const messages = (group.messages || []).map(({ role, content }) => ({ role, content }))
+
+    operations.push(migrationOperation(userId, sessionId, group, messages))
+    migratedIds.push(...group.ids)
+
+    if (operations.length >= batchSize) {
+      await flush(db, operations, migratedIds, totals)
+      operations = []
+      migratedIds = []
+    }
+  }
+  await flush(db, operations, migratedIds, totals)
+
+  console.log(`Done: ${totals.sessions} sessions, ${totals.chats} legacy chat documents`)
+  await client.close()
+}
+
+main().catch((error) => {
+  console.error('Migration failed:', error)
+  process.exit(1)
+})
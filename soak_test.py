@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Soak Test
+Runs steady mixed traffic (load_generator.py) for a long period while sampling
+the API process through GET /api/diagnostics, then reports memory growth
+slopes, GC pauses and open sockets, and flags a leak when growth is sustained
+
+The app needs DIAGNOSTICS_TOKEN set; start node with --expose-gc so each
+sample can force a full GC and measure live heap only. Virtual users sign up as
+separate users, but hours of chat traffic still exceed the default per-user
+limit, so raise it too (e.g. RATE_LIMIT_BURST=1000 RATE_LIMIT_PER_MINUTE=60000).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import aiohttp
+
+from backend_test import API_BASE
+from load_generator import LoadGenerator, build_parser as build_load_parser, print_report
+
+DEFAULT_MIX = "health=1,auth_user=2,chats=3,chat=1"
+
+
+def slope_per_hour(points):
+    """Least-squares slope of (seconds, value) points, in value units per hour"""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if not variance:
+        return 0.0
+    covariance = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return covariance / variance * 3600
+
+
+class DiagnosticsSampler:
+    """Polls /api/diagnostics every `interval` seconds until stopped"""
+
+    def __init__(self, token, interval, force_gc, samples_out=None):
+        self.token = token
+        self.interval = interval
+        self.force_gc = force_gc
+        self.samples_out = samples_out
+        self.samples = []
+        self.failures = 0
+        self.stopped = asyncio.Event()
+
+    async def sample(self, http, started):
+        params = {"gc": "1"} if self.force_gc else {}
+        headers = {"Authorization": f"Bearer {self.token}"}
+        try:
+            async with http.get(f"{API_BASE}/diagnostics", params=params, headers=headers) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"diagnostics returned {response.status}")
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError) as e:
+            self.failures += 1
+            print(f"   ⚠️  diagnostics sample failed: {e}")
+            return
+        data["elapsed"] = time.monotonic() - started
+        self.samples.append(data)
+        if self.samples_out:
+            self.samples_out.write(json.dumps(data) + "\n")
+            self.samples_out.flush()
+
+    async def run(self, started):
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as http:
+            while not self.stopped.is_set():
+                await self.sample(http, started)
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            # One last sample after the traffic stops
+            await self.sample(http, started)
+
+
+def tcp_sockets(sample):
+    return sample.get("activeResources", {}).get("TCPSocketWrap", 0)
+
+
+def analyze(samples, warmup, thresholds):
+    """Growth slopes over the post-warmup samples; a metric leaks when both the
+    whole window and its second half grow faster than its threshold"""
+    steady = [s for s in samples if s["elapsed"] >= warmup]
+    findings = {}
+    for metric, limit in thresholds.items():
+        points = [(s["elapsed"], s["memory"][metric]) for s in steady]
+        overall = slope_per_hour(points)
+        recent = slope_per_hour(points[len(points) // 2:])
+        findings[metric] = {
+            "start_mb": points[0][1] if points else None,
+            "end_mb": points[-1][1] if points else None,
+            "max_mb": max((v for _, v in points), default=None),
+            "slope_mb_per_hour": round(overall, 2),
+            "recent_slope_mb_per_hour": round(recent, 2),
+            "threshold_mb_per_hour": limit,
+            "leak": len(points) >= 4 and overall > limit and recent > limit,
+        }
+    return steady, findings
+
+
+def summarize(samples, steady, findings, wall_seconds):
+    first, last = (samples[0], samples[-1]) if samples else ({}, {})
+    gc_first, gc_last = first.get("gc", {}), last.get("gc", {})
+    pause_ms = gc_last.get("totalMs", 0) - gc_first.get("totalMs", 0)
+    sockets = [(tcp_sockets(s), s.get("sockets", {})) for s in samples]
+    return {
+        "samples": len(samples),
+        "steady_samples": len(steady),
+        "memory": findings,
+        "gc": {
+            "collections": gc_last.get("count", 0) - gc_first.get("count", 0),
+            "pause_ms": round(pause_ms, 1),
+            "pause_share_pct": round(pause_ms / (wall_seconds * 1000) * 100, 3) if wall_seconds else 0,
+            "max_pause_ms": gc_last.get("maxMs", 0),
+            "by_kind": gc_last.get("byKind", {}),
+        },
+        "event_loop_p99_max_ms": max((s.get("eventLoopDelay", {}).get("p99", 0) for s in samples), default=0),
+        "sockets": {
+            "tcp_start": sockets[0][0] if sockets else None,
+            "tcp_end": sockets[-1][0] if sockets else None,
+            "tcp_max": max((tcp for tcp, _ in sockets), default=None),
+            "mongo_end": sockets[-1][1].get("mongo") if sockets else None,
+            "upstream_end": (sockets[-1][1].get("upstreamActive", 0) + sockets[-1][1].get("upstreamIdle", 0))
+            if sockets else None,
+        },
+        "supabase_server_clients": last.get("supabaseServerClients", 0) - first.get("supabaseServerClients", 0),
+        "leak": any(finding["leak"] for finding in findings.values()),
+    }
+
+
+def megabytes(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_soak_report(report):
+    print("\n" + "=" * 80)
+    print("SOAK SUMMARY")
+    print("=" * 80)
+    print(f"Diagnostics samples: {report['samples']} ({report['steady_samples']} after warm-up)")
+    print(f"\n{'Memory':<12} {'Start MB':>10} {'End MB':>10} {'Max MB':>10} {'MB/h':>10} {'MB/h (2nd half)':>16}  Status")
+    print("-" * 84)
+    for metric, finding in report["memory"].items():
+        status = "❌ LEAK" if finding["leak"] else "✅"
+        print(f"{metric:<12} {megabytes(finding['start_mb']):>10} {megabytes(finding['end_mb']):>10} "
+              f"{megabytes(finding['max_mb']):>10} "
+              f"{finding['slope_mb_per_hour']:>10.2f} {finding['recent_slope_mb_per_hour']:>16.2f}  {status}")
+
+    gc = report["gc"]
+    print(f"\nGC: {gc['collections']} collections, {gc['pause_ms']:.0f}ms paused "
+          f"({gc['pause_share_pct']:.2f}% of wall time), longest pause {gc['max_pause_ms']:.1f}ms")
+    print(f"Event loop delay: worst p99 {report['event_loop_p99_max_ms']:.1f}ms")
+    sockets = report["sockets"]
+    print(f"TCP sockets: {sockets['tcp_start']} -> {sockets['tcp_end']} (max {sockets['tcp_max']}); "
+          f"Mongo pool {sockets['mongo_end']}, upstream {sockets['upstream_end']}")
+    print(f"Per-request Supabase clients created: {report['supabase_server_clients']}")
+    print("\n❌ MEMORY GROWTH ABOVE THRESHOLD" if report["leak"] else "\n✅ No sustained memory growth")
+    print("=" * 80)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Syntherion AI soak test with memory leak detection")
+    parser.add_argument("--duration", type=float, default=7200, help="seconds of steady traffic")
+    parser.add_argument("--users", type=int, default=10, help="virtual users (closed-loop concurrency)")
+    parser.add_argument("--rate", type=float, default=0, help="target requests/second (open-loop instead)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted scenario mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds between requests per user")
+    parser.add_argument("--sample-interval", type=float, default=30, help="seconds between diagnostics samples")
+    parser.add_argument("--warmup", type=float, default=300,
+                        help="seconds excluded from the growth slope (caches and pools filling up)")
+    parser.add_argument("--token", default=os.environ.get("DIAGNOSTICS_TOKEN"),
+                        help="DIAGNOSTICS_TOKEN configured on the app (default: $DIAGNOSTICS_TOKEN)")
+    parser.add_argument("--no-gc", action="store_true", help="don't ask the app to GC before each sample")
+    parser.add_argument("--max-heap-growth", type=float, default=10, help="heapUsed MB/hour counted as a leak")
+    parser.add_argument("--max-rss-growth", type=float, default=25, help="RSS MB/hour counted as a leak")
+    parser.add_argument("--samples-out", help="append every raw diagnostics sample to this JSONL file")
+    parser.add_argument("--json-out", help="write the summary as JSON to this path")
+    return parser
+
+
+async def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.token:
+        raise SystemExit("--token or DIAGNOSTICS_TOKEN is required")
+
+    load_args = build_load_parser().parse_args([
+        "--users", str(args.users),
+        "--rate", str(args.rate),
+        "--mix", args.mix,
+        "--think-time", str(args.think_time),
+        "--ramp-up", "0",
+        "--ramp-down", "0",
+        "--duration", str(args.duration),
+    ])
+
+    print("=" * 80)
+    print("SYNTHERION AI SOAK TEST")
+    print("=" * 80)
+    print(f"Testing against: {API_BASE}")
+    print(f"Traffic: {args.mix} for {args.duration:g}s, sampling every {args.sample_interval:g}s")
+    print(f"Leak thresholds: heapUsed {args.max_heap_growth:g} MB/h, rss {args.max_rss_growth:g} MB/h "
+          f"(after {args.warmup:g}s warm-up)")
+    print(f"Test started at: {datetime.now().isoformat()}")
+    print("=" * 80)
+
+    samples_out = open(args.samples_out, "a") if args.samples_out else None
+    sampler = DiagnosticsSampler(args.token, args.sample_interval, not args.no_gc, samples_out)
+    generator = LoadGenerator(load_args)
+    started = time.monotonic()
+    sampling = asyncio.create_task(sampler.run(started))
+    try:
+        recorder = await generator.run()
+    finally:
+        sampler.stopped.set()
+        await sampling
+        if samples_out:
+            samples_out.close()
+    wall_seconds = time.monotonic() - started
+
+    print_report(recorder.summary(), generator.profile.duration)
+
+    thresholds = {"heapUsed": args.max_heap_growth, "rss": args.max_rss_growth}
+    steady, findings = analyze(sampler.samples, args.warmup, thresholds)
+    report = summarize(sampler.samples, steady, findings, wall_seconds)
+    report["failed_samples"] = sampler.failures
+    print_soak_report(report)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"base_url": API_BASE, "args": vars(args), "wall_seconds": wall_seconds, **report}, f, indent=2)
+        print(f"Summary written to {args.json_out}")
+
+    if report["leak"]:
+        sys.exit(1)
+    return report
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
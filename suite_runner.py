@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Suite Runner
+Runs the backend_test, backend_config_test and test_auth_bypass checks concurrently,
+sharing one signed-in fixture per user type, and writes JUnit XML / JSON results
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+
+from backend_config_test import SyntherionConfigTester
+from backend_test import API_BASE, SyntherionAPITester, poll_until
+from test_auth_bypass import TEST_EMAIL, TEST_PASSWORD, TestAuthTester
+
+# One entry per test method. `fixture` is the user the check runs as and
+# `after` lists checks (same suite) that must finish first, for checks that
+# read state another check writes.
+Check = namedtuple("Check", "suite name fixture after")
+
+CHECKS = [
+    # backend_test.py
+    Check("api", "test_health_check", "anonymous", ()),
+    Check("api", "test_cors_headers", "anonymous", ()),
+    Check("api", "test_signup", "anonymous", ()),
+    Check("api", "test_signin", "anonymous", ()),
+    Check("api", "test_user_info_unauthorized", "anonymous", ()),
+    Check("api", "test_user_info_authorized", "supabase_user", ()),
+    Check("api", "test_chat_unauthorized", "anonymous", ()),
+    Check("api", "test_chat_authorized", "supabase_user", ()),
+    Check("api", "test_chat_history_unauthorized", "anonymous", ()),
+    Check("api", "test_chat_history_authorized", "supabase_user", ()),
+    Check("api", "test_chat_batch", "supabase_user", ()),
+    # Signs up its own user, whose interactive bucket no other check touches
+    Check("api", "test_chat_batch_over_interactive_burst", "anonymous", ()),
+    Check("api", "test_chat_export", "supabase_user", ()),
+    Check("api", "test_chat_search", "supabase_user", ()),
+    # The 304 check needs a history nothing else is still writing to
+    Check("api", "test_chat_history_etag", "supabase_user",
+          ("test_chat_authorized", "test_chat_batch", "test_chat_export", "test_chat_search")),
+    # backend_config_test.py
+    Check("config", "test_api_root", "anonymous", ()),
+    Check("config", "test_invalid_endpoint", "anonymous", ()),
+    Check("config", "test_signup_validation", "anonymous", ()),
+    Check("config", "test_signin_validation", "anonymous", ()),
+    Check("config", "test_chat_validation", "anonymous", ()),
+    Check("config", "analyze_supabase_config", "anonymous", ()),
+    Check("config", "test_mongodb_connection", "anonymous", ()),
+    Check("config", "test_context_summary_new_session", "anonymous", ()),
+    # test_auth_bypass.py
+    Check("auth_bypass", "test_auth_bypass_signin", "anonymous", ()),
+    Check("auth_bypass", "test_user_session_after_test_login", "test_user", ()),
+    Check("auth_bypass", "test_chat_with_test_user", "test_user", ()),
+    Check("auth_bypass", "test_chat_history_with_test_user", "test_user", ()),
+    # Signout only clears the cookie on its own copy of the session
+    Check("auth_bypass", "test_signout_with_test_user", "test_user", ()),
+    Check("auth_bypass", "test_regular_auth_still_works", "anonymous", ()),
+    Check("auth_bypass", "test_user_isolation", "test_user", ()),
+]
+
+SUITE_CLASSES = {
+    "api": SyntherionAPITester,
+    "config": SyntherionConfigTester,
+    "auth_bypass": TestAuthTester,
+}
+
+# Failures a suite may have and still pass, as its own run_* method allows
+# (the config analysis tolerates Supabase requiring email confirmation)
+SUITE_ALLOWED_FAILURES = {"config": 1}
+
+
+class Fixture:
+    """A user signed in at most once per run; each check gets its own copy of the cookies"""
+
+    def __init__(self, name, sign_in):
+        self.name = name
+        self._sign_in = sign_in
+        self._lock = threading.Lock()
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def get(self):
+        with self._lock:
+            if not self._done:
+                try:
+                    self._value = self._sign_in()
+                except Exception as e:
+                    self._error = f"Fixture '{self.name}' failed: {e}"
+                self._done = True
+        if self._error:
+            raise RuntimeError(self._error)
+        return self._value
+
+
+def sign_in_anonymous():
+    return requests.cookies.RequestsCookieJar(), None
+
+
+def sign_in_test_user():
+    session = requests.Session()
+    response = session.post(f"{API_BASE}/auth/signin",
+                            json={"email": TEST_EMAIL, "password": TEST_PASSWORD}, timeout=15)
+    if response.status_code != 200:
+        raise RuntimeError(f"test user signin returned {response.status_code}")
+    return session.cookies, response.json().get("user")
+
+
+def sign_in_supabase_user():
+    session = requests.Session()
+    email, failed_step = SyntherionAPITester(session).sign_in_new_user("suite_runner")
+    if not email:
+        raise RuntimeError(f"could not {failed_step} a Supabase user")
+    return session.cookies, email
+
+
+def build_fixtures():
+    return {
+        "anonymous": Fixture("anonymous", sign_in_anonymous),
+        "test_user": Fixture("test_user", sign_in_test_user),
+        "supabase_user": Fixture("supabase_user", sign_in_supabase_user),
+    }
+
+
+def make_tester(suite, cookies, user):
+    """A fresh tester instance whose session carries a copy of the fixture's cookies"""
+    session = requests.Session()
+    session.cookies.update(cookies)
+    if suite == "api":
+        return SyntherionAPITester(session, user_email=user)
+    if suite == "auth_bypass":
+        return TestAuthTester(session, test_user_data=user)
+    tester = SyntherionConfigTester()
+    tester.session = session
+    return tester
+
+
+def run_check(check, fixtures):
+    """Run one test method, collecting its log_test calls instead of printing them"""
+    logs = []
+
+    def record(test_name, success, message, response_data=None):
+        logs.append({"test": test_name, "success": bool(success), "message": message, "response": response_data})
+        return success
+
+    started = time.perf_counter()
+    try:
+        cookies, user = fixtures[check.fixture].get()
+        tester = make_tester(check.suite, cookies, user)
+        tester.log_test = record
+        passed = bool(getattr(tester, check.name)())
+        message = logs[-1]["message"] if logs else ""
+    except Exception as e:
+        passed, message = False, str(e)
+
+    return {
+        "suite": check.suite,
+        "name": check.name,
+        "classname": f"{SUITE_CLASSES[check.suite].__module__}.{SUITE_CLASSES[check.suite].__name__}",
+        "fixture": check.fixture,
+        "passed": passed,
+        "duration": time.perf_counter() - started,
+        "message": message,
+        "logs": logs,
+    }
+
+
+def print_result(result):
+    status = "✅ PASS" if result["passed"] else "❌ FAIL"
+    print(f"{status} {result['suite']}::{result['name']} ({result['duration']:.2f}s)")
+    print(f"   {result['message']}")
+    if not result["passed"]:
+        for log in result["logs"]:
+            if log["response"] is not None and not log["success"]:
+                print(f"   Response: {json.dumps(log['response'], indent=2, default=str)}")
+
+
+def run_checks(checks, workers):
+    """Run checks on a thread pool, starting each one as soon as its dependencies finish"""
+    fixtures = build_fixtures()
+    selected = {(check.suite, check.name) for check in checks}
+    finished = set()
+    pending = list(checks)
+    running = {}
+    results = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            # Dependencies filtered out of this run don't block anything
+            ready = [check for check in pending
+                     if all((check.suite, dep) in finished or (check.suite, dep) not in selected
+                            for dep in check.after)]
+            for check in ready:
+                pending.remove(check)
+                running[pool.submit(run_check, check, fixtures)] = check
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                check = running.pop(future)
+                finished.add((check.suite, check.name))
+                result = future.result()
+                print_result(result)
+                results.append(result)
+
+    order = {(check.suite, check.name): i for i, check in enumerate(checks)}
+    return sorted(results, key=lambda result: order[(result["suite"], result["name"])])
+
+
+def wait_until_ready(timeout):
+    """Poll GET /api/health/ready until the app answers with a non-503 status"""
+    def probe():
+        try:
+            return requests.get(f"{API_BASE}/health/ready", timeout=5).status_code
+        except requests.RequestException:
+            return None
+
+    return poll_until(probe, lambda status: status not in (None, 503), timeout=timeout, interval=0.5)
+
+
+def summarize(results):
+    suites = {}
+    for result in results:
+        suite = suites.setdefault(result["suite"], {"tests": 0, "failures": 0, "time": 0.0})
+        suite["tests"] += 1
+        suite["failures"] += 0 if result["passed"] else 1
+        suite["time"] += result["duration"]
+    for name, suite in suites.items():
+        suite["passed"] = suite["failures"] <= SUITE_ALLOWED_FAILURES.get(name, 0)
+    return suites
+
+
+def write_junit(path, results, suites, wall_seconds):
+    root = ET.Element("testsuites", {
+        "name": "syntherion",
+        "tests": str(len(results)),
+        "failures": str(sum(suite["failures"] for suite in suites.values())),
+        "time": f"{wall_seconds:.3f}",
+    })
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    elements = {}
+    for name, suite in suites.items():
+        elements[name] = ET.SubElement(root, "testsuite", {
+            "name": name,
+            "tests": str(suite["tests"]),
+            "failures": str(suite["failures"]),
+            "errors": "0",
+            "time": f"{suite['time']:.3f}",
+            "timestamp": timestamp,
+        })
+    for result in results:
+        case = ET.SubElement(elements[result["suite"]], "testcase", {
+            "classname": result["classname"],
+            "name": result["name"],
+            "time": f"{result['duration']:.3f}",
+        })
+        output = "\n".join(f"{'PASS' if log['success'] else 'FAIL'} {log['test']}: {log['message']}"
+                           for log in result["logs"])
+        if not result["passed"]:
+            failure = ET.SubElement(case, "failure", {"message": result["message"]})
+            failure.text = "\n".join(
+                [output] + [json.dumps(log["response"], indent=2, default=str)
+                            for log in result["logs"] if log["response"] is not None])
+        if output:
+            ET.SubElement(case, "system-out").text = output
+
+    tree = ET.ElementTree(root)
+    ET.indent(tree)
+    tree.write(path, encoding="utf-8", xml_declaration=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Syntherion AI parallel test suite runner")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITE_CLASSES),
+                        help="suite to run (repeatable; default: all)")
+    parser.add_argument("-k", dest="keyword", help="only run checks whose name contains this")
+    parser.add_argument("--workers", type=int, default=8, help="checks run concurrently")
+    parser.add_argument("--ready-timeout", type=float, default=60,
+                        help="seconds to wait for /api/health/ready before giving up")
+    parser.add_argument("--junit", help="write JUnit XML results to this path")
+    parser.add_argument("--json-out", help="write JSON results to this path")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    checks = [check for check in CHECKS
+              if (not args.suite or check.suite in args.suite)
+              and (not args.keyword or args.keyword in check.name)]
+
+    print("=" * 80)
+    print("SYNTHERION AI PARALLEL SUITE RUNNER")
+    print("=" * 80)
+    print(f"Testing against: {API_BASE}")
+    print(f"Checks: {len(checks)} on {args.workers} workers")
+    print(f"Test started at: {datetime.now().isoformat()}")
+    print("=" * 80)
+
+    status = wait_until_ready(args.ready_timeout)
+    if status in (None, 503):
+        print(f"\n❌ API not ready after {args.ready_timeout:g}s (last status: {status})")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    results = run_checks(checks, args.workers)
+    wall_seconds = time.perf_counter() - started
+    suites = summarize(results)
+    serial_seconds = sum(result["duration"] for result in results)
+    passed = all(suite["passed"] for suite in suites.values())
+
+    print("\n" + "=" * 80)
+    print("TEST SUMMARY")
+    print("=" * 80)
+    for name, suite in suites.items():
+        print(f"{name:<12} {suite['tests'] - suite['failures']}/{suite['tests']} passed"
+              f"{'' if suite['passed'] else '  ❌'}")
+    print(f"Wall time: {wall_seconds:.2f}s (checks took {serial_seconds:.2f}s in total)")
+    print("\n🎉 ALL SUITES PASSED!" if passed else "\n⚠️  Some suites failed. Please check the issues above.")
+    print("=" * 80)
+
+    if args.junit:
+        write_junit(args.junit, results, suites, wall_seconds)
+        print(f"JUnit results written to {args.junit}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({
+                "base_url": API_BASE,
+                "wall_seconds": wall_seconds,
+                "serial_seconds": serial_seconds,
+                "passed": passed,
+                "suites": suites,
+                "checks": results,
+            }, f, indent=2, default=str)
+        print(f"JSON results written to {args.json_out}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
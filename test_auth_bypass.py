@@ -11,8 +11,10 @@ import time
 import os
 from datetime import datetime
 
+from backend_test import poll_until
+
 # Configuration
-BASE_URL = "https://9cb6fa81-a1c2-4384-8647-fb04d744403a.preview.emergentagent.com"
+BASE_URL = os.environ.get("BASE_URL", "https://9cb6fa81-a1c2-4384-8647-fb04d744403a.preview.emergentagent.com")
 API_BASE = f"{BASE_URL}/api"
 
 # Test credentials for bypass authentication
@@ -24,10 +26,11 @@ REGULAR_EMAIL = f"regular_test_{int(time.time())}@syntherion.ai"
 REGULAR_PASSWORD = "TestPassword123!"
 
 class TestAuthTester:
-    def __init__(self):
-        self.test_session = requests.Session()  # For test user
+    def __init__(self, test_session=None, test_user_data=None):
+        # suite_runner.py passes a session already signed in as the test user
+        self.test_session = test_session or requests.Session()  # For test user
         self.regular_session = requests.Session()  # For regular user
-        self.test_user_data = None
+        self.test_user_data = test_user_data
         self.regular_user_data = None
         self.session_id = str(uuid.uuid4())
         
@@ -185,19 +188,22 @@ class TestAuthTester:
                 return self.log_test("Test Chat History with Test User", False, 
                                    "Cannot test chat history - failed to send test chat")
             
-            # Wait a moment for chat to be saved
-            time.sleep(2)
-            
-            # Now test chat history endpoint
-            response = self.test_session.get(f"{API_BASE}/chats", timeout=10)
+            # Poll until the chat shows up in history instead of sleeping a fixed time
+            response = poll_until(
+                lambda: self.test_session.get(f"{API_BASE}/chats", timeout=10),
+                lambda response: response.status_code != 200 or any(
+                    chat.get('sessionId') == self.session_id for chat in response.json().get('chats', [])))
             
             if response.status_code == 200:
                 data = response.json()
                 if 'chats' in data and isinstance(data['chats'], list):
-                    # Check if the chats belong to test user
-                    test_user_chats = [chat for chat in data['chats'] if chat.get('userId') == 'test-user-123']
+                    # History is scoped to the caller server-side; owner fields are no longer sent
+                    leaked = [chat for chat in data['chats'] if {'_id', 'userId', 'userEmail'} & set(chat)]
+                    if leaked:
+                        return self.log_test("Test Chat History with Test User", False,
+                                           "Chat history still includes _id/userId/userEmail", leaked[0])
                     return self.log_test("Test Chat History with Test User", True, 
-                                       f"Test user chat history working. Found {len(test_user_chats)} chats for test user")
+                                       f"Test user chat history working. Found {len(data['chats'])} chats for test user")
                 else:
                     return self.log_test("Test Chat History with Test User", False, 
                                        "Chat history returned but invalid format", data)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Trace Report
+Sends requests carrying a W3C traceparent, joins each client span with the
+server spans the API exported for it (TRACE_EXPORT_PATH, or the collector in
+upstream_stubs.py --trace-file) and prints per-request waterfalls plus a
+breakdown of where p99 latency goes
+
+The app needs tracing enabled (TRACE_EXPORT_PATH or
+OTEL_EXPORTER_OTLP_TRACES_ENDPOINT); sampled traceparents are always honoured.
+Each worker thread signs up as its own user, but the default per-user chat
+limit (RATE_LIMIT_BURST=10, RATE_LIMIT_PER_MINUTE=30) still cuts the chat
+scenarios short, so raise it for them (e.g. RATE_LIMIT_BURST=1000
+RATE_LIMIT_PER_MINUTE=60000). Rate-limited requests are left out of the report.
+"""
+
+import argparse
+import json
+import itertools
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from backend_test import API_BASE, SyntherionAPITester, poll_until
+from benchmark_suite import prompt_text
+from load_generator import percentile
+
+# (method, path, prompt words); a prompt makes the request a chat completion
+SCENARIOS = {
+    "health": ("GET", "/health", 0),
+    "auth_user": ("GET", "/auth/user", 0),
+    "chats": ("GET", "/chats", 0),
+    "chat": ("POST", "/chat", 20),
+    "chat_stream": ("POST", "/chat", 20),
+}
+
+WATERFALL_WIDTH = 50
+
+# Time outside the server span, and server time not covered by any stage
+NETWORK = "network"
+SERVER_OTHER = "server (untracked)"
+
+
+class WorkerClient:
+    """Thread-local sessions, each signed in as a fresh user on first use unless `anonymous`"""
+
+    def __init__(self, anonymous):
+        self.anonymous = anonymous
+        self.local = threading.local()
+        self.workers = itertools.count()
+
+    @property
+    def session(self):
+        if not hasattr(self.local, "session"):
+            session = requests.Session()
+            if not self.anonymous:
+                email, failed_step = SyntherionAPITester(session).sign_in_new_user(f"trace{next(self.workers)}")
+                if not email:
+                    raise RuntimeError(f"could not {failed_step} a user for a trace worker")
+            self.local.session = session
+        return self.local.session
+
+
+def traceparent():
+    """A fresh sampled traceparent; returns (header, trace_id, client span id)"""
+    trace_id, span_id = secrets.token_hex(16), secrets.token_hex(8)
+    return f"00-{trace_id}-{span_id}-01", trace_id, span_id
+
+
+def traced_request(client, scenario, index):
+    """Issue one request; returns the client span as a dict with wall-clock nanosecond times"""
+    method, path, prompt_words = SCENARIOS[scenario]
+    header, trace_id, span_id = traceparent()
+    url = f"{API_BASE}{path}"
+    started = time.time_ns()
+    try:
+        if method == "GET":
+            response = client.session.get(url, headers={"traceparent": header}, timeout=60)
+        else:
+            payload = {
+                "messages": [{"role": "user", "content": prompt_text(prompt_words, index)}],
+                "sessionId": str(uuid.uuid4()),
+            }
+            if scenario == "chat_stream":
+                payload["stream"] = True
+            response = client.session.post(url, json=payload, headers={"traceparent": header},
+                                           timeout=120, stream=True)
+        for _ in response.iter_content(chunk_size=65536):
+            pass
+        status = response.status_code
+    except requests.RequestException:
+        status = None
+    return {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": f"{method} {path}",
+        "start": started,
+        "end": time.time_ns(),
+        "status": status,
+    }
+
+
+def read_spans(path, trace_ids):
+    """Spans exported for `trace_ids`, grouped by trace id"""
+    spans = defaultdict(list)
+    if not os.path.exists(path):
+        return spans
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for span in scope.get("spans", []):
+                        if span["traceId"] in trace_ids:
+                            spans[span["traceId"]].append({
+                                "spanId": span["spanId"],
+                                "parentSpanId": span.get("parentSpanId"),
+                                "name": span["name"],
+                                "start": int(span["startTimeUnixNano"]),
+                                "end": int(span["endTimeUnixNano"]),
+                                "error": span.get("status", {}).get("code") == 2,
+                            })
+    return spans
+
+
+def join(client_span, server_spans):
+    """Waterfall rows (name, depth, start_ms, duration_ms, self_ms) with times relative
+    to the client span, plus whether the server clock had to be realigned. When the
+    server span doesn't fall inside the client span (clock skew between hosts), it is
+    centred in it, i.e. request and response network time are assumed equal."""
+    root = next((span for span in server_spans if span["parentSpanId"] == client_span["spanId"]), None)
+    client_ns = client_span["end"] - client_span["start"]
+    offset, realigned = 0, False
+    if root and not (client_span["start"] <= root["start"] and root["end"] <= client_span["end"]):
+        offset = client_span["start"] + (client_ns - (root["end"] - root["start"])) // 2 - root["start"]
+        realigned = True
+
+    children = defaultdict(list)
+    for span in server_spans:
+        children[span["parentSpanId"]].append(span)
+
+    rows = []
+
+    def visit(span, depth, start, end):
+        kids = sorted(children[span["spanId"]], key=lambda child: child["start"])
+        # Parallel stages (e.g. chat/batch items) can cover more than their parent
+        self_ns = max(0, (end - start) - sum(kid["end"] - kid["start"] for kid in kids))
+        rows.append((span["name"], depth, (start - client_span["start"]) / 1e6, (end - start) / 1e6, self_ns / 1e6))
+        for kid in kids:
+            visit(kid, depth + 1, kid["start"] + offset, kid["end"] + offset)
+
+    visit(client_span, 0, client_span["start"], client_span["end"])
+    return rows, realigned
+
+
+def attribute(rows):
+    """Self time per stage for one request; the client span's self time is network time"""
+    stages = defaultdict(float)
+    for name, depth, _, _, self_ms in rows:
+        if depth == 0:
+            stages[NETWORK] += self_ms
+        elif depth == 1:
+            stages[SERVER_OTHER] += self_ms
+        else:
+            stages[name] += self_ms
+    return stages
+
+
+def breakdown(requests_):
+    """Mean self time per stage over all requests and over the p99 tail"""
+    latencies = sorted(request["latency_ms"] for request in requests_)
+    p99 = percentile(latencies, 99)
+    tail = [request for request in requests_ if request["latency_ms"] >= p99]
+    names = sorted({name for request in requests_ for name in request["stages"]})
+
+    def mean(group, name):
+        return sum(request["stages"].get(name, 0.0) for request in group) / len(group) if group else 0.0
+
+    tail_latency = sum(request["latency_ms"] for request in tail) / len(tail) if tail else 0.0
+    stages = {
+        name: {
+            "mean_ms": round(mean(requests_, name), 2),
+            "p99_tail_mean_ms": round(mean(tail, name), 2),
+            "p99_tail_share_pct": round(mean(tail, name) / tail_latency * 100, 1) if tail_latency else 0.0,
+        }
+        for name in names
+    }
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": p99,
+        "tail_requests": len(tail),
+        "tail_mean_ms": round(tail_latency, 2),
+        "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["p99_tail_mean_ms"])),
+    }
+
+
+def print_waterfall(request):
+    print(f"\n{request['name']}  trace {request['traceId']}  {request['latency_ms']:.1f}ms  "
+          f"status {request['status']}{'  (server clock realigned)' if request['realigned'] else ''}")
+    scale = WATERFALL_WIDTH / request["latency_ms"] if request["latency_ms"] else 0
+    for name, depth, start_ms, duration_ms, _ in request["rows"]:
+        lead = min(WATERFALL_WIDTH, max(0, round(start_ms * scale)))
+        bar = "█" * max(1, round(duration_ms * scale))
+        label = "  " * depth + name
+        print(f"  {label:<28} {start_ms:>9.1f} {duration_ms:>9.1f}  |{' ' * lead}{bar}")
+
+
+def print_breakdown(report):
+    print("\n" + "=" * 80)
+    print("P99 LATENCY BREAKDOWN")
+    print("=" * 80)
+    print(f"p50 {report['p50_ms']:.1f}ms, p99 {report['p99_ms']:.1f}ms; "
+          f"{report['tail_requests']} tail requests averaging {report['tail_mean_ms']:.1f}ms")
+    print(f"\n{'Stage':<24} {'Mean ms':>10} {'p99 tail ms':>12} {'Share of tail':>14}")
+    print("-" * 64)
+    for name, stats in report["stages"].items():
+        print(f"{name:<24} {stats['mean_ms']:>10.1f} {stats['p99_tail_mean_ms']:>12.1f} "
+              f"{stats['p99_tail_share_pct']:>13.1f}%")
+    print("=" * 80)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Per-request trace waterfalls and p99 attribution for Syntherion AI")
+    parser.add_argument("spans", help="OTLP/JSON lines file the app (TRACE_EXPORT_PATH) or collector writes")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="chats")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--waterfalls", type=int, default=3, help="print waterfalls for the N slowest requests")
+    parser.add_argument("--flush-timeout", type=float, default=15,
+                        help="seconds to wait for the app to export the server spans")
+    parser.add_argument("--json-out", help="write the joined traces and breakdown as JSON to this path")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    print("=" * 80)
+    print("SYNTHERION AI TRACE REPORT")
+    print("=" * 80)
+    print(f"Testing against: {API_BASE}")
+    print(f"Scenario: {args.scenario}, {args.requests} requests at concurrency {args.concurrency}")
+    print(f"Server spans: {args.spans}")
+    print(f"Test started at: {datetime.now().isoformat()}")
+    print("=" * 80)
+
+    tracing = requests.get(f"{API_BASE}/health", timeout=10).json().get("tracing", {})
+    if not tracing.get("enabled"):
+        raise SystemExit("Tracing is off on the app; set TRACE_EXPORT_PATH or OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+
+    client = WorkerClient(anonymous=args.scenario == "health")
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        client_spans = list(pool.map(lambda i: traced_request(client, args.scenario, f"trace-{i}"),
+                                     range(args.requests)))
+
+    # Spans are batched on the server; wait until every request's server span is out
+    trace_ids = {span["traceId"] for span in client_spans}
+    spans = poll_until(lambda: read_spans(args.spans, trace_ids),
+                       lambda found: len(found) == len(trace_ids), timeout=args.flush_timeout, interval=0.5)
+
+    joined = []
+    for client_span in client_spans:
+        rows, realigned = join(client_span, spans.get(client_span["traceId"], []))
+        joined.append({
+            "traceId": client_span["traceId"],
+            "name": client_span["name"],
+            "status": client_span["status"],
+            "latency_ms": (client_span["end"] - client_span["start"]) / 1e6,
+            "realigned": realigned,
+            "rows": rows,
+            "stages": attribute(rows),
+        })
+    rate_limited = sum(request["status"] == 429 for request in joined)
+    traced = [request for request in joined if len(request["rows"]) > 1 and request["status"] != 429]
+    print(f"\nJoined {len(traced)}/{len(joined)} requests with their server spans "
+          f"({sum(request['realigned'] for request in traced)} realigned for clock skew)")
+    if rate_limited:
+        print(f"⚠️  {rate_limited} requests were rate limited (429) and left out; "
+              "raise RATE_LIMIT_BURST/RATE_LIMIT_PER_MINUTE to trace the app rather than the limiter")
+    if not traced and rate_limited:
+        raise SystemExit("Every request that reached the app was rate limited")
+    if not traced:
+        raise SystemExit("No server spans found; is the app exporting to this file?")
+
+    slowest = sorted(traced, key=lambda request: -request["latency_ms"])
+    print(f"\nSlowest {min(args.waterfalls, len(slowest))} requests (span, start ms, duration ms):")
+    for request in slowest[:args.waterfalls]:
+        print_waterfall(request)
+
+    report = breakdown(traced)
+    print_breakdown(report)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({
+                "base_url": API_BASE,
+                "scenario": args.scenario,
+                "requests": len(joined),
+                "traced": len(traced),
+                "rate_limited": rate_limited,
+                "breakdown": report,
+                "traces": [
+                    {**request, "rows": [dict(zip(("name", "depth", "start_ms", "duration_ms", "self_ms"), row))
+                                         for row in request["rows"]]}
+                    for request in slowest
+                ],
+            }, f, indent=2)
+        print(f"Report written to {args.json_out}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
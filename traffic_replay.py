@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Traffic Replayer
+Re-issues a trace written by the API's capture mode (TRAFFIC_CAPTURE_PATH)
+against BASE_URL, at the original pace or sped up, keeping each captured
+user's requests in their original order
+
+Captures hold request shapes only, so message text is regenerated at the
+captured lengths and captured users/sessions are mapped to fresh ones.
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from backend_test import API_BASE, SyntherionAPITester
+from load_generator import percentile
+from suite_runner import sign_in_test_user
+from upstream_stubs import FILLER_WORDS
+
+# Routes not replayed: identities are set up before the replay starts, and
+# benchmark fixtures would wipe the replayed users' history
+SKIPPED_PREFIXES = ("auth/", "benchmark/", "metrics")
+
+
+def filler_text(chars, seed=0):
+    """Deterministic text of exactly `chars` characters"""
+    if chars <= 0:
+        return ""
+    words = [FILLER_WORDS[(seed + i) % len(FILLER_WORDS)] for i in range(chars // 4 + 1)]
+    return " ".join(words)[:chars].ljust(chars, ".")
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def load_trace(path, limit=None):
+    """Captured entries in arrival order, each with `due` seconds after the first"""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+            if limit and len(entries) >= limit:
+                break
+    entries.sort(key=lambda entry: entry["at"])
+    if entries:
+        start = parse_time(entries[0]["at"])
+        for entry in entries:
+            entry["due"] = parse_time(entry["at"]) - start
+    return entries
+
+
+class ReplayUser:
+    """One captured user: a signed-in session plus the mapping of captured session hashes to new ids"""
+
+    def __init__(self, session):
+        self.session = session
+        self.sessions = {}
+
+    def session_id(self, captured):
+        if not captured:
+            return None
+        return self.sessions.setdefault(captured, str(uuid.uuid4()))
+
+    def messages(self, shape, seed):
+        return [{"role": message.get("role") or "user", "content": filler_text(message.get("chars", 0), seed + i)}
+                for i, message in enumerate(shape or [])]
+
+    def chat_payload(self, entry, seed):
+        shape = entry.get("messages") or []
+        if len(shape) == 1 and shape[0].get("role") == "user":
+            payload = {"message": filler_text(shape[0].get("chars", 0), seed)}
+        else:
+            payload = {"messages": self.messages(shape, seed)}
+        session_id = self.session_id(entry.get("session"))
+        if session_id:
+            payload["sessionId"] = session_id
+        if entry.get("stream"):
+            payload["stream"] = True
+        return payload
+
+    def batch_payload(self, entry, seed):
+        items = []
+        for i, item in enumerate(entry.get("items") or []):
+            shape = item.get("messages") or []
+            replayed = {"id": i, "messages": self.messages(shape, seed + i)}
+            session_id = self.session_id(item.get("session"))
+            if session_id:
+                replayed["sessionId"] = session_id
+            items.append(replayed)
+        payload = {"items": items}
+        if entry.get("concurrency"):
+            payload["concurrency"] = entry["concurrency"]
+        return payload
+
+    def request(self, entry, seed, timeout):
+        """Issue the replayed request; returns the HTTP status"""
+        path = entry["path"]
+        params = {key: value for key, value in entry.get("query", {}).items() if key != "qLength"}
+        if "qLength" in entry.get("query", {}):
+            params["q"] = filler_text(entry["query"]["qLength"], seed)
+
+        if path == "chats/:id":
+            path = f"chats/{self.session_id(entry.get('session')) or uuid.uuid4()}"
+
+        url = f"{API_BASE}/{path}".rstrip("/")
+        if entry["method"] == "GET":
+            response = self.session.get(url, params=params, timeout=timeout, stream=True)
+        elif path == "chat":
+            response = self.session.post(url, json=self.chat_payload(entry, seed), timeout=timeout, stream=True)
+        elif path == "chat/batch":
+            response = self.session.post(url, json=self.batch_payload(entry, seed), timeout=timeout, stream=True)
+        else:
+            response = self.session.post(url, json={}, timeout=timeout, stream=True)
+        # Streams (SSE, NDJSON) count until their last byte
+        for _ in response.iter_content(chunk_size=65536):
+            pass
+        return response.status_code
+
+
+def sign_in(auth):
+    """A session for one captured user under the chosen --auth mode"""
+    session = requests.Session()
+    if auth == "signup":
+        email, failed_step = SyntherionAPITester(session).sign_in_new_user("replay")
+        if not email:
+            raise RuntimeError(f"could not {failed_step} a replay user")
+    elif auth == "test-user":
+        cookies, _ = sign_in_test_user()
+        session.cookies.update(cookies)
+    return session
+
+
+class ReplayRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, entry, status, latency_ms, lag_ms):
+        with self.lock:
+            self.samples[f"{entry['method']} {entry['path']}"].append({
+                "status": status,
+                "captured_status": entry.get("status"),
+                "latency_ms": latency_ms,
+                "lag_ms": lag_ms,
+            })
+
+    def summary(self):
+        report = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = sorted(s["latency_ms"] for s in samples)
+            lags = sorted(s["lag_ms"] for s in samples)
+            statuses = defaultdict(int)
+            for sample in samples:
+                statuses[str(sample["status"])] += 1
+            report[endpoint] = {
+                "requests": len(samples),
+                "statuses": dict(statuses),
+                "status_matches": sum(s["status"] == s["captured_status"] for s in samples),
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "lag_p95_ms": percentile(lags, 95),
+            }
+        return report
+
+
+def replay_user(user, entries, started, speed, recorder, timeout):
+    """Replay one captured user's entries in order, each no earlier than its scaled due time"""
+    for seed, entry in enumerate(entries):
+        due = started + entry["due"] / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent = time.perf_counter()
+        try:
+            status = user.request(entry, seed, timeout)
+        except requests.RequestException:
+            status = None
+        recorder.record(entry, status, (time.perf_counter() - sent) * 1000, max(0.0, sent - due) * 1000)
+
+
+def print_report(report, wall_seconds, trace_seconds, speed, skipped):
+    print("\n" + "=" * 80)
+    print("REPLAY SUMMARY")
+    print("=" * 80)
+    print(f"Trace span: {trace_seconds:.1f}s at {speed:g}x -> target {trace_seconds / speed:.1f}s, took {wall_seconds:.1f}s")
+    if skipped:
+        print(f"Skipped entries: {skipped} (auth, benchmark and metrics routes)")
+    print(f"\n{'Endpoint':<24} {'Count':>6} {'Same status':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Lag p95':>9}")
+    print("-" * 84)
+    for endpoint, stats in report.items():
+        print(f"{endpoint:<24} {stats['requests']:>6} {stats['status_matches']:>12} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['lag_p95_ms']:>9.1f}")
+    print("=" * 80)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Replay a captured Syntherion AI traffic trace")
+    parser.add_argument("trace", help="JSONL trace written by the API with TRAFFIC_CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (2 = twice as fast)")
+    parser.add_argument("--auth", choices=["signup", "test-user"], default="signup",
+                        help="identity per captured user: a fresh Supabase user, or the shared test user")
+    parser.add_argument("--limit", type=int, help="replay only the first N entries")
+    parser.add_argument("--max-users", type=int, default=256, help="captured users replayed at once")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--json-out", help="write the summary as JSON to this path")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.speed <= 0:
+        raise SystemExit("--speed must be positive")
+
+    entries = load_trace(args.trace, args.limit)
+    replayed = [entry for entry in entries if not entry["path"].startswith(SKIPPED_PREFIXES)]
+    by_user = defaultdict(list)
+    for entry in replayed:
+        by_user[entry.get("user")].append(entry)
+    trace_seconds = entries[-1]["due"] if entries else 0.0
+
+    print("=" * 80)
+    print("SYNTHERION AI TRAFFIC REPLAY")
+    print("=" * 80)
+    print(f"Testing against: {API_BASE}")
+    print(f"Trace: {args.trace} ({len(replayed)} requests from {len(by_user)} users, {trace_seconds:.1f}s)")
+    print(f"Speed: {args.speed:g}x, identities: {args.auth}")
+    print(f"Test started at: {datetime.now().isoformat()}")
+    print("=" * 80)
+
+    # Sign everyone in before the clock starts so setup doesn't show up as lag
+    with ThreadPoolExecutor(max_workers=min(32, len(by_user) or 1)) as pool:
+        sessions = dict(zip(by_user, pool.map(
+            lambda user: requests.Session() if user is None else sign_in(args.auth), by_user)))
+
+    recorder = ReplayRecorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(args.max_users, len(by_user) or 1)) as pool:
+        futures = [pool.submit(replay_user, ReplayUser(sessions[user]), user_entries, started, args.speed,
+                               recorder, args.timeout)
+                   for user, user_entries in by_user.items()]
+        for future in futures:
+            future.result()
+    wall_seconds = time.perf_counter() - started
+
+    report = recorder.summary()
+    print_report(report, wall_seconds, trace_seconds, args.speed, len(entries) - len(replayed))
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({
+                "base_url": API_BASE,
+                "trace": args.trace,
+                "speed": args.speed,
+                "wall_seconds": wall_seconds,
+                "trace_seconds": trace_seconds,
+                "endpoints": report,
+            }, f, indent=2)
+        print(f"Summary written to {args.json_out}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
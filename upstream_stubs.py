@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+"""
+Syntherion AI Upstream Stand-ins
+Local replacements for OpenRouter, Supabase auth and MongoDB so the API and the
+test suites can run offline with repeatable upstream latency, plus an OTLP/HTTP
+trace collector that appends exported spans to a file
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Supabase's documented default secret for local development
+DEFAULT_JWT_SECRET = "super-secret-jwt-token-with-at-least-32-characters-long"
+
+# The app's default model; always listed by /models
+DEFAULT_MODEL = "mistralai/mistral-7b-instruct"
+
+FILLER_WORDS = (
+    "Syntherion is a local stand-in model that answers every prompt with "
+    "deterministic filler text so latency measurements stay repeatable across runs"
+).split()
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64url_decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def sign_jwt(claims, secret):
+    """Create an HS256 JWT, the format Supabase issues access tokens in"""
+    header = b64url(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64url(json.dumps(claims).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64url(signature)}"
+
+
+def verify_jwt(token, secret):
+    """Return the claims of a valid, unexpired HS256 JWT or None"""
+    try:
+        header, payload, signature = token.split(".")
+        expected = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, b64url_decode(signature)):
+            return None
+        claims = json.loads(b64url_decode(payload))
+    except (ValueError, json.JSONDecodeError):
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+class StubConfig:
+    """Tunable upstream behaviour, shared by all handler threads"""
+
+    INT_FIELDS = ("response_tokens", "error_status")
+    DICT_FIELDS = ("model_latency_ms", "model_error_rate")
+
+    def __init__(self, latency_ms=200.0, jitter_ms=0.0, tokens_per_second=50.0, response_tokens=60,
+                 error_rate=0.0, error_status=500, auth_latency_ms=20.0, jwt_secret=DEFAULT_JWT_SECRET, seed=None,
+                 slow_rate=0.0, slow_latency_ms=0.0, model_latency_ms=None, model_error_rate=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Tail latency: this fraction of completions waits slow_latency_ms extra
+        self.slow_rate = slow_rate
+        self.slow_latency_ms = slow_latency_ms
+        # Per-model overrides of latency_ms and error_rate, keyed by model id
+        self.model_latency_ms = dict(model_latency_ms or {})
+        self.model_error_rate = dict(model_error_rate or {})
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.auth_latency_ms = auth_latency_ms
+        self.jwt_secret = jwt_secret
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def update(self, values):
+        with self.lock:
+            for key, value in values.items():
+                if key in ("random", "lock", "jwt_secret") or not hasattr(self, key):
+                    raise KeyError(key)
+                if key in self.DICT_FIELDS:
+                    setattr(self, key, {str(k): float(v) for k, v in dict(value).items()})
+                else:
+                    setattr(self, key, int(value) if key in self.INT_FIELDS else float(value))
+
+    def as_dict(self):
+        return {k: v for k, v in vars(self).items() if k not in ("random", "lock", "jwt_secret")}
+
+    def models(self):
+        """Model ids the stub advertises: the default plus any with overrides"""
+        with self.lock:
+            return sorted({DEFAULT_MODEL, *self.model_latency_ms, *self.model_error_rate})
+
+    def first_token_delay(self, model=None):
+        with self.lock:
+            latency = self.model_latency_ms.get(model, self.latency_ms)
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+            if self.slow_rate > 0 and self.random.random() < self.slow_rate:
+                latency += self.slow_latency_ms
+        return max(0.0, latency + jitter) / 1000
+
+    def should_fail(self, model=None):
+        with self.lock:
+            error_rate = self.model_error_rate.get(model, self.error_rate)
+            return error_rate > 0 and self.random.random() < error_rate
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Shared helpers for the stub request handlers"""
+
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        if os.environ.get("STUB_VERBOSE"):
+            super().log_message(format, *args)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            return {}
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        # HEAD gets the GET headers, Content-Length included, and no body
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def handle_control(self):
+        """GET/POST /__stub/config reads or updates the live configuration"""
+        if self.command == "POST":
+            try:
+                self.config.update(self.read_json())
+            except (KeyError, TypeError, ValueError) as e:
+                return self.send_json(400, {"error": f"Invalid config field: {e}"})
+        return self.send_json(200, self.config.as_dict())
+
+
+class OpenAIStubHandler(JSONHandler):
+    """OpenAI-compatible /chat/completions with configurable latency, token rate and errors"""
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/__stub/config":
+            return self.handle_control()
+        if path.endswith("/models"):
+            return self.send_json(200, {"object": "list", "data": [
+                {"id": model, "object": "model", "owned_by": "stub"} for model in self.config.models()
+            ]})
+        return self.send_json(404, {"error": {"message": "Not found"}})
+
+    # The app's keep-warm pings are HEAD requests
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/__stub/config":
+            return self.handle_control()
+        if not path.endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "Not found"}})
+
+        body = self.read_json()
+        model = body.get("model", "stub-model")
+        time.sleep(self.config.first_token_delay(model))
+        if self.config.should_fail(model):
+            return self.send_json(self.config.error_status, {
+                "error": {"message": "Injected upstream error", "code": self.config.error_status},
+            })
+
+        max_tokens = body.get("max_tokens") or self.config.response_tokens
+        count = min(self.config.response_tokens, max_tokens)
+        tokens = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(count)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        per_token = 1 / self.config.tokens_per_second if self.config.tokens_per_second else 0
+
+        if body.get("stream"):
+            return self.stream_completion(completion_id, model, tokens, per_token)
+
+        time.sleep(per_token * len(tokens))
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(tokens)},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        })
+
+    def stream_completion(self, completion_id, model, tokens, per_token):
+        """Server-sent events in the OpenAI chat.completion.chunk format"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None):
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                chunk({"content": token if i == 0 else f" {token}"})
+                time.sleep(per_token)
+            chunk({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class SupabaseAuthStubHandler(JSONHandler):
+    """Enough of the GoTrue /auth/v1 API for signup, password sign-in, getUser and logout"""
+
+    users = None
+    users_lock = threading.Lock()
+
+    def user_payload(self, user):
+        return {
+            "id": user["id"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": user["email"],
+            "email_confirmed_at": user["created_at"],
+            "app_metadata": {"provider": "email", "providers": ["email"]},
+            "user_metadata": {},
+            "created_at": user["created_at"],
+            "updated_at": user["created_at"],
+        }
+
+    def session_payload(self, user):
+        now = int(time.time())
+        expires_in = 3600
+        claims = {
+            "sub": user["id"],
+            "email": user["email"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "iat": now,
+            "exp": now + expires_in,
+            "session_id": str(uuid.uuid4()),
+        }
+        return {
+            "access_token": sign_jwt(claims, self.config.jwt_secret),
+            "token_type": "bearer",
+            "expires_in": expires_in,
+            "expires_at": now + expires_in,
+            "refresh_token": f"{user['id']}.{uuid.uuid4().hex}",
+            "user": self.user_payload(user),
+        }
+
+    def bearer_claims(self):
+        header = self.headers.get("Authorization", "")
+        if not header.lower().startswith("bearer "):
+            return None
+        return verify_jwt(header[7:].strip(), self.config.jwt_secret)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/__stub/config":
+            return self.handle_control()
+        time.sleep(self.config.auth_latency_ms / 1000)
+
+        if path == "/auth/v1/health":
+            return self.send_json(200, {"name": "GoTrue", "description": "Supabase auth stub"})
+
+        if path == "/auth/v1/user":
+            claims = self.bearer_claims()
+            if not claims:
+                return self.send_json(401, {"code": 401, "msg": "invalid JWT"})
+            with self.users_lock:
+                user = next((u for u in self.users.values() if u["id"] == claims["sub"]), None)
+            if not user:
+                return self.send_json(404, {"code": 404, "msg": "User not found"})
+            return self.send_json(200, self.user_payload(user))
+
+        return self.send_json(404, {"code": 404, "msg": "Not found"})
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/__stub/config":
+            return self.handle_control()
+        time.sleep(self.config.auth_latency_ms / 1000)
+        body = self.read_json()
+
+        if parsed.path == "/auth/v1/signup":
+            email, password = body.get("email"), body.get("password")
+            if not email or not password:
+                return self.send_json(400, {"code": 400, "msg": "Signup requires a valid password"})
+            with self.users_lock:
+                if email in self.users:
+                    return self.send_json(422, {"code": 422, "msg": "User already registered"})
+                user = {"id": str(uuid.uuid4()), "email": email, "password": password, "created_at": utc_now()}
+                self.users[email] = user
+            return self.send_json(200, self.session_payload(user))
+
+        if parsed.path == "/auth/v1/token":
+            grant_type = parse_qs(parsed.query).get("grant_type", [""])[0]
+            with self.users_lock:
+                if grant_type == "password":
+                    user = self.users.get(body.get("email"))
+                    if not user or user["password"] != body.get("password"):
+                        user = None
+                elif grant_type == "refresh_token":
+                    user_id = str(body.get("refresh_token", "")).split(".")[0]
+                    user = next((u for u in self.users.values() if u["id"] == user_id), None)
+                else:
+                    user = None
+            if not user:
+                return self.send_json(400, {"error": "invalid_grant", "error_description": "Invalid login credentials"})
+            return self.send_json(200, self.session_payload(user))
+
+        if parsed.path == "/auth/v1/logout":
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        return self.send_json(404, {"code": 404, "msg": "Not found"})
+
+
+class OTLPCollectorHandler(JSONHandler):
+    """OTLP/HTTP JSON trace receiver: each POST /v1/traces body becomes one line of `trace_file`"""
+
+    trace_file = None
+    file_lock = threading.Lock()
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/v1/traces":
+            return self.send_json(404, {"error": "Not found"})
+        if "json" not in (self.headers.get("Content-Type") or ""):
+            return self.send_json(415, {"error": "Only OTLP/JSON is supported"})
+        body = self.read_json()
+        if "resourceSpans" not in body:
+            return self.send_json(400, {"error": "Expected an ExportTraceServiceRequest"})
+        with self.file_lock, open(self.trace_file, "a") as f:
+            f.write(json.dumps(body) + "\n")
+        return self.send_json(200, {"partialSuccess": {}})
+
+
+class MongoStandIn:
+    """Runs a throwaway mongod (or a mongo container) on a local port"""
+
+    def __init__(self, port):
+        self.port = port
+        self.process = None
+        self.data_dir = None
+        self.container = None
+
+    @property
+    def url(self):
+        return f"mongodb://127.0.0.1:{self.port}"
+
+    def start(self):
+        mongod = shutil.which("mongod")
+        if mongod:
+            self.data_dir = tempfile.mkdtemp(prefix="syntherion-mongo-")
+            self.process = subprocess.Popen(
+                [mongod, "--dbpath", self.data_dir, "--port", str(self.port), "--bind_ip", "127.0.0.1", "--quiet"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.STDOUT,
+            )
+            return "mongod"
+        if shutil.which("docker"):
+            self.container = f"syntherion-mongo-{self.port}"
+            subprocess.run(
+                ["docker", "run", "--rm", "-d", "--name", self.container, "-p", f"127.0.0.1:{self.port}:27017", "mongo:7"],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            return "docker"
+        return None
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+        if self.container:
+            subprocess.run(["docker", "stop", self.container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.container = None
+        if self.data_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+            self.data_dir = None
+
+
+class StubServers:
+    """Starts and stops the stand-ins; usable as a context manager from other harness scripts"""
+
+    def __init__(self, config=None, host="127.0.0.1", openai_port=8001, supabase_port=8002,
+                 mongo_port=27018, with_mongo=True, collector_port=4318, trace_file=None):
+        self.config = config or StubConfig()
+        self.collector_port = collector_port
+        self.trace_file = trace_file
+        self.host = host
+        self.openai_port = openai_port
+        self.supabase_port = supabase_port
+        self.mongo = MongoStandIn(mongo_port) if with_mongo else None
+        self.mongo_backend = None
+        self.servers = []
+
+    def serve(self, handler_class, port, **attrs):
+        handler = type(handler_class.__name__, (handler_class,), {"config": self.config, **attrs})
+        server = ThreadingHTTPServer((self.host, port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def start(self):
+        self.serve(OpenAIStubHandler, self.openai_port)
+        self.serve(SupabaseAuthStubHandler, self.supabase_port, users={})
+        if self.trace_file:
+            self.serve(OTLPCollectorHandler, self.collector_port, trace_file=self.trace_file)
+        if self.mongo:
+            self.mongo_backend = self.mongo.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        if self.mongo:
+            self.mongo.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def env(self):
+        """Environment variables that point the app at the stand-ins"""
+        env = {
+            "OPENROUTER_BASE_URL": f"http://{self.host}:{self.openai_port}/api/v1",
+            "OPENROUTER_API_KEY": "stub-openrouter-key",
+            "NEXT_PUBLIC_SUPABASE_URL": f"http://{self.host}:{self.supabase_port}",
+            "SUPABASE_JWT_SECRET": self.config.jwt_secret,
+        }
+        if self.mongo and self.mongo_backend:
+            env["MONGO_URL"] = self.mongo.url
+        if self.trace_file:
+            env["OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"] = f"http://{self.host}:{self.collector_port}/v1/traces"
+        models = self.config.models()
+        if len(models) > 1:
+            env["MODEL_POOL"] = ",".join([DEFAULT_MODEL] + [m for m in models if m != DEFAULT_MODEL])
+        return env
+
+
+def parse_overrides(values):
+    """Parse repeated MODEL=NUMBER options into a dict"""
+    overrides = {}
+    for value in values or []:
+        model, _, number = value.rpartition("=")
+        if not model:
+            raise argparse.ArgumentTypeError(f"expected MODEL=NUMBER, got {value!r}")
+        overrides[model] = float(number)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local stand-ins for OpenRouter, Supabase auth and MongoDB")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8001)
+    parser.add_argument("--supabase-port", type=int, default=8002)
+    parser.add_argument("--mongo-port", type=int, default=27018)
+    parser.add_argument("--no-mongo", action="store_true", help="don't start a local mongod")
+    parser.add_argument("--collector-port", type=int, default=4318)
+    parser.add_argument("--trace-file",
+                        help="run an OTLP/HTTP trace collector that appends exported spans to this file")
+    parser.add_argument("--latency-ms", type=float, default=200, help="delay before the first completion token")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform +/- jitter on the first-token delay")
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="fraction of completions delayed by --slow-latency-ms (tail latency)")
+    parser.add_argument("--slow-latency-ms", type=float, default=0.0)
+    parser.add_argument("--model-latency", action="append", metavar="MODEL=MS",
+                        help="first-token delay for one model (repeatable); also adds it to MODEL_POOL")
+    parser.add_argument("--model-error-rate", action="append", metavar="MODEL=RATE",
+                        help="error rate for one model (repeatable)")
+    parser.add_argument("--auth-latency-ms", type=float, default=20)
+    parser.add_argument("--jwt-secret", default=DEFAULT_JWT_SECRET)
+    parser.add_argument("--seed", type=int, help="seed for jitter and error injection")
+    parser.add_argument("--write-env", help="also write the app settings to this env file (e.g. .env.local)")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        auth_latency_ms=args.auth_latency_ms,
+        jwt_secret=args.jwt_secret,
+        seed=args.seed,
+        slow_rate=args.slow_rate,
+        slow_latency_ms=args.slow_latency_ms,
+        model_latency_ms=parse_overrides(args.model_latency),
+        model_error_rate=parse_overrides(args.model_error_rate),
+    )
+    stubs = StubServers(config, args.host, args.openai_port, args.supabase_port, args.mongo_port,
+                        with_mongo=not args.no_mongo, collector_port=args.collector_port,
+                        trace_file=args.trace_file)
+    stubs.start()
+
+    print("=" * 80)
+    print("SYNTHERION AI UPSTREAM STAND-INS")
+    print("=" * 80)
+    print(f"OpenRouter (OpenAI-compatible): http://{args.host}:{args.openai_port}/api/v1")
+    print(f"Supabase auth:                  http://{args.host}:{args.supabase_port}/auth/v1")
+    if stubs.mongo is None:
+        print("MongoDB:                        not started (--no-mongo)")
+    elif stubs.mongo_backend:
+        print(f"MongoDB ({stubs.mongo_backend}):{' ' * (23 - len(stubs.mongo_backend))}{stubs.mongo.url}")
+    else:
+        print("MongoDB:                        mongod/docker not found, using the app's MONGO_URL")
+    if args.trace_file:
+        print(f"OTLP trace collector:           http://{args.host}:{args.collector_port}/v1/traces "
+              f"-> {args.trace_file}")
+    print("=" * 80)
+    print("Start the app with:")
+    env = stubs.env()
+    for key, value in env.items():
+        print(f"  {key}={value}")
+    print("and point the suites at it with BASE_URL=http://localhost:3000")
+    print("=" * 80)
+
+    if args.write_env:
+        with open(args.write_env, "w") as f:
+            f.writelines(f"{key}={value}\n" for key, value in env.items())
+        print(f"Settings written to {args.write_env}")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stubs.stop()
+
+
+if __name__ == "__main__":
+    main()